@@ -0,0 +1,83 @@
+from ArticleContent import ArticleContent, ArticleContentType
+
+# Telegram limits for a message text and a media caption, in UTF-16 code units
+TEXT_LIMIT = 4096
+CAPTION_LIMIT = 1024
+
+# Preferred places to split a long text, the best first
+SEPARATORS = ("\n\n", "\n", " ")
+
+def utf16Length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+class ArticlePaginator:
+    def __init__(self, text_limit: int = TEXT_LIMIT, caption_limit: int = CAPTION_LIMIT) -> None:
+        self.text_limit = text_limit
+        self.caption_limit = caption_limit
+
+    def paginate(self, blocks: list) -> list:
+        # One page is one message: text blocks are packed together up to the limit,
+        # every medium is a page with its caption
+        pages = []
+        text = ""
+
+        def addText(new_text: str) -> None:
+            nonlocal text
+            for chunk in self.splitText(new_text, self.text_limit):
+                if text and utf16Length(text) + 2 + utf16Length(chunk) <= self.text_limit:
+                    text += "\n\n" + chunk
+                    continue
+                if text:
+                    pages.append(ArticleContent(ArticleContentType.TEXT, text))
+                text = chunk
+
+        for block in blocks:
+            if block.type == ArticleContentType.TEXT:
+                addText(block.content)
+                continue
+
+            if text:
+                pages.append(ArticleContent(ArticleContentType.TEXT, text))
+                text = ""
+
+            # A caption over the limit goes on as text after its medium
+            caption, rest = self.takeChunk((block.caption or "").strip(), self.caption_limit)
+            pages.append(ArticleContent(block.type, block.content, caption))
+            addText(rest)
+
+        if text:
+            pages.append(ArticleContent(ArticleContentType.TEXT, text))
+
+        return pages
+
+    def splitText(self, text: str, limit: int) -> list:
+        chunks = []
+        rest = text.strip()
+        while rest:
+            chunk, rest = self.takeChunk(rest, limit)
+            chunks.append(chunk)
+        return chunks
+
+    def takeChunk(self, text: str, limit: int) -> tuple:
+        # At least one character, so the rest always gets shorter
+        size = max(self.fitLength(text, limit), 1)
+        if size == len(text):
+            return text, ""
+
+        for separator in SEPARATORS:
+            cut = text.rfind(separator, 0, size + len(separator))
+            if cut > 0:
+                return text[:cut].rstrip(), text[cut:].lstrip()
+
+        # A single word longer than the limit
+        return text[:size], text[size:].lstrip()
+
+    def fitLength(self, text: str, limit: int) -> int:
+        # Longest prefix within the limit, characters outside the BMP take two code units
+        size = min(len(text), limit)
+        excess = utf16Length(text[:size]) - limit
+        while excess > 0:
+            # A character is one or two code units, cutting half the excess never cuts too much
+            size -= (excess + 1) // 2
+            excess = utf16Length(text[:size]) - limit
+        return size
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+import time
+
+from typing import Callable
+
+from BotConfig import AttemptsConfig
+from DBManager import DBManager
+
+logger = logging.getLogger(__name__)
+
+class AttemptLog:
+    def __init__(self, db_manager: DBManager, config: AttemptsConfig = None) -> None:
+        self.db_manager = db_manager
+        self.config = config if config is not None else AttemptsConfig()
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.worker = None
+        # Only one process may compact a database shared by several
+        self.compact = True
+        self.next_compaction = 0.0
+
+    def add(
+            self,
+            user_id: int,
+            quiz_name: str,
+            started_at: float,
+            score: float,
+            total_score: float,
+            timed_out: bool,
+            answers: list
+            ) -> None:
+        if not self.config.enabled:
+            return
+
+        self.pending.append((time.time(), user_id, quiz_name, started_at, score, total_score, int(timed_out),
+                             json.dumps(answers, ensure_ascii=False)))
+        if len(self.pending) >= self.config.batch_size:
+            self.wakeup.set()
+
+    def start(self) -> None:
+        if self.config.enabled and self.worker is None:
+            self.worker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+        await self.flush()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.config.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+            if self.compact and self.config.retention_days > 0 and time.monotonic() >= self.next_compaction:
+                self.next_compaction = time.monotonic() + self.config.compact_interval
+                await self.compactPartitions()
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+
+        attempts, self.pending = self.pending, []
+        try:
+            await self.runDB(self.db_manager.addAttempts, attempts, self.config.partition_days)
+        except Exception:
+            logger.exception("Writing %d quiz attempts failed", len(attempts))
+
+    async def compactPartitions(self) -> None:
+        cutoff = time.time() - self.config.retention_days * 86400
+        try:
+            compacted = await self.runDB(self.db_manager.compactAttempts, cutoff, self.config.partition_days)
+        except Exception:
+            logger.exception("Compacting quiz attempts failed")
+            return
+
+        if compacted:
+            logger.info("Compacted %d quiz attempt partitions into summaries", compacted)
+
+    async def runDB(self, func: Callable, *args) -> object:
+        # The default executor, like broadcasts, a batch never waits behind a content job
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
@@ -0,0 +1,115 @@
+import asyncio
+import inspect
+import itertools
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+from telegram import Bot
+
+from MessageCleaner import MessageCleaner
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    def __init__(self, jobs: "BackgroundJobs", job_id: int, title: str, chat_id: int) -> None:
+        self.jobs = jobs
+        self.job_id = job_id
+        self.title = title
+        self.chat_id = chat_id
+        self.message_id = None
+        self.lock = asyncio.Lock()
+        self.last_progress = 0.0
+        self.finished = False
+
+    def progress(self, text: str) -> None:
+        # Called from the worker thread, reports are throttled and sent from the event loop
+        now = time.monotonic()
+        if now - self.last_progress < self.jobs.progress_interval:
+            return
+        self.last_progress = now
+        self.jobs.loop.call_soon_threadsafe(self.jobs.spawn, self.jobs.report(self, text))
+
+class BackgroundJobs:
+    def __init__(self, message_cleaner: MessageCleaner, progress_interval: float = 2.0) -> None:
+        self.message_cleaner = message_cleaner
+        self.progress_interval = progress_interval
+        # A single worker keeps all content file writes in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="content-jobs")
+        self.job_ids = itertools.count(1)
+        self.tasks = set()
+        self.bot = None
+        self.loop = None
+
+    def start(self, bot: Bot) -> None:
+        self.bot = bot
+        self.loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    async def run(self, func: Callable, *args) -> object:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def spawn(self, coroutine: Awaitable) -> None:
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def submit(
+            self,
+            chat_id: int,
+            title: str,
+            func: Callable,
+            *args,
+            done: Callable[[object], Awaitable[str]] = None
+            ) -> int:
+        job = Job(self, next(self.job_ids), title, chat_id)
+        self.spawn(self.execute(job, func, args, done))
+        return job.job_id
+
+    async def execute(self, job: Job, func: Callable, args: tuple, done: Callable[[object], Awaitable[str]]) -> None:
+        logger.info("Job %d %s started", job.job_id, job.title)
+        started = time.perf_counter()
+
+        try:
+            # Coroutine jobs run on the event loop, everything else on the worker thread
+            if inspect.iscoroutinefunction(func):
+                result = await func(job, *args)
+            else:
+                result = await self.run(func, job, *args)
+            text = await done(result) if done is not None else "done"
+        except Exception:
+            logger.exception("Job %d %s failed", job.job_id, job.title)
+            text = "failed"
+
+        logger.info("Job %d %s finished in %.2fs: %s", job.job_id, job.title, time.perf_counter() - started, text)
+        job.finished = True
+        await self.report(job, text, True)
+
+    async def report(self, job: Job, text: str, final: bool = False) -> None:
+        # One status message per job, edited as the job goes on
+        text = f"Job #{job.job_id} {job.title}: {text}"
+        async with job.lock:
+            if job.finished and not final:
+                return
+            try:
+                if job.message_id is not None:
+                    try:
+                        await self.bot.edit_message_text(text, job.chat_id, job.message_id)
+                        return
+                    except Exception:
+                        # Cleaned up in the meantime, a new message is sent below
+                        pass
+
+                message = await self.bot.send_message(job.chat_id, text)
+                job.message_id = message.id
+                self.message_cleaner.track(job.chat_id, message.id)
+            except Exception:
+                logger.exception("Failed to report job %d", job.job_id)
@@ -0,0 +1,293 @@
+import json
+import os
+
+from enum import Enum, auto
+
+class RunMode(Enum):
+    POLLING = auto()
+    WEBHOOK = auto()
+
+class KeyboardMode(Enum):
+    REPLY = auto()
+    INLINE = auto()
+
+class WebhookConfig:
+    def __init__(
+            self,
+            listen: str = "0.0.0.0",
+            port: int = 8443,
+            url_path: str = "",
+            webhook_url: str = "",
+            secret_token: str = "",
+            max_connections: int = 40,
+            cert: str = "",
+            key: str = ""
+            ) -> None:
+        self.listen = listen
+        self.port = port
+        self.url_path = url_path
+        self.webhook_url = webhook_url
+        self.secret_token = secret_token
+        self.max_connections = max_connections
+        self.cert = cert
+        self.key = key
+
+class MetricsConfig:
+    def __init__(
+            self,
+            enabled: bool = False,
+            listen: str = "127.0.0.1",
+            port: int = 0
+            ) -> None:
+        self.enabled = enabled
+        self.listen = listen
+        self.port = port
+
+class LoggingConfig:
+    def __init__(
+            self,
+            level: str = "INFO",
+            json: bool = False,
+            sampling: dict = None,
+            default_rate: float = 1.0,
+            queue_size: int = 10000
+            ) -> None:
+        self.level = level
+        self.json = json
+        self.sampling = sampling if sampling is not None else {}
+        self.default_rate = default_rate
+        self.queue_size = queue_size
+
+class FloodConfig:
+    def __init__(
+            self,
+            rate: float = 3.0,
+            burst: float = 10.0,
+            drop_duplicates: bool = True,
+            coalesce: bool = True
+            ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.drop_duplicates = drop_duplicates
+        self.coalesce = coalesce
+
+class BroadcastConfig:
+    def __init__(
+            self,
+            rate: float = 20.0,
+            concurrency: int = 16,
+            page_size: int = 500,
+            paid: bool = False
+            ) -> None:
+        self.rate = rate
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.paid = paid
+
+class HttpConfig:
+    def __init__(
+            self,
+            http_version: str = "1.1",
+            connection_pool_size: int = 256,
+            media_pool_size: int = 8,
+            get_updates_pool_size: int = 1,
+            keepalive_connections: int = 32,
+            keepalive_expiry: float = 30.0,
+            connect_timeout: float = 5.0,
+            read_timeout: float = 5.0,
+            write_timeout: float = 5.0,
+            pool_timeout: float = 1.0,
+            media_read_timeout: float = 60.0,
+            media_write_timeout: float = 120.0,
+            get_updates_read_timeout: float = 5.0,
+            flood_retries: int = 2,
+            max_flood_wait: float = 5.0
+            ) -> None:
+        # Pool sizes are connections per pool, with HTTP/2 one connection carries many requests
+        self.http_version = http_version
+        self.connection_pool_size = connection_pool_size
+        self.media_pool_size = media_pool_size
+        self.get_updates_pool_size = get_updates_pool_size
+        self.keepalive_connections = keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+        self.media_read_timeout = media_read_timeout
+        self.media_write_timeout = media_write_timeout
+        # Added to the long poll timeout
+        self.get_updates_read_timeout = get_updates_read_timeout
+        # Requests answered with a 429 are sent again after the wait when it is at most max_flood_wait seconds
+        self.flood_retries = flood_retries
+        self.max_flood_wait = max_flood_wait
+
+class InlineQueryConfig:
+    def __init__(
+            self,
+            enabled: bool = True,
+            cache_time: int = 300,
+            page_size: int = 20,
+            max_results: int = 1000,
+            cache_size: int = 1024
+            ) -> None:
+        # Inline mode must also be switched on for the bot with @BotFather
+        self.enabled = enabled
+        # Seconds Telegram may serve an answer again without asking, edits show up after that
+        self.cache_time = cache_time
+        # Results per answer, Telegram takes at most 50
+        self.page_size = page_size
+        self.max_results = max_results
+        # Queries whose matches are kept
+        self.cache_size = cache_size
+
+class QuizConfig:
+    def __init__(
+            self,
+            question_time: float = 0.0,
+            time_limit: float = 0.0,
+            timer_tick: float = 0.1,
+            timer_slots: int = 1024
+            ) -> None:
+        # Seconds, for quizzes that set no limits of their own, 0 is no limit
+        self.question_time = question_time
+        self.time_limit = time_limit
+        # Deadlines are checked every tick, a wheel lap is timer_tick * timer_slots seconds
+        self.timer_tick = timer_tick
+        self.timer_slots = timer_slots
+
+class AttemptsConfig:
+    def __init__(
+            self,
+            enabled: bool = True,
+            batch_size: int = 500,
+            flush_interval: float = 5.0,
+            partition_days: int = 30,
+            retention_days: int = 365,
+            compact_interval: float = 3600.0
+            ) -> None:
+        # Every finished quiz attempt with its answers, apart from the latest score per quiz
+        self.enabled = enabled
+        # Attempts are written once this many are waiting or every flush_interval seconds
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Each partition table holds the attempts of partition_days days
+        self.partition_days = partition_days
+        # Partitions older than this are folded into per user summaries and dropped, 0 keeps them all
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+
+class BotConfig:
+    def __init__(
+            self,
+            content_file: str = "bot_content.json",
+            db_file: str = "db/bot_info.db",
+            mode: RunMode = RunMode.POLLING,
+            webhook: WebhookConfig = None,
+            keyboard: KeyboardMode = KeyboardMode.REPLY,
+            concurrent_updates: int = 64,
+            workers: int = 1,
+            base_url: str = "",
+            base_file_url: str = "",
+            metrics: MetricsConfig = None,
+            logging: LoggingConfig = None,
+            flood: FloodConfig = None,
+            broadcast: BroadcastConfig = None,
+            http: HttpConfig = None,
+            inline_query: InlineQueryConfig = None,
+            quiz: QuizConfig = None,
+            attempts: AttemptsConfig = None,
+            name: str = ""
+            ) -> None:
+        self.content_file = content_file
+        self.db_file = db_file
+        self.mode = mode
+        self.webhook = webhook if webhook is not None else WebhookConfig()
+        self.keyboard = keyboard
+        self.concurrent_updates = concurrent_updates
+        self.workers = workers
+        self.base_url = base_url
+        self.base_file_url = base_file_url
+        self.metrics = metrics if metrics is not None else MetricsConfig()
+        self.logging = logging if logging is not None else LoggingConfig()
+        self.flood = flood if flood is not None else FloodConfig()
+        self.broadcast = broadcast if broadcast is not None else BroadcastConfig()
+        self.http = http if http is not None else HttpConfig()
+        self.inline_query = inline_query if inline_query is not None else InlineQueryConfig()
+        self.quiz = quiz if quiz is not None else QuizConfig()
+        self.attempts = attempts if attempts is not None else AttemptsConfig()
+        self.name = name
+
+class FleetConfig:
+    def __init__(
+            self,
+            bots: list = None,
+            metrics: MetricsConfig = None,
+            logging: LoggingConfig = None,
+            http: HttpConfig = None,
+            media_dir: str = "media"
+            ) -> None:
+        # (token, BotConfig) pairs
+        self.bots = bots if bots is not None else []
+        self.metrics = metrics if metrics is not None else MetricsConfig()
+        self.logging = logging if logging is not None else LoggingConfig()
+        # The pools of all bots, the http settings of single bots are ignored
+        self.http = http if http is not None else HttpConfig()
+        self.media_dir = media_dir
+
+CONFIG_SECTIONS = {
+    "webhook": WebhookConfig,
+    "metrics": MetricsConfig,
+    "logging": LoggingConfig,
+    "flood": FloodConfig,
+    "broadcast": BroadcastConfig,
+    "http": HttpConfig,
+    "inline_query": InlineQueryConfig,
+    "quiz": QuizConfig,
+    "attempts": AttemptsConfig
+}
+
+CONFIG_ENUMS = {
+    "mode": RunMode,
+    "keyboard": KeyboardMode
+}
+
+def botConfigFromDict(values: dict) -> BotConfig:
+    kwargs = {}
+    for key, value in values.items():
+        if key in CONFIG_SECTIONS:
+            kwargs[key] = CONFIG_SECTIONS[key](**value)
+        elif key in CONFIG_ENUMS:
+            kwargs[key] = CONFIG_ENUMS[key][value.upper()]
+        else:
+            kwargs[key] = value
+    return BotConfig(**kwargs)
+
+def loadFleetConfig(path: str) -> FleetConfig:
+    # {
+    #     "metrics": {"enabled": true, "port": 9100},
+    #     "logging": {"json": true},
+    #     "http": {"connection_pool_size": 512, "http_version": "2"},
+    #     "defaults": {"keyboard": "inline", "flood": {"rate": 2.0}},
+    #     "bots": [
+    #         {"name": "shop", "token_env": "SHOP_TOKEN", "content_file": "shop/content.json", "db_file": "shop/bot.db"},
+    #         ...
+    #     ]
+    # }
+    # Bot entries take the BotConfig arguments on top of "defaults", the token directly or from an environment variable
+    with open(path, "r", encoding="utf8") as data:
+        values = json.load(data)
+
+    bots = []
+    for idx, entry in enumerate(values.get("bots", [])):
+        entry = dict(values.get("defaults", {}), **entry)
+        token_env = entry.pop("token_env", "")
+        token = entry.pop("token", "") or os.environ.get(token_env, "")
+        entry.setdefault("name", f"bot{idx}")
+        bots.append((token, botConfigFromDict(entry)))
+
+    return FleetConfig(bots,
+                       MetricsConfig(**values.get("metrics", {})),
+                       LoggingConfig(**values.get("logging", {})),
+                       HttpConfig(**values.get("http", {})),
+                       values.get("media_dir", "media"))
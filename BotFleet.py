@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import signal
+
+from typing import Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+from BotConfig import FleetConfig, RunMode
+from HttpTransport import botRequests
+from LogPipeline import LogPipeline
+from MediaStorage import MediaStorage
+from Metrics import Metrics
+from TelegramBot import TelegramBot
+
+logger = logging.getLogger(__name__)
+
+class SharedRequest(BaseRequest):
+    # Every bot initializes and shuts down its requests, the shared pool is left to the fleet
+    def __init__(self, request: BaseRequest) -> None:
+        self.request = request
+
+    @property
+    def read_timeout(self) -> float:
+        return self.request.read_timeout
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+            self,
+            url: str,
+            method: str,
+            request_data: RequestData = None,
+            read_timeout: float = BaseRequest.DEFAULT_NONE,
+            write_timeout: float = BaseRequest.DEFAULT_NONE,
+            connect_timeout: float = BaseRequest.DEFAULT_NONE,
+            pool_timeout: float = BaseRequest.DEFAULT_NONE
+            ) -> Tuple[int, bytes]:
+        return await self.request.do_request(url, method, request_data, read_timeout,
+                                             write_timeout, connect_timeout, pool_timeout)
+
+class BotFleet:
+    def __init__(self, config: FleetConfig) -> None:
+        self.config = config
+
+        # One set of pools for the API calls of all bots, long polls keep one connection each
+        self.request, self.get_updates_request = botRequests(
+            config.http, max(len(config.bots), config.http.get_updates_pool_size))
+        self.media_storage = MediaStorage(config.media_dir)
+        self.metrics = Metrics(config.metrics.enabled)
+
+        self.bots = []
+        for token, bot_config in config.bots:
+            if bot_config.workers > 1:
+                logger.warning("Bot %s asks for %d workers, bots of a fleet run in one process",
+                               bot_config.name, bot_config.workers)
+
+            # The fleet serves the metrics of all bots on its own port
+            bot_config.metrics.enabled = config.metrics.enabled
+            bot_config.metrics.port = 0
+
+            bot = TelegramBot(token, bot_config, SharedRequest(self.request),
+                              SharedRequest(self.get_updates_request), self.media_storage)
+            self.metrics.addBot(bot_config.name, bot.metrics)
+            self.bots.append(bot)
+
+    def run(self) -> None:
+        with LogPipeline(self.config.logging):
+            asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        await self.request.initialize()
+        await self.get_updates_request.initialize()
+        self.media_storage.start()
+        self.metrics.start(self.config.metrics.listen, self.config.metrics.port)
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop_event.set)
+            except (AttributeError, NotImplementedError, RuntimeError):
+                pass
+
+        running = []
+        for bot in self.bots:
+            try:
+                await self.startBot(bot)
+            except Exception:
+                logger.exception("Bot %s failed to start", bot.config.name)
+                await self.stopBot(bot)
+                continue
+            running.append(bot)
+            logger.info("Bot %s is running", bot.config.name)
+
+        try:
+            await stop_event.wait()
+        finally:
+            for bot in running:
+                await self.stopBot(bot)
+
+            await self.media_storage.stop()
+            await self.metrics.stop()
+            await self.get_updates_request.shutdown()
+            await self.request.shutdown()
+            self.media_storage.shutdown()
+
+    async def startBot(self, bot: TelegramBot) -> None:
+        application = bot.application
+        await application.initialize()
+        await bot.postInit(application)
+
+        if bot.config.mode == RunMode.WEBHOOK:
+            # Every webhook bot listens on its own port
+            webhook = bot.config.webhook
+            await application.updater.start_webhook(listen=webhook.listen,
+                                                    port=webhook.port,
+                                                    url_path=webhook.url_path,
+                                                    webhook_url=webhook.webhook_url or None,
+                                                    secret_token=webhook.secret_token or None,
+                                                    max_connections=webhook.max_connections,
+                                                    cert=webhook.cert or None,
+                                                    key=webhook.key or None,
+                                                    allowed_updates=bot.allowedUpdates())
+        else:
+            await application.updater.start_polling(allowed_updates=bot.allowedUpdates())
+
+        await application.start()
+
+    async def stopBot(self, bot: TelegramBot) -> None:
+        application = bot.application
+        try:
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await bot.postStop(application)
+            await application.shutdown()
+            await bot.postShutdown(application)
+        except Exception:
+            logger.exception("Bot %s failed to stop", bot.config.name)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+
+from typing import Callable
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from BackgroundJobs import BackgroundJobs, Job
+from BotConfig import BroadcastConfig
+from DBManager import DBManager, FIRST_CHAT_ID
+
+logger = logging.getLogger(__name__)
+
+# Attempts per chat when Telegram keeps answering with flood waits
+MAX_ATTEMPTS = 3
+
+class Broadcast:
+    def __init__(
+            self,
+            broadcast_id: int,
+            admin_chat_id: int,
+            text: str,
+            media_type: str = "",
+            file_id: str = "",
+            last_chat_id: int = FIRST_CHAT_ID,
+            sent: int = 0,
+            failed: int = 0,
+            blocked: int = 0
+            ) -> None:
+        self.broadcast_id = broadcast_id
+        self.admin_chat_id = admin_chat_id
+        self.text = text
+        self.media_type = media_type
+        self.file_id = file_id
+        self.last_chat_id = last_chat_id
+        self.sent = sent
+        self.failed = failed
+        self.blocked = blocked
+        self.finished = False
+
+class Broadcaster:
+    def __init__(self, db_manager: DBManager, jobs: BackgroundJobs, config: BroadcastConfig = None) -> None:
+        self.db_manager = db_manager
+        self.jobs = jobs
+        self.config = config if config is not None else BroadcastConfig()
+        self.bot = None
+        self.next_send = 0.0
+        # Only one process may pick up interrupted broadcasts
+        self.resume = True
+        self.stopping = False
+
+    def start(self, bot: Bot) -> None:
+        self.bot = bot
+        if not self.resume:
+            return
+
+        # Broadcasts interrupted by a crash or a restart go on from their last checkpoint
+        for row in self.db_manager.getUnfinishedBroadcasts():
+            broadcast = Broadcast(*row)
+            logger.info("Resuming broadcast %d after chat %d", broadcast.broadcast_id, broadcast.last_chat_id)
+            self.submit(broadcast)
+
+    def stop(self) -> None:
+        # Running broadcasts checkpoint what they have sent and are resumed on the next start
+        self.stopping = True
+
+    async def create(self, admin_chat_id: int, text: str, media_type: str = "", file_id: str = "") -> int:
+        # Sharded workers wait for the writer process to hand back the id
+        broadcast_id = await self.runDB(self.db_manager.addBroadcast, admin_chat_id, text, media_type, file_id)
+        return self.submit(Broadcast(broadcast_id, admin_chat_id, text, media_type, file_id))
+
+    def submit(self, broadcast: Broadcast) -> int:
+        async def finished(broadcast: Broadcast) -> str:
+            report = f"sent {broadcast.sent}, failed {broadcast.failed}, blocked {broadcast.blocked}"
+            return report if broadcast.finished else report + ", paused until the bot restarts"
+
+        return self.jobs.submit(broadcast.admin_chat_id, f"broadcast {broadcast.broadcast_id}", self.run,
+                                broadcast, done=finished)
+
+    async def run(self, job: Job, broadcast: Broadcast) -> Broadcast:
+        total = await self.runDB(self.db_manager.countChats)
+        started = time.monotonic()
+
+        while not self.stopping:
+            chat_ids = await self.runDB(self.db_manager.getChatIds, broadcast.last_chat_id, self.config.page_size)
+            if not chat_ids:
+                broadcast.finished = True
+                break
+
+            # Checkpoints are taken after each page, a crash resends at most one page
+            broadcast.last_chat_id = await self.sendPage(broadcast, chat_ids)
+            await self.checkpoint(broadcast, False)
+
+            done = broadcast.sent + broadcast.failed + broadcast.blocked
+            job.progress(f"{done} of about {total} chats, {done / max(time.monotonic() - started, 1):.0f}/s")
+
+        await self.checkpoint(broadcast, broadcast.finished)
+        return broadcast
+
+    async def runDB(self, func: Callable, *args) -> object:
+        # The default executor, the content job thread may be busy with a long job
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def checkpoint(self, broadcast: Broadcast, finished: bool) -> None:
+        await self.runDB(self.db_manager.updateBroadcast, broadcast.broadcast_id, broadcast.last_chat_id,
+                         broadcast.sent, broadcast.failed, broadcast.blocked, finished)
+
+    async def sendPage(self, broadcast: Broadcast, chat_ids: list) -> int:
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait(chat_id)
+        delivered = set()
+
+        async def worker() -> None:
+            while not queue.empty() and not self.stopping:
+                chat_id = queue.get_nowait()
+                await self.deliver(broadcast, chat_id)
+                delivered.add(chat_id)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.config.concurrency, len(chat_ids)))))
+
+        # When stopped halfway, resume after the last chat that has everything before it done
+        last_chat_id = broadcast.last_chat_id
+        for chat_id in chat_ids:
+            if chat_id not in delivered:
+                break
+            last_chat_id = chat_id
+        return last_chat_id
+
+    async def throttle(self) -> None:
+        # Sends are spaced evenly so interactive replies keep part of the global limit
+        now = time.monotonic()
+        slot = max(self.next_send, now)
+        self.next_send = slot + 1 / self.config.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def deliver(self, broadcast: Broadcast, chat_id: int) -> None:
+        for _ in range(MAX_ATTEMPTS):
+            await self.throttle()
+            try:
+                await self.send(broadcast, chat_id)
+                broadcast.sent += 1
+                return
+            except RetryAfter as error:
+                # Everyone waits, Telegram counts the limit per bot
+                self.next_send = max(self.next_send, time.monotonic() + float(error.retry_after))
+            except Forbidden:
+                broadcast.blocked += 1
+                await self.runDB(self.db_manager.setChatBlocked, chat_id)
+                return
+            except BadRequest:
+                broadcast.failed += 1
+                return
+            except TelegramError:
+                logger.exception("Broadcast %d failed for chat %d", broadcast.broadcast_id, chat_id)
+                broadcast.failed += 1
+                return
+
+        broadcast.failed += 1
+
+    async def send(self, broadcast: Broadcast, chat_id: int) -> None:
+        api_kwargs = {"allow_paid_broadcast": True} if self.config.paid else None
+
+        if broadcast.media_type == "photo":
+            await self.bot.send_photo(chat_id, broadcast.file_id, caption=broadcast.text or None, api_kwargs=api_kwargs)
+        elif broadcast.media_type == "video":
+            await self.bot.send_video(chat_id, broadcast.file_id, caption=broadcast.text or None, api_kwargs=api_kwargs)
+        else:
+            await self.bot.send_message(chat_id, broadcast.text, api_kwargs=api_kwargs)
@@ -0,0 +1,121 @@
+import copy
+import io
+import json
+import os
+import zipfile
+
+from ContentNavigator import ContentNavigator, RESERVED_NAMES
+from MediaStorage import MediaStorage
+
+CONTENT_ENTRY = "content.json"
+MEDIA_TYPES = ("image", "video")
+
+class ContentArchive:
+    def __init__(self, navigator: ContentNavigator, media_storage: MediaStorage) -> None:
+        self.navigator = navigator
+        self.media_storage = media_storage
+
+    def unpack(self, archive_data: bytes) -> tuple:
+        errors = []
+
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(archive_data))
+        except zipfile.BadZipFile:
+            return [], ["File is not a zip archive"]
+
+        with archive:
+            entries = set(archive.namelist())
+            if CONTENT_ENTRY not in entries:
+                return [], [f"Archive has no {CONTENT_ENTRY}"]
+
+            try:
+                items = json.loads(archive.read(CONTENT_ENTRY).decode("utf-8"))["content"]
+            except (ValueError, KeyError, TypeError):
+                return [], [f"{CONTENT_ENTRY} is not valid content"]
+
+            self.validateItems(items, entries, "", errors)
+            if errors:
+                return [], errors
+
+            # Validation passed, only now media is written to the store
+            stored = {}
+            for block in self.mediaBlocks(items):
+                if block["content"] not in stored:
+                    extension = os.path.splitext(block["content"])[1]
+                    stored[block["content"]] = self.media_storage.storeFile(archive.read(block["content"]), extension)
+                block["content"] = stored[block["content"]]
+
+        return items, []
+
+    def pack(self, items: list) -> bytes:
+        items = copy.deepcopy(items)
+        buffer = io.BytesIO()
+
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            packed = {}
+            for block in self.mediaBlocks(items):
+                path = block["content"]
+                if path not in packed:
+                    packed[path] = f"media/{len(packed)}_{os.path.basename(path)}"
+                    if os.path.isfile(path):
+                        # Media is already compressed, deflating it again only costs time
+                        archive.write(path, packed[path], zipfile.ZIP_STORED)
+                block["content"] = packed[path]
+
+            archive.writestr(CONTENT_ENTRY, json.dumps({"content": items}, ensure_ascii=False, indent=4))
+
+        return buffer.getvalue()
+
+    def mediaBlocks(self, items: list) -> list:
+        blocks = []
+        for elem in items:
+            if elem["type"] == "navigation":
+                blocks.extend(self.mediaBlocks(elem["content"]))
+            elif elem["type"] == "article":
+                blocks.extend(block for block in elem["content"] if block["type"] in MEDIA_TYPES)
+        return blocks
+
+    def validateItems(self, items: list, entries: set, location: str, errors: list) -> None:
+        if not isinstance(items, list):
+            errors.append(f"{location or '/'}: content must be a list")
+            return
+
+        names = set()
+        for elem in items:
+            if not isinstance(elem, dict) or not isinstance(elem.get("name"), str) or not elem["name"]:
+                errors.append(f"{location or '/'}: item without a name")
+                continue
+
+            name = elem["name"]
+            path = f"{location}/{name}"
+
+            if name in names:
+                errors.append(f"{path}: duplicate name")
+            if name in RESERVED_NAMES:
+                errors.append(f"{path}: name is reserved for a button")
+            names.add(name)
+
+            if elem.get("type") == "navigation":
+                self.validateItems(elem.get("content"), entries, path, errors)
+            elif elem.get("type") == "article":
+                self.validateArticle(elem.get("content"), entries, path, errors)
+            elif elem.get("type") == "quiz":
+                if not isinstance(elem.get("content"), dict) or not self.navigator.isValidQuiz(elem["content"]):
+                    errors.append(f"{path}: invalid quiz")
+            else:
+                errors.append(f"{path}: unknown item type")
+
+    def validateArticle(self, blocks: list, entries: set, path: str, errors: list) -> None:
+        if not isinstance(blocks, list):
+            errors.append(f"{path}: article content must be a list")
+            return
+
+        for idx, block in enumerate(blocks):
+            if not isinstance(block, dict) or not isinstance(block.get("content"), str):
+                errors.append(f"{path}[{idx}]: block without content")
+            elif block.get("type") in MEDIA_TYPES:
+                if block["content"] not in entries:
+                    errors.append(f"{path}[{idx}]: {block['content']} is missing from the archive")
+                block.setdefault("caption", "")
+            elif block.get("type") != "text":
+                errors.append(f"{path}[{idx}]: unknown block type")
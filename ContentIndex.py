@@ -0,0 +1,67 @@
+import asyncio
+import collections
+import logging
+
+from ContentNavigator import ContentNavigator
+from SearchIndex import SearchIndex, searchWords
+
+logger = logging.getLogger(__name__)
+
+class ContentIndex:
+    def __init__(self, navigator: ContentNavigator, cache_size: int = 1024, max_results: int = 1000) -> None:
+        self.navigator = navigator
+        self.cache_size = cache_size
+        self.max_results = max_results
+        # Built for one content version, replaced as a whole once the next one is built
+        self.index = None
+        self.building = None
+        # query words: match numbers of self.cache_index, least recently used first
+        self.cache = collections.OrderedDict()
+        self.cache_index = None
+
+    def isCurrent(self) -> bool:
+        return self.index is not None and self.index.version is self.navigator.version
+
+    def build(self) -> None:
+        self.index = SearchIndex(self.navigator.version, self.max_results, self.index)
+
+    def built(self, future: asyncio.Future) -> None:
+        self.building = None
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Building the search index failed", exc_info=future.exception())
+
+    def refresh(self) -> asyncio.Future:
+        if not self.isCurrent() and self.building is None:
+            # Built off the event loop, one build at a time
+            self.building = asyncio.get_running_loop().run_in_executor(None, self.build)
+            self.building.add_done_callback(self.built)
+        return self.building
+
+    async def search(self, query: str, offset: int, limit: int) -> tuple:
+        # ([(node id, path, ButtonType, article pages)], next offset or 0 on the last page)
+        building = self.refresh()
+
+        # Until the new index is ready queries are answered from the one before the edit
+        if self.index is None:
+            await asyncio.shield(building)
+
+        index = self.index
+        matches = self.match(index, tuple(searchWords(query)))
+        next_offset = offset + limit if offset + limit < len(matches) else 0
+        return [index.entries[number] for number in matches[offset:offset + limit]], next_offset
+
+    def match(self, index: SearchIndex, query: tuple) -> list:
+        if index is not self.cache_index:
+            self.cache.clear()
+            self.cache_index = index
+
+        if query in self.cache:
+            self.cache.move_to_end(query)
+            return self.cache[query]
+
+        matches = index.rank(query)
+
+        self.cache[query] = matches
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return matches
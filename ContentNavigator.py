@@ -1,63 +1,286 @@
+import collections
+import contextlib
+import copy
+import hashlib
 import json
 import os
+import threading
 
+from typing import Callable
+
+from ArticlePaginator import ArticlePaginator
+from MediaStorage import MediaStorage
 from UserInfo import UserInfo
 from NavigationContent import NavigationContent, ButtonType
 from ArticleContent import ArticleContent, ArticleContentType
+from ContentVersion import ContentVersion
 from QuizContent import QuizContent, Question, Answer
 
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows, the content file is only shared between processes on POSIX
+    fcntl = None
+
+# Versions kept for undoing admin edits
+UNDO_DEPTH = 20
+
+TYPE_NAMES = {
+    ButtonType.NAVIGATION: "navigation",
+    ButtonType.ARTICLE: "article",
+    ButtonType.QUIZ: "quiz"
+}
+
+MEDIA_BLOCKS = ("image", "video")
+
+# Button labels of the menu and article keyboards, an item named like one could never be opened
+RESERVED_NAMES = ("Back", "Done", "Add", "Delete", "Quiz Results", "Next", "Prev")
+
+def nodeId(path: list) -> str:
+    # Derived from the path, so keyboards sent before a content change keep working
+    return hashlib.blake2b("\n".join(path).encode("utf8"), digest_size=6).hexdigest()
+
 class ContentNavigator:
     def __init__(
             self,
-            content_file: str
+            content_file: str,
+            media_storage: MediaStorage = None
             ) -> None:
         self.content_file = content_file
-        self.content = {}
-        self.navigation_filter = ""
-        self.article_filter = ""
-        self.quiz_filter = ""
+        self.media_storage = media_storage if media_storage is not None else MediaStorage()
+        self.paginator = ArticlePaginator()
+        # Readers take this once and use only that version, edits publish a new one
+        self.version = ContentVersion()
+        self.undo_versions = collections.deque(maxlen=UNDO_DEPTH)
+        # Only writers lock, one edit at a time
+        self.edit_lock = threading.Lock()
+        # Set when other processes edit the same file, edits then lock the file and start from its latest text
+        self.shared = False
+        # (inode, mtime, size) of the file text self.version was loaded from or saved as
+        self.content_stamp = None
+        self.listeners = []
         self.updateContent()
 
     def updateContent(self) -> None:
-        self.content = {}
-        self.navigation_filter = "^("
-        self.article_filter = "^("
-        self.quiz_filter = "^("
+        with self.edit_lock:
+            self.loadContent()
 
-        data = open(self.content_file, "r", encoding="utf8")
-        content = json.load(data)["content"]
-        data.close()
+    def reloadChanges(self) -> bool:
+        # True when the file was changed since this navigator last read or wrote it
+        with self.edit_lock, self.fileLock():
+            return self.loadChanges()
 
-        self.content = self.getJSONContent(content)
-        
-        self.navigation_filter += "Back)$"
+    def loadChanges(self) -> bool:
+        if self.fileStamp(os.stat(self.content_file)) == self.content_stamp:
+            return False
 
-        if self.article_filter[-1] == '|':
-            self.article_filter = self.article_filter[:-1]
-        self.article_filter += ")$"
-        
-        if self.quiz_filter[-1] == '|':
-            self.quiz_filter = self.quiz_filter[:-1]
-        self.quiz_filter += ")$"
+        self.loadContent()
+        return True
 
-    def getJSONContent(self, values: list) -> dict:
+    def loadContent(self) -> None:
+        with open(self.content_file, "r", encoding="utf8") as data:
+            content = json.load(data)["content"]
+            stamp = self.fileStamp(os.fstat(data.fileno()))
+
+        version = ContentVersion(self.version.number + 1)
+        version.nodes[nodeId([])] = ([], ButtonType.NAVIGATION)
+        version.content = self.getJSONContent(content, version, [])
+
+        # The file was changed outside this navigator, older versions can't be restored over it
+        self.undo_versions.clear()
+        self.content_stamp = stamp
+        self.publish(version)
+
+    def fileStamp(self, stat: os.stat_result) -> tuple:
+        # Saving renames a new file over the old one, so the inode changes even within one mtime tick
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @contextlib.contextmanager
+    def fileLock(self):
+        if not self.shared or fcntl is None:
+            yield
+            return
+
+        with open(self.content_file + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def publish(self, version: ContentVersion) -> None:
+        version.finish()
+        self.version = version
+        # Media of the versions /undo can restore stays out of the garbage collection too
+        references = dict(version.references)
+        for undo_version in self.undo_versions:
+            for path, count in undo_version.references.items():
+                references[path] = references.get(path, 0) + count
+        self.media_storage.setReferences(references, self.content_file)
+
+    def addListener(self, listener: Callable[[], None]) -> None:
+        self.listeners.append(listener)
+
+    def contentChanged(self) -> None:
+        for listener in self.listeners:
+            listener()
+
+    def getJSONContent(self, values: list, version: ContentVersion, path: list) -> dict:
         markup = {}
 
         for elem in values:
+            elem_path = path + [elem["name"]]
+            node_id = nodeId(elem_path)
+
             if elem["type"] == "navigation":
-                self.navigation_filter += elem["name"] + "|"
-                markup[elem["name"]] = NavigationContent(elem["name"], ButtonType.NAVIGATION, self.getJSONContent(elem["content"]))
+                version.countName("navigation", elem["name"], 1)
+                version.nodes[node_id] = (elem_path, ButtonType.NAVIGATION)
+                markup[elem["name"]] = NavigationContent(elem["name"], ButtonType.NAVIGATION,
+                                                         self.getJSONContent(elem["content"], version, elem_path),
+                                                         node_id)
             elif elem["type"] == "article":
-                self.article_filter += elem["name"] + "|"
-                markup[elem["name"]] = NavigationContent(elem["name"], ButtonType.ARTICLE, elem["content"])
+                version.countName("article", elem["name"], 1)
+                for block in elem["content"]:
+                    if block["type"] in MEDIA_BLOCKS:
+                        version.countReference(block["content"], 1)
+                version.nodes[node_id] = (elem_path, ButtonType.ARTICLE)
+                # Split once here, opening an article then costs the same whatever its length
+                version.pages[node_id] = self.paginator.paginate(self.getArticleBlocks(elem["content"]))
+                markup[elem["name"]] = NavigationContent(elem["name"], ButtonType.ARTICLE, elem["content"], node_id)
             elif elem["type"] == "quiz":
-                self.quiz_filter += elem["name"] + "|"
-                markup[elem["name"]] = NavigationContent(elem["name"], ButtonType.QUIZ, elem["content"])
+                version.countName("quiz", elem["name"], 1)
+                version.nodes[node_id] = (elem_path, ButtonType.QUIZ)
+                markup[elem["name"]] = NavigationContent(elem["name"], ButtonType.QUIZ, elem["content"], node_id)
 
         return markup
 
+    def dropContent(self, node: NavigationContent, version: ContentVersion) -> None:
+        version.countName(TYPE_NAMES[node.type], node.label, -1)
+        version.nodes.pop(node.node_id, None)
+
+        if node.type == ButtonType.NAVIGATION:
+            for child in node.content.values():
+                self.dropContent(child, version)
+        elif node.type == ButtonType.ARTICLE:
+            version.pages.pop(node.node_id, None)
+            for block in node.content:
+                if block["type"] in MEDIA_BLOCKS:
+                    version.countReference(block["content"], -1)
+
+    def findLevel(self, content: dict, history: list) -> dict:
+        current_location = content
+
+        for elem in history:
+            if elem not in current_location or current_location[elem].type != ButtonType.NAVIGATION:
+                return None
+            current_location = current_location[elem].content
+
+        return current_location
+
+    def replaceLevel(self, level: dict, path: list, change: Callable[[dict], dict]) -> dict:
+        # Only the items along the path are copied, every other item is shared with the previous version
+        if not path:
+            return change(dict(level))
+
+        node = level.get(path[0])
+        if node is None or node.type != ButtonType.NAVIGATION:
+            return None
+
+        new_content = self.replaceLevel(node.content, path[1:], change)
+        if new_content is None:
+            return None
+
+        new_level = dict(level)
+        new_level[path[0]] = NavigationContent(node.label, node.type, new_content, node.node_id)
+        return new_level
+
+    def editLevel(self, history: list, change: Callable[[dict, ContentVersion], dict]) -> bool:
+        with self.edit_lock, self.fileLock():
+            # An edit saved by another process since the last reload is kept, this one goes on top of it
+            if self.shared:
+                self.loadChanges()
+
+            version = self.version.derive()
+            new_content = self.replaceLevel(version.content, history, lambda level: change(level, version))
+            if new_content is None:
+                return False
+
+            version.content = new_content
+            self.saveContent(version)
+            self.undo_versions.append(self.version)
+            self.publish(version)
+
+        self.contentChanged()
+        return True
+
+    def undoEdit(self) -> int:
+        # Number of the restored version, 0 when there is nothing to undo
+        with self.edit_lock, self.fileLock():
+            # Another process saved the file since, the versions kept here would undo its edit too
+            if self.shared and self.loadChanges():
+                return 0
+
+            if not self.undo_versions:
+                return 0
+
+            version = self.undo_versions.pop()
+            self.saveContent(version)
+            self.publish(version)
+
+        self.contentChanged()
+        return version.number
+
+    def saveContent(self, version: ContentVersion) -> None:
+        # Written next to the file and renamed, a crash or a reload mid-write never sees half of it
+        temp_file = f"{self.content_file}.{os.getpid()}.{threading.get_ident()}.part"
+        # The top level is written item by item, joining it first would copy the whole file once more
+        with open(temp_file, "w", encoding="utf8") as data:
+            if not version.content:
+                data.write("{\n    \"content\": []\n}")
+            else:
+                separator = "{\n    \"content\": [\n        "
+                for node in version.content.values():
+                    data.write(separator)
+                    data.write(self.dumpItem(node, 2))
+                    separator = ",\n        "
+                data.write("\n    ]\n}")
+        os.replace(temp_file, self.content_file)
+        self.content_stamp = self.fileStamp(os.stat(self.content_file))
+
+    def dumpLevel(self, level: dict, depth: int) -> str:
+        # Same text as json.dumps(indent=4), built from the texts cached on the items
+        if not level:
+            return "[]"
+
+        indent = "    " * (depth + 1)
+        items = ",\n".join(indent + self.dumpItem(node, depth + 1) for node in level.values())
+        return "[\n" + items + "\n" + "    " * depth + "]"
+
+    def dumpItem(self, node: NavigationContent, depth: int) -> str:
+        # An item stays at the depth it was created at, so its text can be reused by every later version
+        if node.serialized:
+            return node.serialized
+
+        indent = "    " * (depth + 1)
+        if node.type == ButtonType.NAVIGATION:
+            content = self.dumpLevel(node.content, depth + 1)
+        else:
+            content = json.dumps(node.content, ensure_ascii=False, indent=4).replace("\n", "\n" + indent)
+
+        node.serialized = (f"{{\n{indent}\"type\": \"{TYPE_NAMES[node.type]}\",\n"
+                           f"{indent}\"name\": {json.dumps(node.label, ensure_ascii=False)},\n"
+                           f"{indent}\"content\": {content}\n" + "    " * depth + "}")
+        return node.serialized
+
+    def dumpJSON(self, level: dict) -> list:
+        items = []
+        for node in level.values():
+            content = self.dumpJSON(node.content) if node.type == ButtonType.NAVIGATION else node.content
+            items.append({"type": TYPE_NAMES[node.type], "name": node.label, "content": content})
+        return items
+
     def moveTo(self, user_info: UserInfo, move_to: str) -> list:
-        current_location = self.content
+        current_location = self.version.content
         
         history_size = len(user_info.history)
         if move_to == "Back" and history_size > 0:
@@ -80,8 +303,13 @@ class ContentNavigator:
 
         return content
     
+    def getNode(self, node_id: str) -> tuple:
+        # (path, type), or (None, None) for an item removed since its button was sent
+        path, node_type = self.version.nodes.get(node_id, (None, None))
+        return (list(path), node_type) if path is not None else (None, None)
+
     def getArticle(self, user_info: UserInfo, article: str) -> list:
-        current_location = self.content
+        current_location = self.version.content
 
         for elem in user_info.history:
             if elem in current_location:
@@ -92,8 +320,10 @@ class ContentNavigator:
         if article not in current_location:
             return []
 
+        return self.getArticleBlocks(current_location[article].content)
+
+    def getArticleBlocks(self, article_content: list) -> list:
         ret = []
-        article_content = current_location[article].content
 
         for elem in article_content:
             if elem["type"] == "text":
@@ -105,8 +335,11 @@ class ContentNavigator:
 
         return ret
 
+    def getArticlePages(self, node_id: str) -> list:
+        return self.version.pages.get(node_id, [])
+
     def getQuiz(self, user_info: UserInfo, quiz: str) -> QuizContent:
-        current_location = self.content
+        current_location = self.version.content
 
         for elem in user_info.history:
             if elem in current_location:
@@ -119,165 +352,45 @@ class ContentNavigator:
 
         quiz_content = current_location[quiz]
 
-        ret = QuizContent(quiz_content.label, quiz_content.content["total_score"], [])
+        ret = QuizContent(quiz_content.label, quiz_content.content["total_score"], [],
+                          quiz_content.content.get("question_time", 0), quiz_content.content.get("time_limit", 0))
 
         for elem in quiz_content.content["questions"]:
-            new_question = Question(elem["name"], elem["hint"], elem["points"], [])
+            new_question = Question(elem["name"], elem["hint"], elem["points"], [], elem.get("time_limit", 0))
             for answer in elem["answers"]:
                 new_question.answers.append(Answer(answer["text"], False if answer["is_correct"] == "false" else True))
             ret.questions.append(new_question)
 
         return ret
 
-    def addNavigation(self, user_info: UserInfo, new_item: str) -> bool:
-        data = open(self.content_file, "r+", encoding="utf8")
-        content = json.load(data)
-
-        current_content = content["content"]
-
-        is_exist = False
-        for elem in user_info.history:
-            is_exist = False
-            for value in current_content:
-                if value["name"] == elem:
-                    is_exist = True
-                    current_content = value["content"]
-                    break
-        
-        if not is_exist and len(user_info.history) > 0:
-            data.close()
-            return False
-        
-        for elem in current_content:
-            if elem["name"] == new_item:
-                data.close()
-                return False
-
-        new_elem = {}
-        new_elem["type"] = "navigation"
-        new_elem["name"] = new_item
-        new_elem["content"] = []
-
-        current_content.append(new_elem)
+    def addItems(self, history: list, new_items: list) -> bool:
+        def change(level: dict, version: ContentVersion) -> dict:
+            for elem in new_items:
+                if elem["name"] in level:
+                    return None
 
-        new_json = json.dumps(content, ensure_ascii=False, indent=4)
-        data.seek(0)
-        data.write(new_json)
-        data.truncate()
-        data.close()
+            level.update(self.getJSONContent(new_items, version, history))
+            return level
 
-        self.updateContent()
+        return self.editLevel(history, change)
 
-        return True
+    def addNavigation(self, user_info: UserInfo, new_item: str) -> bool:
+        return self.addItems(user_info.history, [{"type": "navigation", "name": new_item, "content": []}])
 
     def removeItem(self, user_info: UserInfo, remove_item: str) -> bool:
-        data = open(self.content_file, "r+", encoding="utf8")
-        content = json.load(data)
+        def change(level: dict, version: ContentVersion) -> dict:
+            if remove_item not in level:
+                return None
 
-        current_content = content["content"]
-    
-        is_exist = False
-        for elem in user_info.history:
-            is_exist = False
-            for value in current_content:
-                if value["name"] == elem:
-                    is_exist = True
-                    current_content = value["content"]
-                    break
-        
-        if not is_exist and len(user_info.history) > 0:
-            data.close()
-            return False
+            self.dropContent(level.pop(remove_item), version)
+            return level
 
-        for idx, elem in enumerate(current_content):
-            if elem["name"] == remove_item:
-                if elem["type"] == "article":
-                    for elem2 in elem["content"]:
-                        if (elem2["type"] == "image" or elem2["type"] == "video") \
-                            and os.path.isfile(elem2["content"]):
-                            os.remove(elem2["content"])
-                del current_content[idx]
-                new_json = json.dumps(content, ensure_ascii=False, indent=4)
-                data.seek(0)
-                data.write(new_json)
-                data.truncate()
-                data.close()
-                self.updateContent()
-                return True
-            
-        data.close()
-        return False
+        return self.editLevel(user_info.history, change)
 
     def addArticle(self, user_info: UserInfo, new_item: str) -> bool:
-        data = open(self.content_file, "r+", encoding="utf8")
-        content = json.load(data)
-
-        current_content = content["content"]
-
-        is_exist = False
-        for elem in user_info.history:
-            is_exist = False
-            for value in current_content:
-                if value["name"] == elem:
-                    is_exist = True
-                    current_content = value["content"]
-                    break
-        
-        if not is_exist and len(user_info.history) > 0:
-            data.close()
-            return False
-
-        for elem in current_content:
-            if elem["name"] == new_item:
-                data.close()
-                return False
-
-        new_elem = {}
-        new_elem["type"] = "article"
-        new_elem["name"] = new_item
-        new_elem["content"] = []
-
-        current_content.append(new_elem)
-
-        new_json = json.dumps(content, ensure_ascii=False, indent=4)
-        data.seek(0)
-        data.write(new_json)
-        data.truncate()
-        data.close()
-
-        self.updateContent()
-
-        return True
+        return self.addItems(user_info.history, [{"type": "article", "name": new_item, "content": []}])
 
     def appendArticleContent(self, user_info: UserInfo, article: str, new_content: ArticleContent) -> bool:
-        data = open(self.content_file, "r+", encoding="utf8")
-        content = json.load(data)
-
-        current_content = content["content"]
-
-        is_exist = False
-        for elem in user_info.history:
-            is_exist = False
-            for value in current_content:
-                if value["name"] == elem:
-                    is_exist = True
-                    current_content = value["content"]
-                    break
-        
-        if not is_exist and len(user_info.history) > 0:
-            data.close()
-            return False
-
-        current_article_content = None
-
-        for elem in current_content:
-            if elem["name"] == article:
-                current_article_content = elem["content"]
-
-        if current_article_content == None:
-            data.close()
-            return False
-
         new_elem = {}
         new_elem["content"] = new_content.content
         
@@ -290,74 +403,66 @@ class ContentNavigator:
             new_elem["type"] = "video"
             new_elem["caption"] = new_content.caption 
 
-        current_article_content.append(new_elem)
-
-        new_json = json.dumps(content, ensure_ascii=False, indent=4)
-        data.seek(0)
-        data.write(new_json)
-        data.truncate()
-        data.close()
+        def change(level: dict, version: ContentVersion) -> dict:
+            node = level.get(article)
+            if node is None or node.type != ButtonType.ARTICLE:
+                return None
 
-        self.updateContent()
+            # The block list is shared with the previous version, the article gets a new one
+            article_content = node.content + [new_elem]
+            level[article] = NavigationContent(node.label, node.type, article_content, node.node_id)
+            version.pages[node.node_id] = self.paginator.paginate(self.getArticleBlocks(article_content))
+            if new_elem["type"] in MEDIA_BLOCKS:
+                version.countReference(new_elem["content"], 1)
+            return level
 
-        return True
+        return self.editLevel(user_info.history, change)
 
     def addQuiz(self, user_info: UserInfo, name: str, content: str) -> bool:
-        with open(self.content_file, "r+", encoding="utf8") as data:
-            old_content = json.load(data)
-
-            current_content = old_content["content"]
-
-            is_exist = False
-            for elem in user_info.history:
-                is_exist = False
-                for value in current_content:
-                    if value["name"] == elem:
-                        is_exist = True
-                        current_content = value["content"]
-                        break
-            
-            if not is_exist and len(user_info.history) > 0:
-                data.close()
-                return False
-            
-            for elem in current_content:
-                if elem["name"] == name:
-                    data.close()
-                    return False
+        new_content = json.loads(content)
+
+        if not self.isValidQuiz(new_content):
+            return False
 
-            new_content = json.loads(content)
+        return self.addItems(user_info.history, [{"type": "quiz", "name": name, "content": new_content}])
 
-            if "total_score" not in new_content:
-                data.close()
+    def isValidQuiz(self, quiz: dict) -> bool:
+        # Types are checked too, a quiz that passes here must not fail halfway through being taken
+        if not isinstance(quiz, dict) or not self.isNumber(quiz.get("total_score")) \
+                or not isinstance(quiz.get("questions"), list):
+            return False
+
+        if not self.isValidTime(quiz, "question_time") or not self.isValidTime(quiz, "time_limit"):
+            return False
+
+        for elem in quiz["questions"]:
+            if not isinstance(elem, dict) or not isinstance(elem.get("name"), str) or \
+            not self.isNumber(elem.get("points")) or not isinstance(elem.get("hint"), str) or \
+            not isinstance(elem.get("answers"), list):
                 return False
-            
-            if "questions" not in new_content:
-                data.close()
+
+            if not self.isValidTime(elem, "time_limit"):
                 return False
 
-            for elem in new_content["questions"]:
-                if ("name" not in elem) or ("points" not in elem) or \
-                ("hint" not in elem) or ("answers" not in elem):
-                    data.close()
+            for answer in elem["answers"]:
+                if not isinstance(answer, dict) or not isinstance(answer.get("text"), str) or \
+                ("is_correct" not in answer):
                     return False
 
-                for answer in elem["answers"]:
-                    if ("text" not in answer) or ("is_correct" not in answer):
-                        data.close()
-                        return False
+        return True
 
-            new_quiz = { "type": "quiz", "name": name, "content": new_content }
+    def isNumber(self, value: object) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
 
-            current_content.append(new_quiz)
+    def isValidTime(self, values: dict, key: str) -> bool:
+        # Time limits are optional, in seconds
+        value = values.get(key, 0)
+        return self.isNumber(value) and value >= 0
 
-            new_json = json.dumps(old_content, ensure_ascii=False, indent=4)
-            data.seek(0)
-            data.write(new_json)
-            data.truncate()
+    def exportContent(self, user_info: UserInfo) -> list:
+        current_content = self.findLevel(self.version.content, user_info.history)
+        # A copy, the archive rewrites media paths in place
+        return copy.deepcopy(self.dumpJSON(current_content)) if current_content is not None else []
 
-            data.close()
-            self.updateContent()
-            return True
-        
-        return False
+    def importContent(self, user_info: UserInfo, new_items: list) -> bool:
+        return self.addItems(user_info.history, new_items)
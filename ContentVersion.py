@@ -0,0 +1,64 @@
+import re
+
+ITEM_TYPES = ("navigation", "article", "quiz")
+
+class ContentVersion:
+    def __init__(
+            self,
+            number: int = 0,
+            content: dict = None,
+            nodes: dict = None,
+            pages: dict = None,
+            names: dict = None,
+            references: dict = None
+            ) -> None:
+        self.number = number
+        # name: NavigationContent, never changed once published, later versions share the untouched items
+        self.content = content if content is not None else {}
+        # node id: (path, ButtonType)
+        self.nodes = nodes if nodes is not None else {}
+        # node id: article pages
+        self.pages = pages if pages is not None else {}
+        # item type: {name: number of items with it}
+        self.names = names if names is not None else {item_type: {} for item_type in ITEM_TYPES}
+        # media path: number of blocks using it
+        self.references = references if references is not None else {}
+        self.navigation_filter = ""
+        self.article_filter = ""
+        self.quiz_filter = ""
+        # The filters compiled, with thousands of names that takes long enough to be kept off the event loop
+        self.navigation_pattern = None
+        self.article_pattern = None
+        self.quiz_pattern = None
+        self.item_counts = {}
+
+    def derive(self) -> "ContentVersion":
+        # The indexes are flat, copying them is cheap next to rebuilding them
+        return ContentVersion(self.number + 1,
+                              self.content,
+                              dict(self.nodes),
+                              dict(self.pages),
+                              {item_type: dict(names) for item_type, names in self.names.items()},
+                              dict(self.references))
+
+    def countName(self, item_type: str, name: str, step: int) -> None:
+        self.count(self.names[item_type], name, step)
+
+    def countReference(self, path: str, step: int) -> None:
+        self.count(self.references, path, step)
+
+    def count(self, counts: dict, key: str, step: int) -> None:
+        counts[key] = counts.get(key, 0) + step
+        if counts[key] <= 0:
+            del counts[key]
+
+    def finish(self) -> None:
+        # Filters and counts are derived once, when the version is complete
+        # Names are matched literally, whatever characters they contain
+        self.navigation_filter = "^(" + "".join(re.escape(name) + "|" for name in self.names["navigation"]) + "Back)$"
+        self.article_filter = "^(" + "|".join(re.escape(name) for name in self.names["article"]) + ")$"
+        self.quiz_filter = "^(" + "|".join(re.escape(name) for name in self.names["quiz"]) + ")$"
+        self.navigation_pattern = re.compile(self.navigation_filter)
+        self.article_pattern = re.compile(self.article_filter)
+        self.quiz_pattern = re.compile(self.quiz_filter)
+        self.item_counts = {item_type: sum(names.values()) for item_type, names in self.names.items()}
@@ -1,13 +1,33 @@
+import datetime
 import sqlite3
+import threading
 from typing import Any
 
+# Broadcasts page through chats from here, below every id, groups and channels have negative ones
+FIRST_CHAT_ID = -2 ** 63
+
+# Quiz attempts go to one table per period, named after the period's first day
+ATTEMPT_PARTITION_PREFIX = "quiz_attempts_"
+
+def attemptPartition(timestamp: float, partition_days: int) -> str:
+    day = int(timestamp // 86400) // partition_days * partition_days
+    return ATTEMPT_PARTITION_PREFIX + (datetime.date(1970, 1, 1) + datetime.timedelta(days=day)).strftime("%Y%m%d")
+
+def partitionEnd(table: str, partition_days: int) -> float:
+    start = datetime.datetime.strptime(table[len(ATTEMPT_PARTITION_PREFIX):], "%Y%m%d")
+    return (start.replace(tzinfo=datetime.timezone.utc) + datetime.timedelta(days=partition_days)).timestamp()
+
 class DBManager:
-    def __init__(self, db_file: str) -> None:
+    def __init__(self, db_file: str, timeout: float = 30.0) -> None:
         self.db_file = db_file
+        self.timeout = timeout
+        self.write_lock = threading.Lock()
 
     def initDB(self) -> None: 
-        connect = sqlite3.connect(self.db_file)
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
         cursor = connect.cursor()
+        # WAL lets readers run while a result is being written
+        cursor.execute("PRAGMA journal_mode=WAL")
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS quiz_results (
             id INTEGER PRIMARY KEY,
@@ -17,21 +37,55 @@ class DBManager:
             UNIQUE(user_id,quiz_name)
         )
         """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            first_name TEXT NOT NULL,
+            blocked INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY,
+            admin_chat_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            media_type TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            last_chat_id INTEGER NOT NULL DEFAULT -9223372036854775808,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            finished INTEGER NOT NULL DEFAULT 0
+        )
+        """)
+        # What compaction keeps of attempts past their retention
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_attempt_summaries (
+            user_id INTEGER NOT NULL,
+            quiz_name TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            timed_out INTEGER NOT NULL,
+            best_score REAL NOT NULL,
+            score_sum REAL NOT NULL,
+            first_at REAL NOT NULL,
+            last_at REAL NOT NULL,
+            PRIMARY KEY(user_id,quiz_name)
+        )
+        """)
         connect.commit()
         connect.close()
     
     def getQuizScore(self, user_id: int, quiz_name: str) -> Any:
-        connect = sqlite3.connect(self.db_file)
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
         cursor = connect.cursor()
         res = cursor.execute("SELECT quiz_score FROM quiz_results WHERE user_id = ? AND quiz_name = ?", (user_id, quiz_name))
         quiz_result = res.fetchone()
-        print(type(quiz_result))
-        print(quiz_result)
         connect.close()
         return quiz_result
 
     def getAllScores(self, user_id: int) -> list:
-        connect = sqlite3.connect(self.db_file)
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
         cursor = connect.cursor()
         res = []
         for row in cursor.execute("SELECT quiz_name, quiz_score FROM quiz_results WHERE user_id = ?", [user_id]):
@@ -40,19 +94,194 @@ class DBManager:
         return res
     
     def addUserResult(self, user_id: int, quiz_name: str, quiz_score: str) -> None:
-        connect = sqlite3.connect(self.db_file)
+        with self.write_lock:
+            connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+            cursor = connect.cursor()
+            cursor.execute("""
+                INSERT INTO quiz_results (quiz_score, user_id, quiz_name)  VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, quiz_name) DO
+                        UPDATE SET quiz_score = ? WHERE user_id = ? AND quiz_name = ?
+            """, (quiz_score, user_id, quiz_name, quiz_score, user_id, quiz_name))
+            connect.commit()
+            connect.close()
+
+    def deleteQuizFromDB(self, quiz_name: str) -> None:
+        with self.write_lock:
+            connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+            cursor = connect.cursor()
+            cursor.execute("DELETE FROM quiz_results WHERE quiz_name = ?", (quiz_name,))
+            connect.commit()
+            connect.close()
+
+    def addChat(self, chat_id: int, user_id: int, first_name: str) -> None:
+        with self.write_lock:
+            connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+            cursor = connect.cursor()
+            # A user coming back after blocking the bot can be reached again
+            cursor.execute("""
+                INSERT INTO chats (chat_id, user_id, first_name) VALUES (?, ?, ?)
+                    ON CONFLICT (chat_id) DO UPDATE SET first_name = ?, blocked = 0
+            """, (chat_id, user_id, first_name, first_name))
+            connect.commit()
+            connect.close()
+
+    def setChatBlocked(self, chat_id: int) -> None:
+        with self.write_lock:
+            connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+            cursor = connect.cursor()
+            cursor.execute("UPDATE chats SET blocked = 1 WHERE chat_id = ?", (chat_id,))
+            connect.commit()
+            connect.close()
+
+    def getChatIds(self, after_chat_id: int, limit: int) -> list:
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
         cursor = connect.cursor()
-        cursor.execute("""
-            INSERT INTO quiz_results (quiz_score, user_id, quiz_name)  VALUES (?, ?, ?)
-                ON CONFLICT (user_id, quiz_name) DO
-                    UPDATE SET quiz_score = ? WHERE user_id = ? AND quiz_name = ?
-        """, (quiz_score, user_id, quiz_name, quiz_score, user_id, quiz_name))
-        connect.commit()
+        res = [row[0] for row in cursor.execute(
+            "SELECT chat_id FROM chats WHERE chat_id > ? AND blocked = 0 ORDER BY chat_id LIMIT ?",
+            (after_chat_id, limit))]
         connect.close()
+        return res
 
-    def deleteQuizFromDB(self, quiz_name: str) -> None:
-        connect = sqlite3.connect(self.db_file)
+    def countChats(self) -> int:
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
         cursor = connect.cursor()
-        cursor.execute("DELETE FROM quiz_results WHERE quiz_name = ?", (quiz_name,))
-        connect.commit()
+        count = cursor.execute("SELECT COUNT(*) FROM chats WHERE blocked = 0").fetchone()[0]
+        connect.close()
+        return count
+
+    def addBroadcast(self, admin_chat_id: int, text: str, media_type: str, file_id: str) -> int:
+        with self.write_lock:
+            connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+            cursor = connect.cursor()
+            # Set explicitly, databases created before groups were reached still default to 0
+            cursor.execute("""
+                INSERT INTO broadcasts (admin_chat_id, text, media_type, file_id, last_chat_id) VALUES (?, ?, ?, ?, ?)
+            """, (admin_chat_id, text, media_type, file_id, FIRST_CHAT_ID))
+            broadcast_id = cursor.lastrowid
+            connect.commit()
+            connect.close()
+            return broadcast_id
+
+    def updateBroadcast(
+            self,
+            broadcast_id: int,
+            last_chat_id: int,
+            sent: int,
+            failed: int,
+            blocked: int,
+            finished: bool
+            ) -> None:
+        with self.write_lock:
+            connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+            cursor = connect.cursor()
+            cursor.execute("""
+                UPDATE broadcasts SET last_chat_id = ?, sent = ?, failed = ?, blocked = ?, finished = ?
+                    WHERE id = ?
+            """, (last_chat_id, sent, failed, blocked, int(finished), broadcast_id))
+            connect.commit()
+            connect.close()
+
+    def getUnfinishedBroadcasts(self) -> list:
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+        cursor = connect.cursor()
+        res = []
+        for row in cursor.execute("""
+                SELECT id, admin_chat_id, text, media_type, file_id, last_chat_id, sent, failed, blocked
+                    FROM broadcasts WHERE finished = 0 ORDER BY id
+                """):
+            res.append(row)
+        connect.close()
+        return res
+
+    def addAttempts(self, attempts: list, partition_days: int) -> None:
+        # (finished_at, user_id, quiz_name, started_at, score, total_score, timed_out, answers) rows,
+        # appended without indexes, a batch is one transaction
+        partitions = {}
+        for attempt in attempts:
+            partitions.setdefault(attemptPartition(attempt[0], partition_days), []).append(attempt)
+
+        with self.write_lock:
+            connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+            cursor = connect.cursor()
+            for table, rows in partitions.items():
+                cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    finished_at REAL NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    quiz_name TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    score REAL NOT NULL,
+                    total_score REAL NOT NULL,
+                    timed_out INTEGER NOT NULL,
+                    answers TEXT NOT NULL
+                )
+                """)
+                cursor.executemany(f"""
+                    INSERT INTO {table} (finished_at, user_id, quiz_name, started_at, score, total_score, timed_out, answers)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, rows)
+            connect.commit()
+            connect.close()
+
+    def getAttemptPartitions(self) -> list:
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+        cursor = connect.cursor()
+        res = sorted(row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                                                      (ATTEMPT_PARTITION_PREFIX + "[0-9]*",)))
         connect.close()
+        return res
+
+    def getAttempts(self, user_id: int, quiz_name: str) -> list:
+        # Attempts still within retention, newest first
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+        cursor = connect.cursor()
+        res = []
+        for table in reversed(self.getAttemptPartitions()):
+            res.extend(cursor.execute(f"""
+                SELECT finished_at, started_at, score, total_score, timed_out, answers FROM {table}
+                    WHERE user_id = ? AND quiz_name = ? ORDER BY id DESC
+            """, (user_id, quiz_name)))
+        connect.close()
+        return res
+
+    def getAttemptSummary(self, user_id: int, quiz_name: str) -> Any:
+        connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+        cursor = connect.cursor()
+        res = cursor.execute("""
+            SELECT attempts, timed_out, best_score, score_sum, first_at, last_at FROM quiz_attempt_summaries
+                WHERE user_id = ? AND quiz_name = ?
+        """, (user_id, quiz_name)).fetchone()
+        connect.close()
+        return res
+
+    def compactAttempts(self, cutoff: float, partition_days: int) -> int:
+        compacted = 0
+        for table in self.getAttemptPartitions():
+            if partitionEnd(table, partition_days) > cutoff:
+                continue
+
+            # The lock is taken per partition, result and chat writes get their turn in between
+            with self.write_lock:
+                connect = sqlite3.connect(self.db_file, timeout=self.timeout)
+                cursor = connect.cursor()
+                # Dropping the table frees its pages at once, deleting its rows one by one would not
+                cursor.execute(f"""
+                    INSERT INTO quiz_attempt_summaries
+                            (user_id, quiz_name, attempts, timed_out, best_score, score_sum, first_at, last_at)
+                        SELECT user_id, quiz_name, COUNT(*), SUM(timed_out), MAX(score), SUM(score),
+                                MIN(finished_at), MAX(finished_at)
+                            FROM {table} WHERE true GROUP BY user_id, quiz_name
+                        ON CONFLICT (user_id, quiz_name) DO UPDATE SET
+                            attempts = attempts + excluded.attempts,
+                            timed_out = timed_out + excluded.timed_out,
+                            best_score = MAX(best_score, excluded.best_score),
+                            score_sum = score_sum + excluded.score_sum,
+                            first_at = MIN(first_at, excluded.first_at),
+                            last_at = MAX(last_at, excluded.last_at)
+                """)
+                cursor.execute(f"DROP TABLE {table}")
+                connect.commit()
+                connect.close()
+            compacted += 1
+        return compacted
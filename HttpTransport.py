@@ -0,0 +1,175 @@
+import asyncio
+import json
+import time
+
+from typing import Tuple
+
+import httpx
+
+from telegram.error import NetworkError, TimedOut
+from telegram.request import BaseRequest, RequestData
+
+from BotConfig import HttpConfig
+
+# Methods that upload files, they go through the media pool with the long timeouts
+MEDIA_METHODS = ("sendPhoto", "sendVideo", "sendDocument", "sendAnimation", "sendAudio", "sendVoice",
+                 "sendVideoNote", "sendMediaGroup", "editMessageMedia")
+
+class PooledRequest(BaseRequest):
+    def __init__(
+            self,
+            connection_pool_size: int,
+            keepalive_connections: int,
+            keepalive_expiry: float,
+            read_timeout: float,
+            write_timeout: float,
+            connect_timeout: float,
+            pool_timeout: float,
+            http_version: str = "1.1"
+            ) -> None:
+        # HTTPXRequest keeps every pooled connection alive for 5 seconds, idle bots would reconnect all the time
+        self.client_kwargs = {
+            "limits": httpx.Limits(max_connections=connection_pool_size,
+                                   max_keepalive_connections=min(keepalive_connections, connection_pool_size),
+                                   keepalive_expiry=keepalive_expiry),
+            "timeout": httpx.Timeout(connect=connect_timeout, read=read_timeout, write=write_timeout,
+                                     pool=pool_timeout),
+            "http1": http_version != "2",
+            "http2": http_version == "2"
+        }
+        self.client = httpx.AsyncClient(**self.client_kwargs)
+
+    @property
+    def read_timeout(self) -> float:
+        return self.client.timeout.read
+
+    async def initialize(self) -> None:
+        if self.client.is_closed:
+            self.client = httpx.AsyncClient(**self.client_kwargs)
+
+    async def shutdown(self) -> None:
+        if not self.client.is_closed:
+            await self.client.aclose()
+
+    async def do_request(
+            self,
+            url: str,
+            method: str,
+            request_data: RequestData = None,
+            read_timeout: float = BaseRequest.DEFAULT_NONE,
+            write_timeout: float = BaseRequest.DEFAULT_NONE,
+            connect_timeout: float = BaseRequest.DEFAULT_NONE,
+            pool_timeout: float = BaseRequest.DEFAULT_NONE
+            ) -> Tuple[int, bytes]:
+        if self.client.is_closed:
+            raise RuntimeError("This PooledRequest is not initialized!")
+
+        defaults = self.client.timeout
+        timeout = httpx.Timeout(connect=defaults.connect if connect_timeout is BaseRequest.DEFAULT_NONE else connect_timeout,
+                                read=defaults.read if read_timeout is BaseRequest.DEFAULT_NONE else read_timeout,
+                                write=defaults.write if write_timeout is BaseRequest.DEFAULT_NONE else write_timeout,
+                                pool=defaults.pool if pool_timeout is BaseRequest.DEFAULT_NONE else pool_timeout)
+
+        try:
+            response = await self.client.request(
+                method=method,
+                url=url,
+                headers={"User-Agent": self.USER_AGENT},
+                timeout=timeout,
+                files=request_data.multipart_data if request_data else None,
+                data=request_data.json_parameters if request_data else None
+            )
+        except httpx.PoolTimeout as error:
+            raise TimedOut("Pool timeout: all connections in the connection pool are occupied") from error
+        except httpx.TimeoutException as error:
+            raise TimedOut from error
+        except httpx.HTTPError as error:
+            raise NetworkError(f"httpx.{error.__class__.__name__}: {error}") from error
+
+        return response.status_code, response.content
+
+class RoutedRequest(BaseRequest):
+    def __init__(
+            self,
+            request: BaseRequest,
+            media_request: BaseRequest,
+            flood_retries: int = 0,
+            max_flood_wait: float = 0.0
+            ) -> None:
+        self.request = request
+        self.media_request = media_request
+        self.flood_retries = flood_retries
+        self.max_flood_wait = max_flood_wait
+        self.next_request = 0.0
+
+    @property
+    def read_timeout(self) -> float:
+        return self.request.read_timeout
+
+    async def initialize(self) -> None:
+        await self.request.initialize()
+        await self.media_request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.request.shutdown()
+        await self.media_request.shutdown()
+
+    async def do_request(
+            self,
+            url: str,
+            method: str,
+            request_data: RequestData = None,
+            read_timeout: float = BaseRequest.DEFAULT_NONE,
+            write_timeout: float = BaseRequest.DEFAULT_NONE,
+            connect_timeout: float = BaseRequest.DEFAULT_NONE,
+            pool_timeout: float = BaseRequest.DEFAULT_NONE
+            ) -> Tuple[int, bytes]:
+        # Uploads and file downloads can take minutes, they must not hold the connections replies are sent on
+        if "/file/bot" in url or url.rsplit("/", 1)[-1] in MEDIA_METHODS:
+            request, read_timeout = self.media_request, BaseRequest.DEFAULT_NONE
+        else:
+            request = self.request
+
+        for attempt in range(self.flood_retries + 1):
+            delay = self.next_request - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            code, payload = await request.do_request(url, method, request_data, read_timeout,
+                                                     write_timeout, connect_timeout, pool_timeout)
+            retry_after = self.retryAfter(code, payload)
+            if retry_after is None or retry_after > self.max_flood_wait or attempt == self.flood_retries:
+                return code, payload
+
+            # Every request waits, Telegram counts the limit per bot
+            self.next_request = max(self.next_request, time.monotonic() + retry_after)
+
+    def retryAfter(self, code: int, payload: bytes) -> float:
+        if code != 429:
+            return None
+        try:
+            return float(json.loads(payload)["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+def pooledRequest(config: HttpConfig, pool_size: int, read_timeout: float, write_timeout: float) -> PooledRequest:
+    return PooledRequest(pool_size,
+                         config.keepalive_connections,
+                         config.keepalive_expiry,
+                         read_timeout=read_timeout,
+                         write_timeout=write_timeout,
+                         connect_timeout=config.connect_timeout,
+                         pool_timeout=config.pool_timeout,
+                         http_version=config.http_version)
+
+def botRequests(config: HttpConfig, get_updates_pool_size: int = 0) -> Tuple[BaseRequest, BaseRequest]:
+    # (request, get_updates_request), the long poll never waits behind sends
+    request = RoutedRequest(pooledRequest(config, config.connection_pool_size, config.read_timeout,
+                                          config.write_timeout),
+                            pooledRequest(config, config.media_pool_size, config.media_read_timeout,
+                                          config.media_write_timeout),
+                            config.flood_retries,
+                            config.max_flood_wait)
+    get_updates_request = pooledRequest(config, get_updates_pool_size or config.get_updates_pool_size,
+                                        config.get_updates_read_timeout, config.write_timeout)
+    return request, get_updates_request
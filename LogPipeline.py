@@ -0,0 +1,131 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+
+from BotConfig import LoggingConfig
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Attributes passed through `extra` that end up in the JSON output
+EXTRA_FIELDS = ("event", "bot", "user_id", "handler", "latency_ms")
+
+# Set by UserUpdateProcessor for the task handling an update
+update_user = contextvars.ContextVar("update_user", default=None)
+update_bot = contextvars.ContextVar("update_bot", default=None)
+# Set by the first instrumented handler that takes the update
+update_handler = contextvars.ContextVar("update_handler", default=None)
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "user_id"):
+            record.user_id = update_user.get()
+        if not hasattr(record, "bot"):
+            record.bot = update_bot.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, sampling: dict, default_rate: float = 1.0) -> None:
+        super().__init__()
+        self.sampling = sampling
+        self.default_rate = default_rate
+        self.random = random.Random()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Warnings and errors are never dropped
+        if record.levelno >= logging.WARNING:
+            return True
+
+        if not hasattr(record, "event"):
+            record.event = f"{record.name}.{record.funcName}"
+
+        rate = self.sampling.get(record.event, self.default_rate)
+        return rate >= 1.0 or self.random.random() < rate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            # The bot handler for update records, the logging function for the rest
+            "handler": record.funcName,
+            "message": record.getMessage()
+        }
+
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the writer thread, the records never leave the process
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogPipeline:
+    def __init__(self, config: LoggingConfig) -> None:
+        self.config = config
+        self.handler = None
+        self.listener = None
+        self.previous_handlers = []
+
+    def __enter__(self) -> "LogPipeline":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(JsonFormatter() if self.config.json else logging.Formatter(TEXT_FORMAT))
+
+        log_queue = queue.Queue(self.config.queue_size)
+        self.handler = DeferredQueueHandler(log_queue)
+        self.handler.addFilter(SamplingFilter(self.config.sampling, self.config.default_rate))
+        self.handler.addFilter(ContextFilter())
+
+        self.listener = logging.handlers.QueueListener(log_queue, stream_handler)
+
+        root = logging.getLogger()
+        self.previous_handlers = root.handlers[:]
+        for handler in self.previous_handlers:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.config.level)
+
+        self.listener.start()
+
+    def stop(self) -> None:
+        if self.listener is None:
+            return
+
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+        for handler in self.previous_handlers:
+            root.addHandler(handler)
+
+        # Writes out everything still queued before returning
+        self.listener.stop()
+        self.listener = None
+
+        if self.handler.dropped:
+            logging.getLogger(__name__).warning("Dropped %d log records on a full queue", self.handler.dropped)
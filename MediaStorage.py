@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Union
+
+from telegram import File, PhotoSize, Video
+
+logger = logging.getLogger(__name__)
+
+class MediaStorage:
+    def __init__(
+            self,
+            media_dir: str = "media",
+            max_workers: int = 4,
+            chunk_size: int = 1024 * 1024,
+            gc_interval: float = 3600.0,
+            gc_grace: float = 3600.0
+            ) -> None:
+        self.media_dir = media_dir
+        self.index_file = os.path.join(media_dir, "index.json")
+        self.chunk_size = chunk_size
+        self.gc_interval = gc_interval
+        self.gc_grace = gc_grace
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media")
+        self.references = {}
+        self.owner_references = {}
+        self.references_lock = threading.Lock()
+        self.garbage = {}
+        self.index = self.loadIndex()
+        self.collector = None
+        # Only one process may collect garbage in and write the index of a media dir shared by several
+        self.collect = True
+
+    def loadIndex(self) -> dict:
+        if not os.path.isfile(self.index_file):
+            return {}
+
+        with open(self.index_file, "r", encoding="utf8") as data:
+            return json.load(data)
+
+    def mediaPath(self, digest: str, extension: str) -> str:
+        return os.path.join(self.media_dir, digest[:2], digest[2:4], digest + extension)
+
+    async def run(self, func: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def isFile(self, path: str) -> bool:
+        return await self.run(os.path.isfile, path)
+
+    async def read(self, path: str) -> bytes:
+        return await self.run(self.readFile, path)
+
+    async def write(self, path: str, data: bytes) -> None:
+        await self.run(self.writeFile, path, data)
+
+    async def store(self, medium: Union[PhotoSize, Video], extension: str) -> str:
+        # Telegram keeps file_unique_id stable for identical files, so known
+        # uploads are resolved without downloading them again
+        path = self.index.get(medium.file_unique_id)
+        if path is not None and await self.run(self.touchFile, path):
+            return path
+
+        new_file = await medium.get_file()
+        path = await self.download(new_file, extension)
+
+        self.index[medium.file_unique_id] = path
+        if self.collect:
+            await self.write(self.index_file, json.dumps(self.index).encode("utf-8"))
+
+        return path
+
+    async def download(self, new_file: File, extension: str) -> str:
+        data = await new_file.download_as_bytearray()
+        return await self.run(self.storeFile, bytes(data), extension)
+
+    def setReferences(self, references: dict, owner: str = "") -> None:
+        # Bots hosted together share the storage, a file is garbage once no content tree uses it
+        with self.references_lock:
+            self.owner_references[owner] = references
+            if len(self.owner_references) > 1:
+                merged = {}
+                for owner_references in self.owner_references.values():
+                    for path, count in owner_references.items():
+                        merged[path] = merged.get(path, 0) + count
+                references = merged
+
+            now = time.time()
+
+            for path in self.references:
+                if path not in references:
+                    self.garbage[path] = now
+
+            for path in references:
+                self.garbage.pop(path, None)
+
+            self.references = references
+
+    def start(self) -> None:
+        if self.collect and self.collector is None:
+            self.collector = asyncio.create_task(self.collectPeriodically())
+
+    async def stop(self) -> None:
+        if self.collector is not None:
+            self.collector.cancel()
+            try:
+                await self.collector
+            except asyncio.CancelledError:
+                pass
+            self.collector = None
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    async def collectPeriodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.gc_interval)
+            try:
+                await self.collectGarbage()
+            except Exception:
+                logger.exception("Media garbage collection failed")
+
+    async def collectGarbage(self) -> int:
+        deadline = time.time() - self.gc_grace
+
+        # Content jobs publish references from their own thread, work on a copy
+        expired = [path for path, released in self.garbage.copy().items()
+                   if released <= deadline and path not in self.references]
+        orphans = await self.run(self.findOrphans, set(self.references), deadline)
+
+        removed = set(await self.run(self.removeFiles, list(set(expired) | set(orphans)), deadline))
+
+        for path in expired:
+            if path in removed:
+                self.garbage.pop(path, None)
+
+        stale = [key for key, path in self.index.items() if path in removed]
+        if stale:
+            for key in stale:
+                del self.index[key]
+            await self.write(self.index_file, json.dumps(self.index).encode("utf-8"))
+
+        logger.info("Media garbage collection removed %d files", len(removed))
+        return len(removed)
+
+    def storeFile(self, data: bytes, extension: str) -> str:
+        path = self.mediaPath(hashlib.sha256(data).hexdigest(), extension)
+        if not self.touchFile(path):
+            self.writeFile(path, data)
+        return path
+
+    def touchFile(self, path: str) -> bool:
+        # A fresh mtime keeps a reused file out of the orphan sweep until the
+        # article referencing it is saved
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def readFile(self, path: str) -> bytes:
+        data = bytearray()
+        with open(path, "rb") as media:
+            chunk = media.read(self.chunk_size)
+            while chunk:
+                data += chunk
+                chunk = media.read(self.chunk_size)
+        return bytes(data)
+
+    def writeFile(self, path: str, data: bytes) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write next to the target and rename, so readers never see a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        view = memoryview(data)
+        with open(temp_path, "wb") as media:
+            for idx in range(0, len(view), self.chunk_size):
+                media.write(view[idx:idx + self.chunk_size])
+        os.replace(temp_path, path)
+
+    def findOrphans(self, referenced: set, deadline: float) -> list:
+        # Files younger than the grace period may belong to an upload that is
+        # not attached to an article yet
+        orphans = []
+        for directory, _, files in os.walk(self.media_dir):
+            for name in files:
+                path = os.path.join(directory, name)
+                if path == self.index_file or path in referenced:
+                    continue
+                if os.path.getmtime(path) <= deadline:
+                    orphans.append(path)
+        return orphans
+
+    def removeFiles(self, paths: list, deadline: float) -> list:
+        # The paths were picked before the sweep, an article saved or an upload stored since then
+        # may use a file again, each one is checked once more just before it goes
+        removed = []
+        for path in paths:
+            with self.references_lock:
+                if path in self.references:
+                    continue
+                try:
+                    if os.path.isfile(path):
+                        if os.path.getmtime(path) > deadline:
+                            continue
+                        os.remove(path)
+                    removed.append(path)
+                except OSError:
+                    logger.info("Can't remove media file %s", path)
+        return removed
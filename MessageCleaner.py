@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+
+from collections import deque
+
+from telegram import Bot
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Telegram accepts at most 100 ids per deleteMessages call
+DELETE_BATCH_SIZE = 100
+# Attempts per batch when Telegram keeps answering with flood waits
+MAX_ATTEMPTS = 3
+
+class MessageCleaner:
+    def __init__(
+            self,
+            max_tracked: int = 200,
+            batch_size: int = DELETE_BATCH_SIZE,
+            concurrency: int = 4
+            ) -> None:
+        self.max_tracked = max_tracked
+        self.batch_size = min(batch_size, DELETE_BATCH_SIZE)
+        # Deletions share the bot's global limit with the replies, only a few run at once
+        self.concurrency = max(concurrency, 1)
+        self.next_delete = 0.0
+        self.tracked = {}
+        self.pending = {}
+        self.bot = None
+        self.wakeup = asyncio.Event()
+        self.worker = None
+
+    def track(self, chat_id: int, *message_ids: int) -> None:
+        if chat_id not in self.tracked:
+            self.tracked[chat_id] = deque()
+
+        chat_messages = self.tracked[chat_id]
+        chat_messages.extend(message_ids)
+
+        while len(chat_messages) > self.max_tracked:
+            self.remove(chat_id, chat_messages.popleft())
+
+    def remove(self, chat_id: int, *message_ids: int) -> None:
+        if chat_id not in self.pending:
+            self.pending[chat_id] = set()
+        self.pending[chat_id].update(message_ids)
+
+    def release(self, chat_id: int) -> None:
+        if chat_id in self.tracked:
+            self.remove(chat_id, *self.tracked.pop(chat_id))
+
+    def flush(self) -> None:
+        if self.pending:
+            self.wakeup.set()
+
+    def start(self, bot: Bot) -> None:
+        self.bot = bot
+        if self.worker is None:
+            self.worker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+        await self.deletePending()
+
+    async def run(self) -> None:
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            await self.deletePending()
+
+    async def deletePending(self) -> None:
+        pending, self.pending = self.pending, {}
+
+        queue = asyncio.Queue()
+        for chat_id, message_ids in pending.items():
+            message_ids = sorted(message_ids)
+            for idx in range(0, len(message_ids), self.batch_size):
+                queue.put_nowait((chat_id, message_ids[idx:idx + self.batch_size]))
+
+        async def worker() -> None:
+            while not queue.empty():
+                await self.delete(*queue.get_nowait())
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, queue.qsize()))))
+
+    async def delete(self, chat_id: int, batch: list) -> None:
+        for _ in range(MAX_ATTEMPTS):
+            delay = self.next_delete - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                await self.bot.delete_messages(chat_id, batch)
+                return
+            except RetryAfter as error:
+                # Every worker waits, Telegram counts the limit per bot
+                self.next_delete = max(self.next_delete, time.monotonic() + float(error.retry_after))
+            except Exception:
+                break
+
+        logger.info("Can't delete %d messages in chat %s", len(batch), chat_id)
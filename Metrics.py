@@ -0,0 +1,281 @@
+import bisect
+import functools
+import inspect
+import logging
+import time
+
+from typing import Callable, Tuple
+
+import tornado.httpserver
+import tornado.web
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+from LogPipeline import update_handler
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cached menu reply up to a slow media upload
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# family: (metric prefix, label name, description)
+FAMILIES = {
+    "handler": ("bot_handler", "handler", "Update handler"),
+    "api": ("bot_api_request", "method", "Bot API request"),
+    "db": ("bot_db_call", "call", "DBManager call")
+}
+
+def escapeLabel(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, fraction: float) -> float:
+        # Upper bound of the bucket holding the quantile, good enough for a chat summary
+        rank = fraction * self.count
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[idx] if idx < len(self.buckets) else float("inf")
+        return 0.0
+
+class Metrics:
+    def __init__(self, enabled: bool = False, active_window: float = 300.0) -> None:
+        self.enabled = enabled
+        self.active_window = active_window
+        self.families = {family: {} for family in FAMILIES}
+        self.gauges = {}
+        self.last_seen = {}
+        self.bots = {}
+        self.server = None
+
+    def observe(self, family: str, name: str, seconds: float, error: bool = False) -> None:
+        series = self.families[family]
+        if name not in series:
+            series[name] = Histogram()
+        series[name].observe(seconds, error)
+
+    def seen(self, user_id: int) -> None:
+        self.last_seen[user_id] = time.monotonic()
+
+    def activeUsers(self) -> int:
+        deadline = time.monotonic() - self.active_window
+        self.last_seen = {user_id: last for user_id, last in self.last_seen.items() if last >= deadline}
+        return len(self.last_seen)
+
+    def addGauge(self, name: str, description: str, callback: Callable[[], object], label: str = "") -> None:
+        self.gauges[name] = (description, label, callback)
+
+    def addBot(self, name: str, metrics: "Metrics") -> None:
+        # Bots of one process share this endpoint, their series get a bot label
+        self.bots[name] = metrics
+
+    def sources(self) -> list:
+        return [("", self)] + [(f"bot=\"{escapeLabel(name)}\",", metrics) for name, metrics in self.bots.items()]
+
+    def instrumentHandlers(self, owner: object, passive: tuple = ()) -> None:
+        # Wrapped even with metrics off, update log records name the handler that took them.
+        # Passive handlers see every update after the others and never name one
+        for attr, function in inspect.getmembers(type(owner), inspect.iscoroutinefunction):
+            if attr.startswith("_") or list(inspect.signature(function).parameters)[1:] != ["update", "context"]:
+                continue
+            setattr(owner, attr, self.timedHandler(f"{type(owner).__name__}.{attr}", getattr(owner, attr),
+                                                   attr not in passive))
+
+    def instrumentCalls(self, owner: object, family: str = "db") -> None:
+        if not self.enabled:
+            return
+
+        for attr, function in inspect.getmembers(type(owner), inspect.isfunction):
+            if attr.startswith("_") or inspect.iscoroutinefunction(function):
+                continue
+            setattr(owner, attr, self.timedCall(family, attr, getattr(owner, attr)))
+
+    def timedHandler(self, name: str, callback: Callable, names_update: bool = True) -> Callable:
+        @functools.wraps(callback)
+        async def wrapper(update, context):
+            if names_update and update_handler.get() is None:
+                update_handler.set(name)
+            if not self.enabled:
+                return await callback(update, context)
+
+            if isinstance(update, Update) and update.effective_user is not None:
+                self.seen(update.effective_user.id)
+
+            started = time.perf_counter()
+            error = True
+            try:
+                result = await callback(update, context)
+                error = False
+                return result
+            finally:
+                self.observe("handler", name, time.perf_counter() - started, error)
+
+        return wrapper
+
+    def timedCall(self, family: str, name: str, function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            error = True
+            try:
+                result = function(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                self.observe(family, name, time.perf_counter() - started, error)
+
+        return wrapper
+
+    def gaugeValues(self) -> list:
+        values = []
+        for name, (description, label, callback) in self.gauges.items():
+            try:
+                value = callback()
+            except Exception:
+                logger.exception("Gauge %s failed", name)
+                continue
+            values.append((name, description, label, value))
+        return values
+
+    def render(self) -> str:
+        lines = []
+        sources = self.sources()
+
+        for family, (prefix, label, description) in FAMILIES.items():
+            lines.append(f"# HELP {prefix}_seconds {description} latency in seconds")
+            lines.append(f"# TYPE {prefix}_seconds histogram")
+            for bot, metrics in sources:
+                for name, histogram in sorted(metrics.families[family].items()):
+                    labels = f"{bot}{label}=\"{escapeLabel(name)}\""
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{prefix}_seconds_bucket{{{labels},le=\"{bound}\"}} {cumulative}")
+                    lines.append(f"{prefix}_seconds_sum{{{labels}}} {histogram.total}")
+                    lines.append(f"{prefix}_seconds_count{{{labels}}} {histogram.count}")
+
+            lines.append(f"# HELP {prefix}_errors_total {description} failures")
+            lines.append(f"# TYPE {prefix}_errors_total counter")
+            for bot, metrics in sources:
+                for name, histogram in sorted(metrics.families[family].items()):
+                    lines.append(f"{prefix}_errors_total{{{bot}{label}=\"{escapeLabel(name)}\"}} {histogram.errors}")
+
+        gauges = {}
+        for bot, metrics in sources:
+            for name, description, label, value in metrics.gaugeValues():
+                gauges.setdefault(name, (description, []))[1].append((bot, label, value))
+
+        for name, (description, values) in gauges.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for bot, label, value in values:
+                if isinstance(value, dict):
+                    for key, item in sorted(value.items()):
+                        lines.append(f"{name}{{{bot}{label}=\"{escapeLabel(str(key))}\"}} {item}")
+                elif bot:
+                    lines.append(f"{name}{{{bot.rstrip(',')}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self, limit: int = 10) -> str:
+        lines = []
+        for name, description, label, value in self.gaugeValues():
+            if isinstance(value, dict):
+                value = ", ".join(f"{key}={item}" for key, item in sorted(value.items()))
+            lines.append(f"{description}: {value}")
+
+        if not self.enabled:
+            lines.append("\nLatency metrics are disabled")
+            return "\n".join(lines)
+
+        for family, (_, _, description) in FAMILIES.items():
+            series = sorted(self.families[family].items(), key=lambda item: item[1].count, reverse=True)
+            if not series:
+                continue
+
+            lines.append(f"\n{description}s (calls, errors, mean, p95):")
+            for name, histogram in series[:limit]:
+                mean = histogram.total / histogram.count * 1000
+                lines.append(f"{name}: {histogram.count}, {histogram.errors}, "
+                             f"{mean:.1f}ms, <{histogram.quantile(0.95) * 1000:.0f}ms")
+
+        return "\n".join(lines)
+
+    def start(self, listen: str, port: int) -> None:
+        if not self.enabled or not port:
+            return
+
+        application = tornado.web.Application([(r"/metrics", MetricsHandler, {"metrics": self})])
+        self.server = tornado.httpserver.HTTPServer(application)
+        self.server.listen(port, listen)
+        logger.info("Serving metrics on %s:%d", listen, port)
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.stop()
+            await self.server.close_all_connections()
+            self.server = None
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+
+    def get(self) -> None:
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish(self.metrics.render())
+
+class InstrumentedRequest(BaseRequest):
+    def __init__(self, request: BaseRequest, metrics: Metrics) -> None:
+        self.request = request
+        self.metrics = metrics
+
+    @property
+    def read_timeout(self) -> float:
+        return self.request.read_timeout
+
+    async def initialize(self) -> None:
+        await self.request.initialize()
+
+    async def shutdown(self) -> None:
+        await self.request.shutdown()
+
+    async def do_request(
+            self,
+            url: str,
+            method: str,
+            request_data: RequestData = None,
+            read_timeout: float = BaseRequest.DEFAULT_NONE,
+            write_timeout: float = BaseRequest.DEFAULT_NONE,
+            connect_timeout: float = BaseRequest.DEFAULT_NONE,
+            pool_timeout: float = BaseRequest.DEFAULT_NONE
+            ) -> Tuple[int, bytes]:
+        # File downloads end in the file path, keep them under one label
+        api_method = "downloadFile" if "/file/bot" in url else url.rsplit("/", 1)[-1]
+
+        started = time.perf_counter()
+        error = True
+        try:
+            status, payload = await self.request.do_request(url, method, request_data, read_timeout,
+                                                            write_timeout, connect_timeout, pool_timeout)
+            error = status >= 400
+            return status, payload
+        finally:
+            self.metrics.observe("api", api_method, time.perf_counter() - started, error)
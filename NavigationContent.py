@@ -13,8 +13,12 @@ class NavigationContent:
         self,
         label: str,
         type: ButtonType = ButtonType.NAVIGATION,
-        content: Any = {}
+        content: Any = {},
+        node_id: str = ""
     ):
         self.label = label
         self.type = type
         self.content = content
+        self.node_id = node_id
+        # JSON text of the item as written to the content file, cached once it is written
+        self.serialized = ""
@@ -0,0 +1,144 @@
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import time
+
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Profiler:
+    # cProfile hooks the whole thread, bots sharing a loop share one profile at a time
+    active = None
+    # Profilers of the bots running in this process, SIGUSR2 toggles all of them
+    watched = set()
+
+    def __init__(
+            self,
+            application: Application,
+            output_dir: str = "profiles",
+            top: int = 20
+            ) -> None:
+        self.application = application
+        self.output_dir = output_dir
+        self.top = top
+        self.profile = None
+        self.running = False
+        self.remaining = 0
+        self.processed = 0
+        self.started = 0.0
+        self.chat_id = None
+        self.timer = None
+        self.reports = set()
+        self.sequence = 0
+
+    def start(self, updates: int = 0, seconds: float = 0.0, chat_id: int = None) -> bool:
+        if self.running or Profiler.active is not None:
+            return False
+
+        self.remaining = updates
+        self.processed = 0
+        self.chat_id = chat_id
+        if seconds > 0:
+            self.timer = asyncio.get_running_loop().call_later(seconds, self.stop)
+
+        logger.info("Profiling started for %d updates, %.0f seconds", updates, seconds)
+        self.running = True
+        Profiler.active = self
+        self.started = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+        return True
+
+    def countUpdate(self) -> None:
+        self.processed += 1
+        if self.remaining and self.processed >= self.remaining:
+            self.stop()
+
+    def watchSignal(self) -> None:
+        # Registered once per process, not every platform has SIGUSR2
+        if not Profiler.watched:
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, Profiler.toggleWatched)
+            except (AttributeError, NotImplementedError, RuntimeError):
+                pass
+        Profiler.watched.add(self)
+
+    def unwatchSignal(self) -> None:
+        Profiler.watched.discard(self)
+        if not Profiler.watched:
+            try:
+                asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR2)
+            except (AttributeError, NotImplementedError, RuntimeError):
+                pass
+
+    @staticmethod
+    def toggleWatched(seconds: float = 60.0) -> None:
+        if Profiler.active is not None:
+            Profiler.active.stop()
+            return
+
+        # The first profiler records every bot of the process, the others only report it is running
+        for profiler in list(Profiler.watched):
+            profiler.start(seconds=seconds)
+
+    def stop(self) -> None:
+        if not self.running:
+            return
+
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.started
+        profile, self.profile = self.profile, None
+        self.running = False
+        Profiler.active = None
+
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        task = asyncio.get_running_loop().create_task(self.report(profile, elapsed, self.processed, self.chat_id))
+        self.reports.add(task)
+        task.add_done_callback(self.reports.discard)
+
+    async def close(self) -> None:
+        self.stop()
+        if self.reports:
+            await asyncio.gather(*self.reports, return_exceptions=True)
+
+    async def report(self, profile: cProfile.Profile, elapsed: float, processed: int, chat_id: int) -> None:
+        self.sequence += 1
+        path = os.path.join(self.output_dir, time.strftime("profile-%Y%m%d-%H%M%S") + f"-{os.getpid()}-{self.sequence}.prof")
+        # Sorting and writing the stats of a long profile takes a while, updates keep being processed meanwhile
+        summary = await asyncio.get_running_loop().run_in_executor(None, self.write, profile, path)
+        logger.info("Profile of %d updates written to %s", processed, path)
+
+        if chat_id is not None:
+            summary = f"Profiled {processed} updates in {elapsed:.1f}s, saved to {path}\n\n{summary}"
+            try:
+                await self.application.bot.send_message(chat_id, summary)
+            except Exception:
+                logger.exception("Failed to send the profile summary")
+
+    def write(self, profile: cProfile.Profile, path: str) -> str:
+        stats = pstats.Stats(profile)
+        os.makedirs(self.output_dir, exist_ok=True)
+        stats.dump_stats(path)
+        return self.summary(stats)
+
+    def summary(self, stats: pstats.Stats) -> str:
+        # Only functions of the bot itself, library internals are in the stats file
+        rows = []
+        for (filename, lineno, function), (_, calls, own_time, total_time, _) in stats.stats.items():
+            if os.path.abspath(filename).startswith(PROJECT_DIR) and function != "<module>":
+                rows.append((total_time, own_time, calls, f"{os.path.basename(filename)}:{function}"))
+
+        rows.sort(reverse=True)
+        lines = ["cumulative ms / own ms / calls / function"]
+        for total_time, own_time, calls, name in rows[:self.top]:
+            lines.append(f"{total_time * 1000:.1f} / {own_time * 1000:.1f} / {calls} / {name}")
+        return "\n".join(lines)
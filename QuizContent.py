@@ -13,20 +13,28 @@ class Question:
             label: str = "",
             hint: str = "",
             points: float = 0.0,
-            answers: list = []
+            answers: list = [],
+            time_limit: float = 0.0
     ):
         self.label = label
         self.hint = hint
         self.points = points
         self.answers = answers
+        # Seconds to answer, 0 takes the quiz's question time
+        self.time_limit = time_limit
 
 class QuizContent:
     def __init__(
             self,
             label: str = "",
             total_score: float = 0.0,
-            questions: list = []
+            questions: list = [],
+            question_time: float = 0.0,
+            time_limit: float = 0.0
     ):
         self.label = label
         self.total_score = total_score
         self.questions = questions
+        # Seconds per question and for the whole quiz, 0 is no limit
+        self.question_time = question_time
+        self.time_limit = time_limit
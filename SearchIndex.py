@@ -0,0 +1,111 @@
+import bisect
+import heapq
+import re
+
+from ArticleContent import ArticleContentType
+from ContentVersion import ContentVersion
+from NavigationContent import ButtonType
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Shorter prefixes only match item names, in article text they would match nearly every word
+TEXT_PREFIX_LENGTH = 3
+
+# Segments an index grows by before it is built again from scratch
+MAX_SEGMENTS = 8
+
+def searchWords(text: str) -> list:
+    return WORD_PATTERN.findall(text.casefold())
+
+class SearchIndex:
+    def __init__(self, version: ContentVersion, max_results: int = 1000, previous: "SearchIndex" = None) -> None:
+        self.version = version
+        self.max_results = max_results
+        # (node id, path, ButtonType, article pages), numbered in the order equally good matches are shown
+        self.entries = []
+        # node id: number of the entry that is up to date in this version
+        self.live = {}
+        # {"label" | "path" | "text": (postings, sorted words)}, postings are word: entry numbers
+        self.segments = []
+
+        items = []
+        if previous is not None and len(previous.segments) < MAX_SEGMENTS:
+            # An edit changes a few items, the rest keep the entries of the index before it
+            for node_id, (path, node_type) in version.nodes.items():
+                number = previous.live.get(node_id)
+                if number is not None and previous.entries[number][2] == node_type \
+                        and previous.entries[number][3] is version.pages.get(node_id):
+                    self.live[node_id] = number
+                elif node_type != ButtonType.NAVIGATION:
+                    items.append((node_id, path, node_type, version.pages.get(node_id)))
+
+            # Entries of removed and changed items stay in their segments until too many of them pile up
+            if len(previous.entries) - len(self.live) <= len(self.live):
+                self.entries = list(previous.entries)
+                self.segments = list(previous.segments)
+            else:
+                self.live = {}
+
+        if not self.entries:
+            items = [(node_id, path, node_type, version.pages.get(node_id))
+                     for node_id, (path, node_type) in version.nodes.items() if node_type != ButtonType.NAVIGATION]
+
+        if items:
+            items.sort(key=lambda item: (len(item[1]), [name.casefold() for name in item[1]]))
+            self.segments.append(self.indexItems(items, len(self.entries)))
+
+    def indexItems(self, items: list, start: int) -> dict:
+        segment = {"label": {}, "path": {}, "text": {}}
+
+        for number, (node_id, path, node_type, pages) in enumerate(items, start):
+            labels = set(searchWords(path[-1]))
+            names = set(searchWords(" ".join(path)))
+            words = set(names)
+            for page in pages or []:
+                words.update(searchWords(page.content if page.type == ArticleContentType.TEXT else page.caption))
+
+            for field, field_words in (("label", labels), ("path", names), ("text", words)):
+                postings = segment[field]
+                for word in field_words:
+                    postings.setdefault(word, []).append(number)
+
+            self.entries.append((node_id, path, node_type, pages))
+            self.live[node_id] = number
+
+        return {field: (postings, sorted(postings)) for field, postings in segment.items()}
+
+    def isLive(self, number: int) -> bool:
+        return self.live.get(self.entries[number][0]) == number
+
+    def rank(self, query: tuple) -> list:
+        if not query:
+            found = []
+            for number in range(len(self.entries)):
+                if len(found) == self.max_results:
+                    break
+                if self.isLive(number):
+                    found.append(number)
+            return found
+
+        # Every word matches as a prefix, the words are typed as the results come in
+        candidates = [self.prefixed(word, "text" if len(word) >= TEXT_PREFIX_LENGTH else "path") for word in query]
+        candidates.sort(key=len)
+        found = candidates[0].intersection(*candidates[1:])
+
+        # Items named after the query come before items that only mention it
+        labels = [self.prefixed(word, "label") for word in query]
+        scores = ((sum(number not in label for label in labels), number) for number in found if self.isLive(number))
+        return [number for _, number in heapq.nsmallest(self.max_results, scores)]
+
+    def prefixed(self, prefix: str, field: str) -> set:
+        found = set()
+        for segment in self.segments:
+            postings, words = segment[field]
+            for index in range(bisect.bisect_left(words, prefix), len(words)):
+                if not words[index].startswith(prefix):
+                    break
+                found.update(postings[words[index]])
+            # Short words in the text still match whole
+            if field == "path":
+                found.update(segment["text"][0].get(prefix, ()))
+        return found
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+from BotConfig import BotConfig
+from DBManager import DBManager
+from HttpTransport import botRequests
+from LogPipeline import LogPipeline
+from TelegramBot import TelegramBot, applicationBuilder, runApplication
+
+logger = logging.getLogger(__name__)
+
+# Workers load the content and bind their metrics port before they report ready
+WORKER_START_TIMEOUT = 300.0
+
+class QueuedDBManager(DBManager):
+    def __init__(
+            self,
+            db_file: str,
+            write_queue: multiprocessing.Queue,
+            index: int = 0,
+            reply_queue: multiprocessing.Queue = None
+            ) -> None:
+        super().__init__(db_file)
+        self.write_queue = write_queue
+        # Writes that return a value wait for the writer's reply on this worker's own queue
+        self.index = index
+        self.reply_queue = reply_queue
+
+    def call(self, name: str, *args) -> object:
+        with self.write_lock:
+            self.write_queue.put((name, args, self.index))
+            result, error = self.reply_queue.get()
+        if error is not None:
+            raise RuntimeError(f"DB writer failed on {name}: {error}")
+        return result
+
+    def addUserResult(self, user_id: int, quiz_name: str, quiz_score: str) -> None:
+        self.write_queue.put(("addUserResult", (user_id, quiz_name, quiz_score)))
+
+    def deleteQuizFromDB(self, quiz_name: str) -> None:
+        self.write_queue.put(("deleteQuizFromDB", (quiz_name,)))
+
+    def addChat(self, chat_id: int, user_id: int, first_name: str) -> None:
+        self.write_queue.put(("addChat", (chat_id, user_id, first_name)))
+
+    def addAttempts(self, attempts: list, partition_days: int) -> None:
+        self.write_queue.put(("addAttempts", (attempts, partition_days)))
+
+    def compactAttempts(self, cutoff: float, partition_days: int) -> int:
+        self.write_queue.put(("compactAttempts", (cutoff, partition_days)))
+        return 0
+
+    def setChatBlocked(self, chat_id: int) -> None:
+        self.write_queue.put(("setChatBlocked", (chat_id,)))
+
+    def addBroadcast(self, admin_chat_id: int, text: str, media_type: str, file_id: str) -> int:
+        return self.call("addBroadcast", admin_chat_id, text, media_type, file_id)
+
+    def updateBroadcast(
+            self,
+            broadcast_id: int,
+            last_chat_id: int,
+            sent: int,
+            failed: int,
+            blocked: int,
+            finished: bool
+            ) -> None:
+        self.write_queue.put(("updateBroadcast", (broadcast_id, last_chat_id, sent, failed, blocked, finished)))
+
+def runDBWriter(db_file: str, write_queue: multiprocessing.Queue, replies: list) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    db_manager = DBManager(db_file)
+    db_manager.initDB()
+
+    while True:
+        item = write_queue.get()
+        if item is None:
+            break
+
+        name, args, *reply = item
+        try:
+            result, error = getattr(db_manager, name)(*args), None
+        except Exception as exc:
+            logger.exception("DB writer failed on %s", name)
+            result, error = None, str(exc)
+
+        if reply:
+            replies[reply[0]].put((result, error))
+
+def runWorker(
+        token: str,
+        config: BotConfig,
+        index: int,
+        queues: list,
+        write_queue: multiprocessing.Queue,
+        reply_queue: multiprocessing.Queue,
+        events: multiprocessing.Queue
+        ) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Every worker serves its own metrics, on consecutive ports
+    if config.metrics.port:
+        config.metrics.port += index
+
+    # Writes go to the writer process, the bot instruments the queued manager like its own
+    bot = TelegramBot(token, config, db_manager=QueuedDBManager(config.db_file, write_queue, index, reply_queue))
+    bot.navigator.shared = True
+    bot.broadcaster.resume = index == 0
+    bot.attempt_log.compact = index == 0
+    bot.media_storage.collect = index == 0
+
+    with LogPipeline(config.logging):
+        asyncio.run(serveWorker(bot, index, queues, events))
+
+async def serveWorker(bot: TelegramBot, index: int, queues: list, events: multiprocessing.Queue) -> None:
+    application = bot.application
+    queue = queues[index]
+
+    def notifyReplicas() -> None:
+        for idx, replica_queue in enumerate(queues):
+            if idx != index:
+                replica_queue.put(("reload",))
+
+    bot.navigator.addListener(notifyReplicas)
+
+    loop = asyncio.get_running_loop()
+
+    async with application:
+        await bot.postInit(application)
+        await application.start()
+        events.put(("ready", index, bot.allowedUpdates()))
+
+        while True:
+            item = await loop.run_in_executor(None, queue.get)
+            if item[0] == "update":
+                await application.update_queue.put(Update.de_json(item[1], application.bot))
+            elif item[0] == "reload":
+                try:
+                    # Off the loop, it waits for an edit another worker is saving.
+                    # Skipped when this worker already read the change while saving an edit of its own
+                    await bot.jobs.run(bot.navigator.reloadChanges)
+                except Exception:
+                    # The version in memory stays, the next reload picks the file up again
+                    logger.exception("Worker %d failed to reload the content", index)
+                    continue
+                bot.updateFilters()
+            elif item[0] == "stop":
+                break
+
+        await application.stop()
+        await bot.postStop(application)
+
+    await bot.postShutdown(application)
+
+class ShardedRunner:
+    def __init__(self, token: str, config: BotConfig) -> None:
+        self.token = token
+        self.config = config
+
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue() for _ in range(config.workers)]
+        self.write_queue = context.Queue()
+        self.replies = [context.Queue() for _ in range(config.workers)]
+        self.events = context.Queue()
+
+        self.writer = context.Process(target=runDBWriter, name="db-writer",
+                                      args=(config.db_file, self.write_queue, self.replies))
+        self.workers = [context.Process(target=runWorker, name=f"worker-{idx}",
+                                        args=(token, config, idx, self.queues, self.write_queue, self.replies[idx],
+                                              self.events))
+                        for idx in range(config.workers)]
+
+    def updateKey(self, update: Update) -> int:
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return 0
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        shard = self.updateKey(update) % len(self.queues)
+        self.queues[shard].put(("update", update.to_dict()))
+
+    def run(self) -> None:
+        self.writer.start()
+        for worker in self.workers:
+            worker.start()
+
+        try:
+            allowed_updates = self.waitReady()
+        except Exception:
+            self.abort()
+            raise
+
+        request, get_updates_request = botRequests(self.config.http)
+        ingress = applicationBuilder(self.token, self.config) \
+            .request(request) \
+            .get_updates_request(get_updates_request) \
+            .build()
+        ingress.add_handler(TypeHandler(Update, self.dispatch))
+
+        try:
+            with LogPipeline(self.config.logging):
+                runApplication(ingress, self.config, allowed_updates)
+        finally:
+            self.stop()
+
+    def waitReady(self) -> list:
+        allowed_updates = []
+        ready = 0
+        deadline = time.monotonic() + WORKER_START_TIMEOUT
+
+        while ready < len(self.workers):
+            try:
+                _, index, worker_updates = self.events.get(timeout=1.0)
+            except queue.Empty:
+                # A worker that died while starting never reports, its exit code tells why
+                for process in [self.writer] + self.workers:
+                    if not process.is_alive():
+                        raise RuntimeError(f"{process.name} exited with code {process.exitcode} while starting")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Workers not ready after {WORKER_START_TIMEOUT:.0f}s")
+                continue
+
+            logger.info("Worker %d is ready", index)
+            allowed_updates = worker_updates
+            ready += 1
+
+        return allowed_updates
+
+    def abort(self) -> None:
+        # Workers still starting don't read their queue yet, they can't be asked to stop
+        for process in self.workers + [self.writer]:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    def stop(self) -> None:
+        for queue in self.queues:
+            queue.put(("stop",))
+        for worker in self.workers:
+            worker.join()
+
+        self.write_queue.put(None)
+        self.writer.join()
@@ -1,23 +1,60 @@
+import asyncio
 import copy
 import hashlib
 import logging
 import os.path
+import re
+import time
+import warnings
 
 from enum import Enum, auto
 from random import shuffle
-
-from telegram import Update, ReplyKeyboardRemove, KeyboardButton, ReplyKeyboardMarkup
+from typing import Awaitable, Callable
+
+from telegram import (
+    Update,
+    ReplyKeyboardRemove,
+    KeyboardButton,
+    ReplyKeyboardMarkup,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent
+)
+from telegram.error import BadRequest
+from telegram.request import BaseRequest
 from telegram.ext import (
     Application,
+    ApplicationBuilder,
+    CallbackQueryHandler,
     CommandHandler,
     ContextTypes,
     ConversationHandler,
+    InlineQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters
 )
-
-from ContentNavigator import ContentNavigator, ArticleContent, ArticleContentType
+from telegram.warnings import PTBUserWarning
+
+from AttemptLog import AttemptLog
+from BackgroundJobs import BackgroundJobs, Job
+from BotConfig import BotConfig, KeyboardMode, RunMode
+from Broadcaster import Broadcaster
+from ContentArchive import ContentArchive
+from ContentIndex import ContentIndex
+from ContentNavigator import ContentNavigator, ArticleContent, ArticleContentType, nodeId
+from HttpTransport import botRequests
+from MediaStorage import MediaStorage
+from MessageCleaner import MessageCleaner
+from NavigationContent import ButtonType
+from Metrics import InstrumentedRequest, Metrics
+from LogPipeline import LogPipeline
+from Profiler import Profiler
+from QuizContent import Question
+from TimerWheel import TimerWheel
 from UserInfo import UserInfo
+from UserUpdateProcessor import UserUpdateProcessor
 
 from DBManager import DBManager
 
@@ -27,6 +64,9 @@ logging.basicConfig(
 
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
+# Inline menus belong to the per user conversation like everything else, they need no per message tracking
+warnings.filterwarnings("ignore", "If 'per_message=False'", PTBUserWarning)
+
 logger = logging.getLogger(__name__)
 
 class BotActions(Enum):
@@ -46,31 +86,145 @@ class BotActions(Enum):
     DONE_ACTION = auto()
     REMOVE_ITEM = auto()
     CHECK_PASSWORD = auto()
+    IMPORT_ARCHIVE = auto()
+    BROADCAST_MESSAGE = auto()
+    READ_ARTICLE = auto()
 
 ADMIN_HASH = ""
 
+# Inline button data, the prefix followed by a node id, and a page number for articles
+MENU_CALLBACK = "m:"
+RESULTS_CALLBACK = "r:"
+PAGE_CALLBACK = "p:"
+
+# Texts and inline buttons besides the item names that render the menu
+MENU_COMMANDS_PATTERN = re.compile(f"^(Done|/start|/go)\\b|^({MENU_CALLBACK}|{RESULTS_CALLBACK}|{PAGE_CALLBACK})")
+
+# Characters of an article's first page sent along with an inline query result
+INLINE_PREVIEW_LENGTH = 200
+
+HANDLER_UPDATE_TYPES = {
+    MessageHandler: [Update.MESSAGE],
+    CommandHandler: [Update.MESSAGE],
+    CallbackQueryHandler: [Update.CALLBACK_QUERY],
+    InlineQueryHandler: [Update.INLINE_QUERY]
+}
+
+def applicationBuilder(token: str, config: BotConfig) -> ApplicationBuilder:
+    builder = Application.builder().token(token)
+
+    if config.base_url:
+        builder = builder.base_url(config.base_url)
+    if config.base_file_url:
+        builder = builder.base_file_url(config.base_file_url)
+
+    return builder
+
+def runApplication(application: Application, config: BotConfig, allowed_updates: list) -> None:
+    if config.mode == RunMode.WEBHOOK:
+        webhook = config.webhook
+        application.run_webhook(listen=webhook.listen,
+                                port=webhook.port,
+                                url_path=webhook.url_path,
+                                webhook_url=webhook.webhook_url or None,
+                                secret_token=webhook.secret_token or None,
+                                max_connections=webhook.max_connections,
+                                cert=webhook.cert or None,
+                                key=webhook.key or None,
+                                allowed_updates=allowed_updates)
+    else:
+        application.run_polling(allowed_updates=allowed_updates)
+
 class TelegramBot:
-    def __init__(self, token: str ) -> None:
+    def __init__(
+            self,
+            token: str,
+            config: BotConfig = None,
+            request: BaseRequest = None,
+            get_updates_request: BaseRequest = None,
+            media_storage: MediaStorage = None,
+            db_manager: DBManager = None
+            ) -> None:
+        self.config = config if config is not None else BotConfig()
         self.users = {}
-        self.navigator = ContentNavigator("bot_content.json")
-
-        self.db_manager = DBManager("db/bot_info.db")
+        # Storage shared by several bots is started and stopped by its owner
+        self.owns_media_storage = media_storage is None
+        self.media_storage = media_storage if media_storage is not None else MediaStorage()
+        self.navigator = ContentNavigator(self.config.content_file, self.media_storage)
+        self.content_index = ContentIndex(self.navigator, self.config.inline_query.cache_size,
+                                          self.config.inline_query.max_results)
+
+        self.db_manager = db_manager if db_manager is not None else DBManager(self.config.db_file)
         self.db_manager.initDB()
 
         self.navigation_helper = NavigationHelper(self)
         self.article_helper = ArticleHelper(self)
         self.quiz_helper = QuizHelper(self)
+        self.archive_helper = ArchiveHelper(self)
+        self.broadcast_helper = BroadcastHelper(self)
+
+        self.message_cleaner = MessageCleaner()
+        self.jobs = BackgroundJobs(self.message_cleaner)
+        # Quiz deadlines, one wheel for every attempt in progress
+        self.timers = TimerWheel(self.config.quiz.timer_tick, self.config.quiz.timer_slots)
+        self.broadcaster = Broadcaster(self.db_manager, self.jobs, self.config.broadcast)
+        self.attempt_log = AttemptLog(self.db_manager, self.config.attempts)
+
+        # Handlers are wrapped before they are registered
+        self.metrics = Metrics(self.config.metrics.enabled)
+        for owner in (self, self.navigation_helper, self.article_helper, self.quiz_helper, self.archive_helper,
+                      self.broadcast_helper):
+            self.metrics.instrumentHandlers(owner, ("flushMessages",))
+        self.metrics.instrumentCalls(self.db_manager)
+
+        self.update_processor = UserUpdateProcessor(max(self.config.concurrent_updates, 1), self.config.flood,
+                                                    self.config.name)
+
+        builder = applicationBuilder(token, self.config) \
+            .concurrent_updates(self.update_processor) \
+            .post_init(self.postInit) \
+            .post_stop(self.postStop) \
+            .post_shutdown(self.postShutdown)
+
+        if request is None:
+            request, default_updates_request = botRequests(self.config.http)
+            get_updates_request = get_updates_request or default_updates_request
+        get_updates_request = get_updates_request or request
+        if self.metrics.enabled:
+            get_updates_request = InstrumentedRequest(get_updates_request, self.metrics)
+            request = InstrumentedRequest(request, self.metrics)
+
+        builder = builder.request(request).get_updates_request(get_updates_request)
+
+        self.application = builder.build()
+        self.addGauges()
+        self.profiler = Profiler(self.application)
+
+        inline_handlers = []
+        inline_fallbacks = []
+        quiz_inline_handlers = []
+        if self.config.keyboard == KeyboardMode.INLINE:
+            inline_handlers = [CallbackQueryHandler(self.selectInline, pattern=f"^({MENU_CALLBACK}|{RESULTS_CALLBACK}|{PAGE_CALLBACK})")]
+            inline_fallbacks = [CallbackQueryHandler(self.answerInline)]
+            quiz_inline_handlers = [CallbackQueryHandler(self.quiz_helper.selectAfterQuiz, pattern=f"^({MENU_CALLBACK}|{RESULTS_CALLBACK}|{PAGE_CALLBACK})")]
 
-        self.application = Application.builder().token(token).build()
         # global conv_handler
         self.conv_handler = ConversationHandler(
-            entry_points=[CommandHandler("start", self.startMenu)],
+            entry_points=[CommandHandler("start", self.startMenu),
+                          CommandHandler("go", self.goTo)] + inline_handlers,
             states={
                 BotActions.MENU: [MessageHandler(filters.Regex("^Add$"), self.addItem),
                                   MessageHandler(filters.Regex("^Delete$"), self.removeItemStart),
                                   MessageHandler(filters.Regex("^Quiz Results$"), self.quiz_helper.printQuizResults),
                                   CommandHandler("admin", self.authorize),
-                                  CommandHandler("exit", self.exit)],
+                                  CommandHandler("import", self.archive_helper.importStart),
+                                  CommandHandler("export", self.archive_helper.exportContent),
+                                  CommandHandler("stats", self.printStats),
+                                  CommandHandler("profile", self.startProfiling),
+                                  CommandHandler("broadcast", self.broadcast_helper.broadcastStart),
+                                  CommandHandler("link", self.printLinks),
+                                  CommandHandler("undo", self.undoEdit),
+                                  CommandHandler("exit", self.exit)] + inline_handlers,
                 BotActions.ADD_ITEM: [MessageHandler(filters.Regex("^Navigation$"), self.navigation_helper.addNavigation),
                                       MessageHandler(filters.Regex("^Article$"), self.article_helper.addArticle),
                                       MessageHandler(filters.Regex("^Quiz$"), self.quiz_helper.addQuizName),
@@ -85,14 +239,23 @@ class TelegramBot:
                 BotActions.SAVE_ARTICLE_TEXT_CONTENT: [MessageHandler(filters.TEXT, self.article_helper.saveArticleTextContent)],
                 BotActions.SAVE_ARTICLE_IMAGE_CONTENT: [MessageHandler(filters.PHOTO, self.article_helper.saveArticleImageContent)],
                 BotActions.SAVE_ARTICLE_VIDEO_CONTENT: [MessageHandler(filters.VIDEO, self.article_helper.saveArticleVideoContent)],
-                BotActions.ASK_QUESTION: [MessageHandler(filters.TEXT, self.quiz_helper.askQuestion)],
+                BotActions.ASK_QUESTION: [MessageHandler(filters.TEXT, self.quiz_helper.askQuestion)] + quiz_inline_handlers,
                 BotActions.ADD_QUIZ_CONTENT: [MessageHandler(filters.TEXT, self.quiz_helper.addQuizContent)],
                 BotActions.SAVE_QUIZ: [MessageHandler(filters.Document.ALL, self.quiz_helper.saveQuiz)],
-                BotActions.DONE_ACTION: [MessageHandler(filters.Regex("^Done$"), self.doneAction)],
+                BotActions.DONE_ACTION: [MessageHandler(filters.Regex("^Done$"), self.doneAction)] + inline_handlers,
                 BotActions.REMOVE_ITEM: [MessageHandler(filters.Regex("^Back$"), self.doneAction)],
-                BotActions.CHECK_PASSWORD: [MessageHandler(filters.TEXT, self.checkPassword)]
+                BotActions.CHECK_PASSWORD: [MessageHandler(filters.TEXT, self.checkPassword)],
+                BotActions.IMPORT_ARCHIVE: [MessageHandler(filters.Document.ALL, self.archive_helper.importArchive)],
+                BotActions.BROADCAST_MESSAGE: [MessageHandler(filters.TEXT | filters.PHOTO | filters.VIDEO,
+                                                              self.broadcast_helper.broadcastMessage)],
+                BotActions.READ_ARTICLE: [MessageHandler(filters.Regex("^Next$"), self.article_helper.nextPage),
+                                          MessageHandler(filters.Regex("^Prev$"), self.article_helper.prevPage),
+                                          MessageHandler(filters.Regex("^Done$"), self.article_helper.closeArticle)]
             },
-            fallbacks=[CommandHandler("cancel", self.cancel)]
+            # A deep link can be followed from the middle of any step that doesn't take free text
+            fallbacks=[CommandHandler("cancel", self.cancel),
+                       CommandHandler("start", self.startMenu),
+                       CommandHandler("go", self.goTo)] + inline_fallbacks
         )
 
         self.navigation_message_handler = MessageHandler(filters.TEXT, self.updateMenu)
@@ -102,64 +265,165 @@ class TelegramBot:
         self.article_message_handler = MessageHandler(filters.TEXT, self.article_helper.printArticle)
         self.quiz_message_handler = MessageHandler(filters.TEXT, self.quiz_helper.startQuiz)
 
+        self.filters_version = None
         self.updateFilters()
 
         self.application.add_handler(self.conv_handler)
         self.application.add_handler(CommandHandler("start", self.doneAction))
+        if self.config.inline_query.enabled:
+            self.application.add_handler(InlineQueryHandler(self.searchContent))
+        self.application.add_handler(TypeHandler(Update, self.flushMessages), group=1)
 
     def updateFilters(self) -> None:
-        navigation_filter = self.navigator.navigation_filter
-        article_filter = self.navigator.article_filter
-        quiz_filter = self.navigator.quiz_filter
-
+        version = self.navigator.version
+        # Called after every edit and reload, a version whose handlers are in place is left alone
+        if version is self.filters_version:
+            return
+        self.filters_version = version
+
+        navigation_filter = version.navigation_filter
+        article_filter = version.article_filter
+        quiz_filter = version.quiz_filter
+
+        # The patterns were compiled when the version was published, off the event loop
+        navigation_handler = remove_navigation_handler = None
         if navigation_filter != "" and navigation_filter != "^()$":
-            self.navigation_message_handler = MessageHandler(filters.Regex(navigation_filter), self.updateMenu)
-            self.remove_navigation_message_handler = MessageHandler(filters.Regex(navigation_filter), self.removeItemFinish)
-            self.conv_handler.states[BotActions.MENU].append(self.navigation_message_handler)
-            self.conv_handler.states[BotActions.REMOVE_ITEM].append(self.remove_navigation_message_handler)
-        else:
-            if self.navigation_message_handler in self.conv_handler.states[BotActions.MENU]:
-                self.conv_handler.states[BotActions.MENU].remove(self.navigation_message_handler)
-            if self.remove_navigation_message_handler in self.conv_handler.states[BotActions.REMOVE_ITEM]:
-                self.conv_handler.states[BotActions.REMOVE_ITEM].remove(self.remove_navigation_message_handler)
-
+            navigation_handler = MessageHandler(filters.Regex(version.navigation_pattern), self.updateMenu)
+            remove_navigation_handler = MessageHandler(filters.Regex(version.navigation_pattern), self.removeItemFinish)
+        self.navigation_message_handler = self.replaceHandler(BotActions.MENU, self.navigation_message_handler,
+                                                              navigation_handler)
+        self.remove_navigation_message_handler = self.replaceHandler(BotActions.REMOVE_ITEM,
+                                                                     self.remove_navigation_message_handler,
+                                                                     remove_navigation_handler)
+
+        article_handler = remove_article_handler = None
         if article_filter != "" and article_filter != "^()$":
-            self.article_message_handler = MessageHandler(filters.Regex(article_filter), self.article_helper.printArticle)
-            self.remove_article_message_handler = MessageHandler(filters.Regex(article_filter), self.removeItemFinish)
-            self.conv_handler.states[BotActions.MENU].append(self.article_message_handler)
-            self.conv_handler.states[BotActions.REMOVE_ITEM].append(self.remove_article_message_handler)
-        else:
-            if self.article_message_handler in self.conv_handler.states[BotActions.MENU]:
-                self.conv_handler.states[BotActions.MENU].remove(self.article_message_handler)
-            if self.remove_article_message_handler in self.conv_handler.states[BotActions.REMOVE_ITEM]:
-                self.conv_handler.states[BotActions.REMOVE_ITEM].remove(self.remove_article_message_handler)
-
+            article_handler = MessageHandler(filters.Regex(version.article_pattern), self.article_helper.printArticle)
+            remove_article_handler = MessageHandler(filters.Regex(version.article_pattern), self.removeItemFinish)
+        self.article_message_handler = self.replaceHandler(BotActions.MENU, self.article_message_handler,
+                                                           article_handler)
+        self.remove_article_message_handler = self.replaceHandler(BotActions.REMOVE_ITEM,
+                                                                  self.remove_article_message_handler,
+                                                                  remove_article_handler)
+
+        quiz_handler = remove_quiz_handler = None
         if quiz_filter != "" and quiz_filter != "^()$":
-            self.quiz_message_handler = MessageHandler(filters.Regex(quiz_filter), self.quiz_helper.startQuiz)
-            self.remove_quiz_message_handler = MessageHandler(filters.Regex(quiz_filter), self.removeQuizItem)
-            self.conv_handler.states[BotActions.MENU].append(self.quiz_message_handler)
-            self.conv_handler.states[BotActions.REMOVE_ITEM].append(self.remove_quiz_message_handler)
-        else:
-            if self.quiz_message_handler in self.conv_handler.states[BotActions.MENU]:
-                self.conv_handler.states[BotActions.MENU].remove(self.quiz_message_handler)
-            if self.remove_quiz_message_handler in self.conv_handler.states[BotActions.REMOVE_ITEM]:
-                self.conv_handler.states[BotActions.REMOVE_ITEM].remove(self.remove_quiz_message_handler)
+            quiz_handler = MessageHandler(filters.Regex(version.quiz_pattern), self.quiz_helper.startQuiz)
+            remove_quiz_handler = MessageHandler(filters.Regex(version.quiz_pattern), self.removeQuizItem)
+        self.quiz_message_handler = self.replaceHandler(BotActions.MENU, self.quiz_message_handler, quiz_handler)
+        self.remove_quiz_message_handler = self.replaceHandler(BotActions.REMOVE_ITEM, self.remove_quiz_message_handler,
+                                                               remove_quiz_handler)
+
+        # Only these updates replace the menu, a queued photo or unmatched text leaves it to the current one
+        self.update_processor.setMenuPatterns([version.navigation_pattern, version.article_pattern,
+                                               version.quiz_pattern, MENU_COMMANDS_PATTERN])
+
+    def replaceHandler(self, state: BotActions, old: MessageHandler, new: MessageHandler) -> MessageHandler:
+        # The new handler takes the old one's place, the state's handlers don't pile up across versions
+        handlers = self.conv_handler.states[state]
+        if old in handlers:
+            if new is not None:
+                handlers[handlers.index(old)] = new
+            else:
+                handlers.remove(old)
+        elif new is not None:
+            handlers.append(new)
+        return new if new is not None else old
+
+    def allowedUpdates(self) -> list:
+        handlers = []
+        for group in self.application.handlers.values():
+            handlers.extend(group)
+
+        allowed_updates = []
+        while handlers:
+            handler = handlers.pop()
+            if isinstance(handler, ConversationHandler):
+                handlers.extend(handler.entry_points)
+                handlers.extend(handler.fallbacks)
+                for state_handlers in handler.states.values():
+                    handlers.extend(state_handlers)
+                continue
+
+            for update_type in HANDLER_UPDATE_TYPES.get(type(handler), []):
+                if update_type not in allowed_updates:
+                    allowed_updates.append(update_type)
+
+        return allowed_updates
+
+    def addGauges(self) -> None:
+        self.metrics.addGauge("bot_known_users", "Known users", lambda: len(self.users))
+        if self.metrics.enabled:
+            self.metrics.addGauge("bot_active_users", "Active users", self.metrics.activeUsers)
+        self.metrics.addGauge("bot_active_quizzes", "Quizzes in progress",
+                              lambda: sum("quiz_questions" in data for data in self.application.user_data.values()))
+        self.metrics.addGauge("bot_content_items", "Content items", lambda: self.navigator.version.item_counts, "type")
+        self.metrics.addGauge("bot_content_file_bytes", "Content file bytes",
+                              lambda: os.path.getsize(self.config.content_file))
+        self.metrics.addGauge("bot_quiz_deadlines", "Pending quiz deadlines", lambda: self.timers.scheduled)
+        self.metrics.addGauge("bot_quiz_attempts_pending", "Quiz attempts waiting to be written",
+                              lambda: len(self.attempt_log.pending))
+        self.metrics.addGauge("bot_dropped_updates", "Dropped updates", lambda: self.update_processor.dropped, "reason")
 
     def run(self) -> None:
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        with LogPipeline(self.config.logging):
+            runApplication(self.application, self.config, self.allowedUpdates())
+
+    async def postInit(self, application: Application) -> None:
+        self.message_cleaner.start(application.bot)
+        self.jobs.start(application.bot)
+        self.broadcaster.start(application.bot)
+        self.timers.start()
+        self.attempt_log.start()
+        if self.owns_media_storage:
+            self.media_storage.start()
+        self.metrics.start(self.config.metrics.listen, self.config.metrics.port)
+        if self.config.inline_query.enabled:
+            self.content_index.refresh()
+
+        # SIGUSR2 toggles a profile of the running process
+        self.profiler.watchSignal()
+
+    async def postStop(self, application: Application) -> None:
+        self.profiler.unwatchSignal()
+        await self.profiler.close()
+        self.broadcaster.stop()
+        await self.timers.stop()
+        # After the deadlines, attempts they finished are written too
+        await self.attempt_log.stop()
+        await self.jobs.stop()
+
+        await self.message_cleaner.stop()
+        if self.owns_media_storage:
+            await self.media_storage.stop()
+        await self.metrics.stop()
+
+    async def postShutdown(self, application: Application) -> None:
+        self.jobs.shutdown()
+        if self.owns_media_storage:
+            self.media_storage.shutdown()
+
+    def userSnapshot(self, user_info: UserInfo) -> UserInfo:
+        # Background jobs keep the location the admin had when the job was submitted
+        snapshot = copy.copy(user_info)
+        snapshot.history = list(user_info.history)
+        return snapshot
+
+    def clearPreviousMessages(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.message_cleaner.remove(update.effective_chat.id, update.message.id)
 
-    async def clearPreviousMessages(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        user = update.message.from_user
-        try:
-            await update.message.delete()
-        except:
-            logger.info("Can't delete message from %s", user.first_name)
+        if "message_id" in context.user_data:
+            self.message_cleaner.remove(update.effective_chat.id, context.user_data.pop("message_id"))
 
-        try:
-            if "message_id" in context.user_data:
-                await context.bot.delete_message(self.users[user.id].chat_id, context.user_data["message_id"])
-        except:
-            logger.info("Can't delete bot message")
+    async def runDB(self, func: Callable, *args) -> object:
+        # Writes wait for the DB write lock, which attempt compaction holds while it folds a partition
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def flushMessages(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        self.message_cleaner.flush()
+
+        if self.profiler.running:
+            self.profiler.countUpdate()
 
     async def startMenu(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
@@ -168,19 +432,87 @@ class TelegramBot:
         if user.id not in self.users:
             self.users[user.id] = UserInfo(user.first_name, user.id,
                                            update.effective_chat.id)
+            # Chats are kept in the DB so broadcasts reach users from before a restart
+            await self.runDB(self.db_manager.addChat, update.effective_chat.id, user.id, user.first_name)
+
+        # "/start <slug>" comes from a deep link, the item opens right away
+        if context.args:
+            return await self.openLink(update, context, context.args[0])
 
         return await self.updateMenu(update, context)
 
+    async def goTo(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s following a link", user.first_name)
+
+        return await self.startMenu(update, context)
+
+    async def openLink(self, update: Update, context: ContextTypes.DEFAULT_TYPE, slug: str) -> int:
+        user_info = self.users[update.message.from_user.id]
+        path, node_type = self.navigator.getNode(slug)
+
+        self.message_cleaner.release(update.effective_chat.id)
+
+        if path is None:
+            new_message = await context.bot.send_message(user_info.chat_id, "This link is no longer valid")
+            self.message_cleaner.track(update.effective_chat.id, new_message.id)
+            user_info.history = []
+            return await self.updateMenu(update, context)
+
+        # The whole path is set at once, no menu is sent for the levels above the item
+        if node_type == ButtonType.ARTICLE:
+            user_info.history = path[:-1]
+            if self.inlineMenu(user_info):
+                return await self.article_helper.printInlineArticle(update, context, slug, 0)
+            return await self.article_helper.openArticle(update, context, slug)
+
+        if node_type == ButtonType.QUIZ:
+            user_info.history = path[:-1]
+            return await self.quiz_helper.openQuiz(update, context, path[-1])
+
+        user_info.history = path
+        return await self.updateMenu(update, context)
+
     async def updateMenu(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         logger.info("User %s selecting menu", user.first_name)
 
         user_info = self.users[user.id]
         new_content = self.navigator.moveTo(user_info, update.message.text)
+
+        if self.update_processor.coalesce(user.id):
+            # Only the newest queued tap gets a keyboard, the current one stays until then
+            self.message_cleaner.remove(update.effective_chat.id, update.message.id)
+            return BotActions.MENU
+
+        markup = self.menuMarkup(user_info, new_content)
+
+        self.clearPreviousMessages(update, context)
+
+        # An inline menu can't take down the reply keyboard of the step before it. Steps that show one
+        # flag it, a chat from before a restart or a switch to inline mode may still have one as well
+        if self.inlineMenu(user_info) and context.user_data.get("reply_keyboard", True):
+            new_message = await context.bot.send_message(user_info.chat_id, "Menu", reply_markup=ReplyKeyboardRemove())
+            self.message_cleaner.track(update.effective_chat.id, new_message.id)
+            context.user_data["reply_keyboard"] = False
+
+        new_message = await context.bot.send_message(user_info.chat_id, "Select value", reply_markup=markup)
+        context.user_data["message_id"] = new_message.id
+
+        return BotActions.MENU
+
+    def inlineMenu(self, user_info: UserInfo) -> bool:
+        # Admins keep the reply keyboard, the editing flows are built on it
+        return self.config.keyboard == KeyboardMode.INLINE and not user_info.is_admin
+
+    def menuMarkup(self, user_info: UserInfo, content: list) -> object:
+        if self.inlineMenu(user_info):
+            return self.inlineMenuMarkup(user_info, content)
+
         temp_list = []
         buttons_markup = [temp_list]
         
-        for idx, elem in enumerate(new_content):
+        for idx, elem in enumerate(content):
             if idx % 2 == 0 and idx != 0:
                 temp_list = []
                 buttons_markup.append(temp_list)
@@ -195,20 +527,168 @@ class TelegramBot:
             buttons_markup.append([KeyboardButton("Add"),
                                    KeyboardButton("Delete")])
 
-        markup = ReplyKeyboardMarkup(buttons_markup, resize_keyboard=True)
+        return ReplyKeyboardMarkup(buttons_markup, resize_keyboard=True)
 
-        await self.clearPreviousMessages(update, context)
+    def inlineMenuMarkup(self, user_info: UserInfo, content: list) -> InlineKeyboardMarkup:
+        temp_list = []
+        buttons_markup = [temp_list]
 
-        new_message = await context.bot.send_message(user_info.chat_id, "Select value", reply_markup=markup)
+        for idx, elem in enumerate(content):
+            if idx % 2 == 0 and idx != 0:
+                temp_list = []
+                buttons_markup.append(temp_list)
+            temp_list.append(InlineKeyboardButton(elem.label, callback_data=MENU_CALLBACK + elem.node_id))
+
+        buttons_markup.append([InlineKeyboardButton("Quiz Results", callback_data=RESULTS_CALLBACK + nodeId(user_info.history))])
+
+        if user_info.history:
+            buttons_markup.append([InlineKeyboardButton("Back", callback_data=MENU_CALLBACK + nodeId(user_info.history[:-1]))])
+
+        return InlineKeyboardMarkup([row for row in buttons_markup if row])
+
+    async def sendMenu(self, context: ContextTypes.DEFAULT_TYPE, user_info: UserInfo) -> None:
+        new_content = self.navigator.moveTo(user_info, "")
+        new_message = await context.bot.send_message(user_info.chat_id, "Select value",
+                                                     reply_markup=self.menuMarkup(user_info, new_content))
         context.user_data["message_id"] = new_message.id
 
+    async def editMenu(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, markup: object) -> None:
+        query = update.callback_query
+        chat_id = update.effective_chat.id
+
+        if query is None:
+            # Opened by a link, there is no menu message to edit
+            self.clearPreviousMessages(update, context)
+            new_message = await context.bot.send_message(chat_id, text, reply_markup=markup)
+            context.user_data["message_id"] = new_message.id
+            return
+
+        # A button of an older menu was tapped, the newer one goes away
+        if context.user_data.get("message_id", query.message.message_id) != query.message.message_id:
+            self.message_cleaner.remove(chat_id, context.user_data.pop("message_id"))
+
+        if isinstance(markup, InlineKeyboardMarkup) and getattr(query.message, "text", None) is not None:
+            try:
+                await query.edit_message_text(text, reply_markup=markup)
+                context.user_data["message_id"] = query.message.message_id
+                return
+            except BadRequest as error:
+                if error.message.startswith("Message is not modified"):
+                    context.user_data["message_id"] = query.message.message_id
+                    return
+                logger.info("Can't edit menu in chat %s: %s", chat_id, error.message)
+
+        # Deleted meanwhile, a media page, or a reply keyboard which no message can be edited into
+        self.dropMenu(update, context)
+        new_message = await context.bot.send_message(chat_id, text, reply_markup=markup)
+        context.user_data["message_id"] = new_message.id
+
+    def dropMenu(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if update.callback_query is None:
+            self.clearPreviousMessages(update, context)
+            return
+
+        self.message_cleaner.remove(update.effective_chat.id, update.callback_query.message.message_id)
+        if "message_id" in context.user_data:
+            self.message_cleaner.remove(update.effective_chat.id, context.user_data.pop("message_id"))
+
+    async def selectInline(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        query = update.callback_query
+        user = query.from_user
+        logger.info("User %s selecting inline menu", user.first_name)
+
+        if user.id not in self.users:
+            # Inline keyboards outlive restarts, the first tap brings the user back
+            self.users[user.id] = UserInfo(user.first_name, user.id, update.effective_chat.id)
+            await self.runDB(self.db_manager.addChat, update.effective_chat.id, user.id, user.first_name)
+
+        user_info = self.users[user.id]
+        action = query.data[:len(MENU_CALLBACK)]
+        node_id, _, page = query.data[len(MENU_CALLBACK):].partition(":")
+        path, node_type = self.navigator.getNode(node_id)
+
+        if path is None:
+            await query.answer("This item was removed")
+            path, node_type = [], ButtonType.NAVIGATION
+        else:
+            await query.answer()
+
+        # Whatever the previous step left in the chat is deleted in one batch with this hop
+        self.message_cleaner.release(update.effective_chat.id)
+
+        if node_type == ButtonType.ARTICLE:
+            user_info.history = path[:-1]
+            return await self.article_helper.printInlineArticle(update, context, node_id, int(page or 0))
+
+        if node_type == ButtonType.QUIZ:
+            user_info.history = path[:-1]
+            return await self.quiz_helper.openQuiz(update, context, path[-1])
+
+        user_info.history = path
+
+        if action == RESULTS_CALLBACK:
+            return await self.quiz_helper.printInlineQuizResults(update, context)
+
+        if self.update_processor.coalesce(user.id):
+            # The newest queued tap edits the menu instead
+            return BotActions.MENU
+
+        new_content = self.navigator.moveTo(user_info, "")
+        await self.editMenu(update, context, "Select value", self.menuMarkup(user_info, new_content))
+
         return BotActions.MENU
 
+    async def answerInline(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        query = update.callback_query
+        logger.info("User %s tapped the menu in the middle of a step", query.from_user.first_name)
+
+        await query.answer("Finish the current step or /cancel it first")
+
+    async def searchContent(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        inline_query = update.inline_query
+        user = inline_query.from_user
+        logger.info("User %s searching content", user.first_name)
+
+        if self.update_processor.coalesce(user.id, "inline_query"):
+            # The user kept typing, only the newest query gets an answer
+            return
+
+        offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+        entries, next_offset = await self.content_index.search(inline_query.query, offset,
+                                                               min(self.config.inline_query.page_size, 50))
+
+        results = [self.searchResult(context, node_id, path, node_type, pages)
+                   for node_id, path, node_type, pages in entries]
+        # Results are the same for everyone, Telegram answers repeated queries from its own cache
+        await inline_query.answer(results, cache_time=self.config.inline_query.cache_time,
+                                  next_offset=str(next_offset) if next_offset else "")
+
+    def searchResult(self, context: ContextTypes.DEFAULT_TYPE, node_id: str, path: list,
+                     node_type: ButtonType, pages: list) -> InlineQueryResultArticle:
+        # The result is posted into another chat, its button opens the item here through a deep link
+        link = f"https://t.me/{context.bot.username}?start={node_id}"
+
+        if node_type == ButtonType.QUIZ:
+            text = f"Quiz: {path[-1]}"
+            button = InlineKeyboardButton("Start quiz", url=link)
+        else:
+            text = path[-1]
+            if pages and pages[0].type == ArticleContentType.TEXT:
+                preview = pages[0].content
+                if len(preview) > INLINE_PREVIEW_LENGTH:
+                    preview = preview[:INLINE_PREVIEW_LENGTH].rsplit(" ", 1)[0] + "..."
+                text += "\n\n" + preview
+            button = InlineKeyboardButton("Read", url=link)
+
+        return InlineQueryResultArticle(node_id, path[-1], InputTextMessageContent(text),
+                                        reply_markup=InlineKeyboardMarkup([[button]]),
+                                        description=" / ".join(path[:-1]) or None)
+
     async def addItem(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         logger.info("User %s adding item", user.first_name)
 
-        await self.clearPreviousMessages(update, context)
+        self.clearPreviousMessages(update, context)
         user_info = self.users[user.id]
 
         if not user_info.is_admin:
@@ -221,7 +701,7 @@ class TelegramBot:
                                        resize_keyboard=True)
 
         message = await context.bot.send_message(user_info.chat_id, "Select new item type", reply_markup=markup)
-        context.user_data["messages_to_remove"] = [message.id]
+        self.message_cleaner.track(update.effective_chat.id, message.id)
 
         return BotActions.ADD_ITEM
 
@@ -229,13 +709,18 @@ class TelegramBot:
         user = update.message.from_user
         logger.info("User %s selecting item to remove", user.first_name)
 
-        await self.clearPreviousMessages(update, context)
+        self.clearPreviousMessages(update, context)
 
         if not self.users[user.id].is_admin:
             return await self.updateMenu(update, context)
 
         user_info = self.users[user.id]
         new_content = self.navigator.moveTo(user_info, update.message.text)
+
+        if self.update_processor.coalesce(user.id):
+            # Only the newest queued tap gets a keyboard, the current one stays until then
+            return BotActions.REMOVE_ITEM
+
         temp_list = []
         buttons_markup = [temp_list]
         
@@ -251,7 +736,7 @@ class TelegramBot:
 
         new_message = await context.bot.send_message(self.users[user.id].chat_id, "Select item to delete", reply_markup=markup)
 
-        context.user_data["messages_to_remove"] = [new_message.id]
+        self.message_cleaner.track(update.effective_chat.id, new_message.id)
 
         return BotActions.REMOVE_ITEM
 
@@ -259,50 +744,50 @@ class TelegramBot:
         user = update.message.from_user
         logger.info("User %s removing quiz", user.first_name)
 
-        self.db_manager.deleteQuizFromDB(update.message.text)
-        return await self.removeItemFinish(update, context)
+        return await self.submitRemoval(update, context, True)
 
     async def removeItemFinish(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         logger.info("User %s removing item", user.first_name)
 
-        context.user_data["messages_to_remove"].append(update.message.id)
+        return await self.submitRemoval(update, context, False)
+
+    async def submitRemoval(self, update: Update, context: ContextTypes.DEFAULT_TYPE, is_quiz: bool) -> int:
+        user = update.message.from_user
+        self.message_cleaner.track(update.effective_chat.id, update.message.id)
 
         if not self.users[user.id].is_admin:
             return await self.updateMenu(update, context)
 
         user_info = self.users[user.id]
-        if self.navigator.removeItem(user_info, update.message.text):
-            new_message = await context.bot.send_message(self.users[user.id].chat_id, "The item is deleted",
-                                                         reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
-                                                         resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
-        else:
-            new_message = await context.bot.send_message(self.users[user.id].chat_id, "Can't delete item",
-                                                         reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
-                                                         resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+        name = update.message.text
+
+        async def removed(is_removed: bool) -> str:
+            return "the item is deleted" if is_removed else "can't delete item"
+
+        job_id = self.jobs.submit(user_info.chat_id, f"delete {name}", self.removeItemJob,
+                                  self.userSnapshot(user_info), name, is_quiz, done=removed)
+
+        new_message = await context.bot.send_message(user_info.chat_id, f"Deleting {name} as job #{job_id}",
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.message_cleaner.track(update.effective_chat.id, new_message.id)
 
         return BotActions.DONE_ACTION
+
+    def removeItemJob(self, job: Job, user_info: UserInfo, name: str, is_quiz: bool) -> bool:
+        if is_quiz:
+            job.progress("deleting quiz results")
+            self.db_manager.deleteQuizFromDB(name)
+
+        job.progress("updating content")
+        return self.navigator.removeItem(user_info, name)
     
     async def doneAction(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         logger.info("User %s done action", user.first_name)
-        user_info = self.users[user.id]
 
-        try:
-            if "messages_to_remove" in context.user_data:
-                await context.bot.delete_messages(user_info.chat_id, context.user_data["messages_to_remove"])
-                del context.user_data["messages_to_remove"]
-        except:
-            logger.info("Can't can't clear message history from %s", user.first_name)
-
-        try:
-            if "message_id" in context.user_data:
-                await context.bot.delete_message(self.users[user.id].chat_id, context.user_data["message_id"])
-            del context.user_data["message_id"]
-        except:
-            logger.info("Can't delete message from %s", user.first_name)
+        self.message_cleaner.release(update.effective_chat.id)
 
         return await self.updateMenu(update, context)
 
@@ -316,12 +801,9 @@ class TelegramBot:
         new_message = await context.bot.send_message(self.users[user.id].chat_id, "Enter password for admin functions or \"Done\" to stop",
                                                      reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
                                                      resize_keyboard=True))
-        
-        if "messages_to_remove" not in context.user_data:
-            context.user_data["messages_to_remove"] = []
+        context.user_data["reply_keyboard"] = True
 
-        context.user_data["messages_to_remove"].append(update.message.id)
-        context.user_data["messages_to_remove"].append(new_message.id)
+        self.message_cleaner.track(update.effective_chat.id, update.message.id, new_message.id)
 
         return BotActions.CHECK_PASSWORD
 
@@ -331,7 +813,7 @@ class TelegramBot:
         user_info = self.users[user.id]
 
         if update.message.text == "Done":
-            context.user_data["messages_to_remove"].append(update.message.id)
+            self.message_cleaner.track(update.effective_chat.id, update.message.id)
             return await self.doneAction(update, context)
 
         hash = hashlib.new('sha256')
@@ -342,12 +824,11 @@ class TelegramBot:
             new_message = await context.bot.send_message(user_info.chat_id, "Authorization done",
                                                          reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
                                                          resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(update.message.id)
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.message_cleaner.track(update.effective_chat.id, update.message.id, new_message.id)
             return BotActions.DONE_ACTION
         
         new_message = await context.bot.send_message(self.users[user.id].chat_id, "Incorrect password")
-        context.user_data["messages_to_remove"].append(new_message.id)
+        self.message_cleaner.track(update.effective_chat.id, new_message.id)
 
         return await self.authorize(update, context)
 
@@ -362,6 +843,101 @@ class TelegramBot:
 
         return await self.updateMenu(update, context)
 
+    async def printStats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s getting bot statistics", user.first_name)
+
+        if user.id not in self.users or not self.users[user.id].is_admin:
+            return await self.updateMenu(update, context)
+
+        new_message = await context.bot.send_message(self.users[user.id].chat_id, self.metrics.summary(),
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.message_cleaner.track(update.effective_chat.id, update.message.id, new_message.id)
+
+        return BotActions.DONE_ACTION
+
+    async def printLinks(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s getting links", user.first_name)
+
+        if user.id not in self.users or not self.users[user.id].is_admin:
+            return await self.updateMenu(update, context)
+
+        user_info = self.users[user.id]
+        content = self.navigator.moveTo(user_info, "")
+
+        # "/link" lists the current menu and its items, "/link <name>" only that item
+        name = " ".join(context.args or [])
+        links = [("This menu", nodeId(user_info.history))] if not name else []
+        links += [(elem.label, elem.node_id) for elem in content if not name or elem.label == name]
+
+        lines = [f"{label}: https://t.me/{context.bot.username}?start={slug}" for label, slug in links]
+        text = "\n".join(lines) if lines else f"No item named \"{name}\" here"
+        # Huge menus are cut at a line that fits into one message
+        text, _ = self.navigator.paginator.takeChunk(text, self.navigator.paginator.text_limit)
+
+        new_message = await context.bot.send_message(user_info.chat_id, text,
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.message_cleaner.track(update.effective_chat.id, update.message.id, new_message.id)
+
+        return BotActions.DONE_ACTION
+
+    async def undoEdit(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s undoing the last edit", user.first_name)
+
+        if user.id not in self.users or not self.users[user.id].is_admin:
+            return await self.updateMenu(update, context)
+
+        # Waits for a running content job, edits are applied one at a time
+        version = await self.jobs.run(self.navigator.undoEdit)
+        if version:
+            self.updateFilters()
+            text = f"Last edit undone, content is back at version {version}"
+        else:
+            text = "Nothing to undo"
+
+        new_message = await context.bot.send_message(self.users[user.id].chat_id, text,
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.message_cleaner.track(update.effective_chat.id, update.message.id, new_message.id)
+
+        return BotActions.DONE_ACTION
+
+    async def startProfiling(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s starting profiling", user.first_name)
+
+        if user.id not in self.users or not self.users[user.id].is_admin:
+            return await self.updateMenu(update, context)
+
+        # "/profile 200" profiles the next 200 updates, "/profile 30s" the next 30 seconds
+        updates, seconds = 100, 0.0
+        argument = context.args[0] if context.args else ""
+        try:
+            if argument.endswith("s"):
+                updates, seconds = 0, float(argument[:-1])
+            elif argument:
+                updates = int(argument)
+        except ValueError:
+            argument = None
+
+        if argument is None or updates < 0 or seconds < 0 or (not updates and not seconds):
+            text = "Usage: /profile [updates] or /profile [seconds]s"
+        elif self.profiler.start(updates, seconds, self.users[user.id].chat_id):
+            text = "Profiling started, the summary will be sent here"
+        else:
+            text = "Profiling is already running"
+
+        new_message = await context.bot.send_message(self.users[user.id].chat_id, text,
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.message_cleaner.track(update.effective_chat.id, update.message.id, new_message.id)
+
+        return BotActions.DONE_ACTION
+
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         logger.info("User %s canceled the conversation.", user.first_name)
@@ -382,8 +958,7 @@ class NavigationHelper:
         logger.info("User %s adding Navigation", user.first_name)
 
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Enter navigation name", reply_markup=ReplyKeyboardRemove())
-        context.user_data["messages_to_remove"].append(new_message.id)
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id, update.message.id)
 
         return BotActions.ADD_NAVIGATION
 
@@ -392,18 +967,18 @@ class NavigationHelper:
         logger.info("User %s saving Navigation", user.first_name)
 
         user_info = self.bot.users[user.id]
-        if self.bot.navigator.addNavigation(user_info, update.message.text):
+        if await self.bot.jobs.run(self.bot.navigator.addNavigation, user_info, update.message.text):
             new_message = await context.bot.send_message(user_info.chat_id, "Navigation added successfully", 
                                                          reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
                                                                                           resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         else:
             new_message = await context.bot.send_message(user_info.chat_id, "Adding navigation failed", 
                                                          reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
                                                                                           resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
 
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
 
         self.bot.updateFilters()
         return BotActions.DONE_ACTION
@@ -417,8 +992,7 @@ class ArticleHelper:
         logger.info("User %s adding new article", user.first_name)
 
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Enter new article name", reply_markup=ReplyKeyboardRemove())
-        context.user_data["messages_to_remove"].append(new_message.id)
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id, update.message.id)
 
         return BotActions.ADD_ARTICLE_NAME
 
@@ -426,14 +1000,14 @@ class ArticleHelper:
         user = update.message.from_user
         logger.info("User %s adding new article name", user.first_name)
 
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
         user_info = self.bot.users[user.id]
 
-        if not self.bot.navigator.addArticle(user_info, update.message.text):
+        if not await self.bot.jobs.run(self.bot.navigator.addArticle, user_info, update.message.text):
             new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Can't add new article",
                                                          reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
                                                                                           resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
             return BotActions.DONE_ACTION
         
         user_info.last_article = update.message.text
@@ -447,7 +1021,7 @@ class ArticleHelper:
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                      "Select new article content type", reply_markup=markup)
 
-        context.user_data["messages_to_remove"].append(new_message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         return BotActions.ADD_ARTICLE_CONTENT
     
     async def articleSelectContentType(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -462,8 +1036,7 @@ class ArticleHelper:
         
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                      "Select new article content type", reply_markup=markup)
-        context.user_data["messages_to_remove"].append(new_message.id)
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id, update.message.id)
 
         return BotActions.ADD_ARTICLE_CONTENT
 
@@ -473,8 +1046,7 @@ class ArticleHelper:
 
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                      "Enter article text", reply_markup=ReplyKeyboardRemove())
-        context.user_data["messages_to_remove"].append(new_message.id)
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id, update.message.id)
 
         return BotActions.SAVE_ARTICLE_TEXT_CONTENT
 
@@ -484,14 +1056,14 @@ class ArticleHelper:
 
         new_text = ArticleContent(ArticleContentType.TEXT, update.message.text)
         user_info = self.bot.users[user.id]
-        if self.bot.navigator.appendArticleContent(user_info, user_info.last_article, new_text):
+        if await self.bot.jobs.run(self.bot.navigator.appendArticleContent, user_info, user_info.last_article, new_text):
             new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Article text added")
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         else:
             new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Can't add article text")
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
 
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
         self.bot.updateFilters()
 
         return await self.articleSelectContentType(update, context)
@@ -503,8 +1075,7 @@ class ArticleHelper:
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                      "Upload image and caption", reply_markup=ReplyKeyboardRemove())
         
-        context.user_data["messages_to_remove"].append(new_message.id)
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id, update.message.id)
 
         return BotActions.SAVE_ARTICLE_IMAGE_CONTENT
     
@@ -512,27 +1083,22 @@ class ArticleHelper:
         user = update.message.from_user
         logger.info("User %s saving new article image", user.first_name)
 
-        file_id = update.message.photo[-1].file_id
-        new_file = await context.bot.get_file(file_id)
-        file_path = f"images/{file_id}.jpg"
-
-        if not os.path.isfile(file_path):
-            await new_file.download_to_drive(file_path)
+        file_path = await self.bot.media_storage.store(update.message.photo[-1], ".jpg")
 
         new_image = ArticleContent(ArticleContentType.IMAGE, file_path, update.message.caption)
         user_info = self.bot.users[user.id]
         
-        if self.bot.navigator.appendArticleContent(user_info, user_info.last_article, new_image):
+        if await self.bot.jobs.run(self.bot.navigator.appendArticleContent, user_info, user_info.last_article, new_image):
             new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                          "Image uploaded", reply_markup=ReplyKeyboardRemove())
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         else:
             new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                          "Can't upload image", reply_markup=ReplyKeyboardRemove())
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         self.bot.updateFilters()
 
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
 
         return await self.articleSelectContentType(update, context)
 
@@ -542,8 +1108,7 @@ class ArticleHelper:
 
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                      "Upload video and caption", reply_markup=ReplyKeyboardRemove())
-        context.user_data["messages_to_remove"].append(new_message.id)
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id, update.message.id)
 
         return BotActions.SAVE_ARTICLE_VIDEO_CONTENT
 
@@ -551,27 +1116,23 @@ class ArticleHelper:
         user = update.message.from_user
         logger.info("User %s saving new article video", user.first_name)
 
-        file_id = update.message.video.file_id
-        new_file = await context.bot.get_file(file_id)
-        file_path = f"videos/{update.message.video.file_name}"
-
-        if not os.path.isfile(file_path):
-            await new_file.download_to_drive(file_path)
+        video = update.message.video
+        file_path = await self.bot.media_storage.store(video, os.path.splitext(video.file_name or "")[1] or ".mp4")
 
         new_video = ArticleContent(ArticleContentType.VIDEO, file_path, update.message.caption)
         user_info = self.bot.users[user.id]
 
-        if self.bot.navigator.appendArticleContent(user_info, user_info.last_article, new_video):
+        if await self.bot.jobs.run(self.bot.navigator.appendArticleContent, user_info, user_info.last_article, new_video):
             new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                          "Video uploaded", reply_markup=ReplyKeyboardRemove())
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         else:
             new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
                                                          "Can't upload video", reply_markup=ReplyKeyboardRemove())
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         self.bot.updateFilters()
 
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
 
         return await self.articleSelectContentType(update, context)
     
@@ -582,8 +1143,7 @@ class ArticleHelper:
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "New article added",
                                                      reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
                                                                                       resize_keyboard=True))
-        context.user_data["messages_to_remove"].append(new_message.id)
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id, update.message.id)
         self.bot.updateFilters()
 
         return BotActions.DONE_ACTION
@@ -593,39 +1153,125 @@ class ArticleHelper:
         user_info = self.bot.users[user.id]
         logger.info("User %s print article", user.first_name)
 
-        article_content = self.bot.navigator.getArticle(user_info, update.message.text)
+        return await self.openArticle(update, context, nodeId(user_info.history + [update.message.text]))
 
-        await self.bot.clearPreviousMessages(update, context)
+    async def openArticle(self, update: Update, context: ContextTypes.DEFAULT_TYPE, node_id: str) -> int:
+        user_info = self.bot.users[update.message.from_user.id]
+        pages = self.bot.navigator.getArticlePages(node_id)
 
-        if len(article_content) == 0:
-            new_message = await context.bot.send_message(self.bot.users[user.id].chat_id,
+        self.bot.clearPreviousMessages(update, context)
+
+        if len(pages) == 0:
+            new_message = await context.bot.send_message(user_info.chat_id,
                                                          "Can't open article", reply_markup=ReplyKeyboardRemove())
-            context.user_data["messages_to_remove"] = [update.message.id, new_message.id]
+            self.bot.message_cleaner.track(update.effective_chat.id, update.message.id, new_message.id)
             return BotActions.DONE_ACTION
 
-        context.user_data["messages_to_remove"] = [update.message.id]
-
-        for elem in article_content:
-            if elem.type == ArticleContentType.TEXT:
-                new_message = await context.bot.send_message(user_info.chat_id, elem.content)
-                context.user_data["messages_to_remove"].append(new_message.id)
-            elif elem.type == ArticleContentType.IMAGE:
-                with open(elem.content, "rb") as image:
-                    new_message = await context.bot.send_photo(user_info.chat_id, image, caption=elem.caption)
-                    context.user_data["messages_to_remove"].append(new_message.id)
-                    image.close()
-            elif elem.type == ArticleContentType.VIDEO:
-                with open(elem.content, "rb") as video:
-                    new_message = await context.bot.send_video(user_info.chat_id, video, caption=elem.caption, supports_streaming=True)
-                    context.user_data["messages_to_remove"].append(new_message.id)
-                    video.close()
-
-        new_message = await context.bot.send_message(user_info.chat_id, "Done",
-                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
-                                                     resize_keyboard=True))
-        context.user_data["messages_to_remove"].append(new_message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
 
-        return BotActions.DONE_ACTION
+        # Only the first page is sent, the rest on request
+        context.user_data["article_pages"] = pages
+        context.user_data["article_page"] = 0
+        await self.sendPage(update, context, user_info)
+
+        return BotActions.READ_ARTICLE
+
+    async def nextPage(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s next article page", user.first_name)
+
+        return await self.turnPage(update, context, 1)
+
+    async def prevPage(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s previous article page", user.first_name)
+
+        return await self.turnPage(update, context, -1)
+
+    async def turnPage(self, update: Update, context: ContextTypes.DEFAULT_TYPE, step: int) -> int:
+        user_info = self.bot.users[update.message.from_user.id]
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
+
+        page = min(max(context.user_data["article_page"] + step, 0), len(context.user_data["article_pages"]) - 1)
+        if page != context.user_data["article_page"]:
+            context.user_data["article_page"] = page
+            await self.sendPage(update, context, user_info)
+
+        return BotActions.READ_ARTICLE
+
+    async def closeArticle(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s closing article", user.first_name)
+
+        for key in ("article_pages", "article_page", "page_message_id"):
+            context.user_data.pop(key, None)
+
+        return await self.bot.doneAction(update, context)
+
+    async def sendPage(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_info: UserInfo) -> None:
+        pages = context.user_data["article_pages"]
+        page = context.user_data["article_page"]
+
+        buttons = []
+        if page > 0:
+            buttons.append(KeyboardButton("Prev"))
+        if page < len(pages) - 1:
+            buttons.append(KeyboardButton("Next"))
+        markup = ReplyKeyboardMarkup([row for row in (buttons, [KeyboardButton("Done")]) if row], resize_keyboard=True)
+
+        # One page in the chat at a time
+        if "page_message_id" in context.user_data:
+            self.bot.message_cleaner.remove(update.effective_chat.id, context.user_data.pop("page_message_id"))
+
+        new_message = await self.sendBlock(context, user_info.chat_id, pages[page], markup)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
+        context.user_data["page_message_id"] = new_message.id
+        context.user_data["reply_keyboard"] = True
+
+    async def printInlineArticle(self, update: Update, context: ContextTypes.DEFAULT_TYPE, node_id: str, page: int) -> int:
+        user = update.effective_user
+        user_info = self.bot.users[user.id]
+        logger.info("User %s print article", user.first_name)
+
+        pages = self.bot.navigator.getArticlePages(node_id)
+        back = [InlineKeyboardButton("Back", callback_data=MENU_CALLBACK + nodeId(user_info.history))]
+
+        if len(pages) == 0:
+            await self.bot.editMenu(update, context, "Can't open article", InlineKeyboardMarkup([back]))
+            return BotActions.MENU
+
+        # The article may have become shorter since the button was sent
+        page = min(page, len(pages) - 1)
+
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("Prev", callback_data=f"{PAGE_CALLBACK}{node_id}:{page - 1}"))
+        if page < len(pages) - 1:
+            buttons.append(InlineKeyboardButton("Next", callback_data=f"{PAGE_CALLBACK}{node_id}:{page + 1}"))
+        markup = InlineKeyboardMarkup([row for row in (buttons, back) if row])
+
+        # Text pages replace the menu in place, media needs a new message
+        if pages[page].type == ArticleContentType.TEXT:
+            await self.bot.editMenu(update, context, pages[page].content, markup)
+        else:
+            self.bot.dropMenu(update, context)
+            new_message = await self.sendBlock(context, user_info.chat_id, pages[page], markup)
+            context.user_data["message_id"] = new_message.id
+
+        return BotActions.MENU
+
+    async def sendBlock(self, context: ContextTypes.DEFAULT_TYPE, chat_id: int, block: ArticleContent, markup: object) -> object:
+        if block.type == ArticleContentType.IMAGE:
+            image = await self.bot.media_storage.read(block.content)
+            return await context.bot.send_photo(chat_id, image, caption=block.caption or None, reply_markup=markup,
+                                                filename=os.path.basename(block.content),
+                                                write_timeout=self.bot.config.http.media_write_timeout)
+        if block.type == ArticleContentType.VIDEO:
+            video = await self.bot.media_storage.read(block.content)
+            return await context.bot.send_video(chat_id, video, caption=block.caption or None, supports_streaming=True,
+                                                reply_markup=markup, filename=os.path.basename(block.content),
+                                                write_timeout=self.bot.config.http.media_write_timeout)
+        return await context.bot.send_message(chat_id, block.content, reply_markup=markup)
     
 class QuizHelper:
     def __init__(self, bot: TelegramBot) -> None:
@@ -635,12 +1281,12 @@ class QuizHelper:
         user = update.message.from_user
         logger.info("User %s adding quiz name", user.first_name)
 
-        await self.bot.clearPreviousMessages(update, context)
+        self.bot.clearPreviousMessages(update, context)
 
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Enter quiz name",
                                                      reply_markup=ReplyKeyboardRemove())
         
-        context.user_data["messages_to_remove"].append(new_message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
 
         return BotActions.ADD_QUIZ_CONTENT
     
@@ -649,12 +1295,12 @@ class QuizHelper:
         logger.info("User %s adding quiz content", user.first_name)
 
         context.user_data["new_quiz_name"] = update.message.text
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
 
         new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Upload file with quiz questions",
                                                      reply_markup=ReplyKeyboardRemove())
         
-        context.user_data["messages_to_remove"].append(new_message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
     
         return BotActions.SAVE_QUIZ
     
@@ -662,91 +1308,116 @@ class QuizHelper:
         user = update.message.from_user
         logger.info("User %s saving quiz", user.first_name)
 
-        context.user_data["messages_to_remove"].append(update.message.id)
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
+        user_info = self.bot.users[user.id]
 
         file_id = update.message.document.file_id
         new_file = await context.bot.get_file(file_id)
 
         byte_content = await new_file.download_as_bytearray()
-        content = byte_content.decode("utf-8")
+        name = context.user_data["new_quiz_name"]
 
-        if self.bot.navigator.addQuiz(self.bot.users[user.id], context.user_data["new_quiz_name"], content):
-            new_message = await context.bot.send_message(self.bot.users[user.id].chat_id, "Quiz added successfully",
-                                                         reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
-                                                         resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+        async def saved(is_saved: bool) -> str:
+            if not is_saved:
+                return "error happend"
             self.bot.updateFilters()
-        else:
-            new_message = await context.bot.send_message(self.users[user.id].chat_id, "Error happend",
-                                                         reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
-                                                         resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+            return "quiz added successfully"
+
+        job_id = self.bot.jobs.submit(user_info.chat_id, f"add quiz {name}", self.saveQuizJob,
+                                      self.bot.userSnapshot(user_info), name, bytes(byte_content), done=saved)
+
+        new_message = await context.bot.send_message(user_info.chat_id, f"Checking the quiz as job #{job_id}",
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
 
         if "new_quiz_name" in context.user_data:
             del context.user_data["new_quiz_name"]
 
         return BotActions.DONE_ACTION
+
+    def saveQuizJob(self, job: Job, user_info: UserInfo, name: str, byte_content: bytes) -> bool:
+        job.progress("validating")
+        try:
+            return self.bot.navigator.addQuiz(user_info, name, byte_content.decode("utf-8"))
+        except ValueError:
+            # Not UTF-8 or not JSON
+            return False
     
     async def startQuiz(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         logger.info("User %s start quiz", user.first_name)
 
-        user_info = self.bot.users[user.id]
+        return await self.openQuiz(update, context, update.message.text)
+
+    async def openQuiz(self, update: Update, context: ContextTypes.DEFAULT_TYPE, name: str) -> int:
+        user_info = self.bot.users[update.effective_user.id]
+
+        current_quiz = self.bot.navigator.getQuiz(user_info, name)
+        if current_quiz is None:
+            if update.callback_query is not None:
+                await self.bot.sendMenu(context, user_info)
+                return BotActions.MENU
+            return await self.bot.updateMenu(update, context)
 
-        current_quiz = self.bot.navigator.getQuiz(user_info, update.message.text)
         questions = copy.deepcopy(current_quiz.questions)
         shuffle(questions)
-        if current_quiz is None:
-            return await self.bot.updateMenu(self, update)
-        
+
         if "message_id" in context.user_data:
-            await context.bot.delete_message(user_info.chat_id, context.user_data["message_id"])
+            self.bot.message_cleaner.remove(user_info.chat_id, context.user_data.pop("message_id"))
 
+        self.dropQuiz(context.user_data)
         context.user_data["quiz_name"] = current_quiz.label
         context.user_data["quiz_questions"] = questions
         context.user_data["total_score"] = current_quiz.total_score
         context.user_data["current_score"] = 0.0
-        context.user_data["messages_to_remove"] = []
+        context.user_data["quiz_started"] = time.time()
+        context.user_data["quiz_answers"] = []
+        context.user_data["question_time"] = current_quiz.question_time or self.bot.config.quiz.question_time
+
+        time_limit = current_quiz.time_limit or self.bot.config.quiz.time_limit
+        if time_limit:
+            context.user_data["quiz_timer"] = self.bot.timers.schedule(time_limit, self.deadline, self.quizTimedOut,
+                                                                       user_info.user_id, questions)
 
         return await self.askQuestion(update, context)
 
     async def askQuestion(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-        user = update.message.from_user
+        # The first question may come from an inline menu tap, which has no user message
+        user = update.effective_user
         logger.info("User %s asking question", user.first_name)
         user_info = self.bot.users[user.id]
 
+        if "quiz_questions" not in context.user_data:
+            # A deadline finished the quiz, its "Done" button leads here
+            return await self.bot.doneAction(update, context)
+
+        self.bot.timers.cancel(context.user_data.pop("question_timer", None))
+
         is_correct = False
         if "current_question" in context.user_data:
             for elem in context.user_data["current_question"].answers:
                 if elem.is_correct and elem.label == update.message.text:
                     context.user_data["current_score"] += context.user_data["current_question"].points
                     message = await context.bot.send_message(user_info.chat_id, "Correct")
-                    context.user_data["messages_to_remove"].append(message.id)
+                    self.bot.message_cleaner.track(update.effective_chat.id, message.id)
                     is_correct = True
                     break
 
             if not is_correct:
                 message = await context.bot.send_message(user_info.chat_id,
                                                         "Incorrect\n" + context.user_data["current_question"].hint)
-                context.user_data["messages_to_remove"].append(message.id)
+                self.bot.message_cleaner.track(update.effective_chat.id, message.id)
+
+            self.recordAnswer(context.user_data, update.message.text, is_correct)
 
+        self.bot.message_cleaner.track(update.effective_chat.id, update.effective_message.id)
 
+        return await self.nextQuestion(context, user_info)
+
+    async def nextQuestion(self, context: ContextTypes.DEFAULT_TYPE, user_info: UserInfo) -> int:
         if not context.user_data["quiz_questions"]:
-            score = str(context.user_data["current_score"]) + "/" + str(context.user_data["total_score"])
-            self.bot.db_manager.addUserResult(user.id, context.user_data["quiz_name"], score)
-            new_message = await context.bot.send_message(user_info.chat_id,
-                                                          "Quiz finished.\nYour score is: " + score,
-                                                          reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
-                                                          resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
-            context.user_data["messages_to_remove"].append(update.message.id)
-
-            del context.user_data["quiz_name"]
-            del context.user_data["quiz_questions"]
-            del context.user_data["current_question"]
-            del context.user_data["current_score"]
-            del context.user_data["total_score"]
-            return BotActions.DONE_ACTION
+            return await self.finishQuiz(context, user_info)
 
         question = context.user_data["quiz_questions"].pop(0)
 
@@ -764,12 +1435,113 @@ class QuizHelper:
         
         new_message = await context.bot.send_message(user_info.chat_id, question.label, reply_markup=markup)
 
-        context.user_data["messages_to_remove"].append(update.message.id)
-        context.user_data["messages_to_remove"].append(new_message.id)
+        self.bot.message_cleaner.track(user_info.chat_id, new_message.id)
+        context.user_data["reply_keyboard"] = True
         context.user_data["current_question"] = question
+        context.user_data["question_started"] = time.monotonic()
+
+        # The time starts once the question is out
+        question_time = question.time_limit or context.user_data["question_time"]
+        if question_time:
+            context.user_data["question_timer"] = self.bot.timers.schedule(question_time, self.deadline,
+                                                                           self.questionTimedOut, user_info.user_id,
+                                                                           question)
 
         return BotActions.ASK_QUESTION
 
+    def recordAnswer(self, user_data: dict, answer: str, is_correct: bool) -> None:
+        question = user_data["current_question"]
+        # No answer is a question that ran out of time
+        user_data["quiz_answers"].append({"question": question.label,
+                                          "answer": answer,
+                                          "correct": is_correct,
+                                          "points": question.points if is_correct else 0,
+                                          "seconds": round(time.monotonic() - user_data["question_started"], 3)})
+
+    async def finishQuiz(self, context: ContextTypes.DEFAULT_TYPE, user_info: UserInfo, timed_out: bool = False) -> int:
+        score = str(context.user_data["current_score"]) + "/" + str(context.user_data["total_score"])
+        # The latest score stays the only row per quiz, every attempt goes to the attempt log
+        await self.bot.runDB(self.bot.db_manager.addUserResult, user_info.user_id, context.user_data["quiz_name"], score)
+        self.bot.attempt_log.add(user_info.user_id, context.user_data["quiz_name"], context.user_data["quiz_started"],
+                                 context.user_data["current_score"], context.user_data["total_score"], timed_out,
+                                 context.user_data["quiz_answers"])
+        self.dropQuiz(context.user_data)
+
+        # The inline menu comes back right away, the score stays above it until the next tap
+        inline = self.bot.inlineMenu(user_info)
+        markup = ReplyKeyboardRemove() if inline else ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                                          resize_keyboard=True)
+        new_message = await context.bot.send_message(user_info.chat_id,
+                                                      "Quiz finished.\nYour score is: " + score,
+                                                      reply_markup=markup)
+        self.bot.message_cleaner.track(user_info.chat_id, new_message.id)
+        context.user_data["reply_keyboard"] = not inline
+
+        if inline:
+            await self.bot.sendMenu(context, user_info)
+            return BotActions.MENU
+        return BotActions.DONE_ACTION
+
+    def dropQuiz(self, user_data: dict) -> None:
+        self.bot.timers.cancel(user_data.pop("question_timer", None))
+        self.bot.timers.cancel(user_data.pop("quiz_timer", None))
+        for key in ("quiz_name", "quiz_questions", "current_question", "current_score", "total_score", "question_time",
+                    "quiz_started", "quiz_answers", "question_started"):
+            user_data.pop(key, None)
+
+    def deadline(self, timed_out: Callable, user_id: int, attempt: object) -> Awaitable:
+        # Handled like an update of the user, after the ones already in flight
+        return self.bot.update_processor.processForUser(user_id, timed_out(user_id, attempt))
+
+    def deadlineContext(self, user_id: int) -> ContextTypes.DEFAULT_TYPE:
+        application = self.bot.application
+        return application.context_types.context(application, self.bot.users[user_id].chat_id, user_id)
+
+    async def questionTimedOut(self, user_id: int, question: Question) -> None:
+        if user_id not in self.bot.users:
+            return
+
+        context = self.deadlineContext(user_id)
+        user_info = self.bot.users[user_id]
+        # Answered or abandoned while the deadline waited for the user's updates
+        if context.user_data.get("current_question") is not question:
+            return
+        logger.info("User %s ran out of time for a question", user_info.first_name)
+
+        context.user_data.pop("question_timer", None)
+        self.recordAnswer(context.user_data, None, False)
+        message = await context.bot.send_message(user_info.chat_id, "Time is up\n" + question.hint)
+        self.bot.message_cleaner.track(user_info.chat_id, message.id)
+
+        await self.nextQuestion(context, user_info)
+
+    async def quizTimedOut(self, user_id: int, questions: list) -> None:
+        if user_id not in self.bot.users:
+            return
+
+        context = self.deadlineContext(user_id)
+        user_info = self.bot.users[user_id]
+        if context.user_data.get("quiz_questions") is not questions:
+            return
+        logger.info("User %s ran out of time for quiz %s", user_info.first_name, context.user_data["quiz_name"])
+
+        # The questions left score nothing
+        context.user_data.pop("quiz_timer", None)
+        questions.clear()
+        if "current_question" in context.user_data:
+            self.recordAnswer(context.user_data, None, False)
+        message = await context.bot.send_message(user_info.chat_id, "Time is up")
+        self.bot.message_cleaner.track(user_info.chat_id, message.id)
+
+        await self.finishQuiz(context, user_info, True)
+
+    async def selectAfterQuiz(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        # A deadline finished the quiz and brought the menu back, the conversation still waits for an answer
+        if "quiz_questions" in context.user_data:
+            await self.bot.answerInline(update, context)
+            return None
+        return await self.bot.selectInline(update, context)
+
     async def printQuizResults(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         user = update.message.from_user
         logger.info("User %s getting all quizes results", user.first_name)
@@ -777,22 +1549,170 @@ class QuizHelper:
 
         results = self.bot.db_manager.getAllScores(user.id)
 
-        context.user_data["messages_to_remove"] = [update.message.id]
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
 
         if results:
-            resp = ""
-            for result in results:
-                resp += result[0] + ": " + result[1] + "\n"
             new_message = await context.bot.send_message(user_info.chat_id,
-                                                         resp,
+                                                         self.resultsText(results),
                                                          reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
                                                          resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
         else:
             new_message = await context.bot.send_message(user_info.chat_id,
                                                          "There are no finished quizzes",
                                                          reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]], 
                                                          resize_keyboard=True))
-            context.user_data["messages_to_remove"].append(new_message.id)
+            self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
+
+        context.user_data["reply_keyboard"] = True
+        return BotActions.DONE_ACTION
+
+    async def printInlineQuizResults(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.callback_query.from_user
+        logger.info("User %s getting all quizes results", user.first_name)
+        user_info = self.bot.users[user.id]
+
+        results = self.bot.db_manager.getAllScores(user.id)
+
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton("Back", callback_data=MENU_CALLBACK + nodeId(user_info.history))]])
+        await self.bot.editMenu(update, context, self.resultsText(results) if results else "There are no finished quizzes", markup)
+
+        return BotActions.MENU
+
+    def resultsText(self, results: list) -> str:
+        resp = ""
+        for result in results:
+            resp += result[0] + ": " + result[1] + "\n"
+        return resp
+
+class ArchiveHelper:
+    def __init__(self, bot: TelegramBot) -> None:
+        self.bot = bot
+        self.archive = ContentArchive(bot.navigator, bot.media_storage)
+
+    async def importStart(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s starting content import", user.first_name)
+
+        self.bot.clearPreviousMessages(update, context)
+        user_info = self.bot.users[user.id]
+
+        if not user_info.is_admin:
+            return await self.bot.updateMenu(update, context)
+
+        new_message = await context.bot.send_message(user_info.chat_id, "Upload zip archive with content",
+                                                     reply_markup=ReplyKeyboardRemove())
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
+
+        return BotActions.IMPORT_ARCHIVE
+
+    async def importArchive(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s importing content archive", user.first_name)
+
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
+        user_info = self.bot.users[user.id]
+
+        new_file = await update.message.document.get_file()
+        archive_data = await new_file.download_as_bytearray()
+
+        async def imported(result: tuple) -> str:
+            count, errors = result
+            if errors:
+                return "import failed:\n" + "\n".join(errors[:20])
+            self.bot.updateFilters()
+            return f"imported {count} items"
+
+        job_id = self.bot.jobs.submit(user_info.chat_id, "import", self.importJob,
+                                      self.bot.userSnapshot(user_info), bytes(archive_data), done=imported)
+
+        new_message = await context.bot.send_message(user_info.chat_id, f"Importing the archive as job #{job_id}",
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
+
+        return BotActions.DONE_ACTION
+
+    def importJob(self, job: Job, user_info: UserInfo, archive_data: bytes) -> tuple:
+        job.progress("unpacking")
+        items, errors = self.archive.unpack(archive_data)
+        if errors:
+            return 0, errors
+
+        job.progress(f"adding {len(items)} items")
+        if not self.bot.navigator.importContent(user_info, items):
+            return 0, ["items with the same names already exist here"]
+        return len(items), []
+
+    async def exportContent(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s exporting content", user.first_name)
+
+        self.bot.clearPreviousMessages(update, context)
+        user_info = self.bot.users[user.id]
+
+        if not user_info.is_admin:
+            return await self.bot.updateMenu(update, context)
+
+        items = await self.bot.media_storage.run(self.bot.navigator.exportContent, user_info)
+        archive_data = await self.bot.media_storage.run(self.archive.pack, items)
+        file_name = (user_info.history[-1] if user_info.history else "content") + ".zip"
+
+        new_message = await context.bot.send_document(user_info.chat_id, archive_data, filename=file_name,
+                                                      reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                      resize_keyboard=True),
+                                                      write_timeout=self.bot.config.http.media_write_timeout)
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
+
+        return BotActions.DONE_ACTION
+
+class BroadcastHelper:
+    def __init__(self, bot: TelegramBot) -> None:
+        self.bot = bot
+
+    async def broadcastStart(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s starting broadcast", user.first_name)
+
+        self.bot.clearPreviousMessages(update, context)
+        user_info = self.bot.users[user.id]
+
+        if not user_info.is_admin:
+            return await self.bot.updateMenu(update, context)
+
+        chats = await self.bot.jobs.run(self.bot.db_manager.countChats)
+        new_message = await context.bot.send_message(user_info.chat_id,
+                                                     f"Send a text, photo or video to broadcast to {chats} chats "
+                                                     "or \"Done\" to stop",
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
+
+        return BotActions.BROADCAST_MESSAGE
+
+    async def broadcastMessage(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user = update.message.from_user
+        logger.info("User %s broadcasting", user.first_name)
+
+        self.bot.message_cleaner.track(update.effective_chat.id, update.message.id)
+        user_info = self.bot.users[user.id]
+
+        if update.message.text == "Done":
+            return await self.bot.doneAction(update, context)
+
+        # Media is sent again by file_id, Telegram does not upload it once per chat
+        if update.message.photo:
+            media_type, file_id, text = "photo", update.message.photo[-1].file_id, update.message.caption or ""
+        elif update.message.video:
+            media_type, file_id, text = "video", update.message.video.file_id, update.message.caption or ""
+        else:
+            media_type, file_id, text = "", "", update.message.text
+
+        job_id = await self.bot.broadcaster.create(user_info.chat_id, text, media_type, file_id)
+
+        new_message = await context.bot.send_message(user_info.chat_id, f"Broadcast started as job #{job_id}",
+                                                     reply_markup=ReplyKeyboardMarkup([[KeyboardButton("Done")]],
+                                                     resize_keyboard=True))
+        self.bot.message_cleaner.track(update.effective_chat.id, new_message.id)
 
         return BotActions.DONE_ACTION
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import math
+
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+class Timer:
+    def __init__(self, tick: int, callback: Callable, args: tuple) -> None:
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        # The wheel slot holding the timer, None once it fired or was cancelled
+        self.slot = None
+
+class TimerWheel:
+    def __init__(self, tick: float = 0.1, slots: int = 1024) -> None:
+        self.tick = tick
+        # Timers land in the slot of the tick they are due, a slot holds every lap of the wheel
+        self.slots = [set() for _ in range(max(slots, 1))]
+        # Ticks expired so far, counted from the loop time the wheel started at
+        self.ticks = 0
+        self.started = None
+        self.scheduled = 0
+        self.worker = None
+        self.tasks = set()
+
+    def schedule(self, delay: float, callback: Callable, *args) -> Timer:
+        # Fires no earlier than the delay and at most one tick later, a coroutine callback runs as a task
+        now = self.ticks
+        if self.started is not None:
+            now = (asyncio.get_running_loop().time() - self.started) / self.tick
+        timer = Timer(max(math.ceil(now + delay / self.tick), self.ticks + 1), callback, args)
+        timer.slot = self.slots[timer.tick % len(self.slots)]
+        timer.slot.add(timer)
+        self.scheduled += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        if timer is not None and timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self.scheduled -= 1
+
+    def start(self) -> None:
+        if self.worker is None:
+            self.started = asyncio.get_running_loop().time() - self.ticks * self.tick
+            self.worker = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+            self.started = None
+
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # A late wakeup catches up on every tick it missed, in order
+            due = int((loop.time() - self.started) / self.tick)
+            while self.ticks < due:
+                self.ticks += 1
+                self.expire(self.ticks)
+
+            await asyncio.sleep(self.started + (self.ticks + 1) * self.tick - loop.time())
+
+    def expire(self, tick: int) -> None:
+        slot = self.slots[tick % len(self.slots)]
+        # Timers of later laps stay, a slot only holds the timers of its share of the wheel
+        for timer in [timer for timer in slot if timer.tick <= tick]:
+            self.cancel(timer)
+            self.fire(timer)
+
+    def fire(self, timer: Timer) -> None:
+        try:
+            result = timer.callback(*timer.args)
+        except Exception:
+            logger.exception("Timer callback failed")
+            return
+
+        if asyncio.iscoroutine(result):
+            task = asyncio.get_running_loop().create_task(result)
+            self.tasks.add(task)
+            task.add_done_callback(self.finished)
+
+    def finished(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Timer task failed", exc_info=task.exception())
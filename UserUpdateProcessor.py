@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+from typing import Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from BotConfig import FloodConfig
+from LogPipeline import update_bot, update_handler, update_user
+
+logger = logging.getLogger(__name__)
+
+# Full buckets are forgotten once this many users have one
+BUCKETS_PRUNE_SIZE = 10000
+
+# Kind of the update the current task handles, a handler coalesces only with newer updates of its kind
+update_kind = contextvars.ContextVar("update_kind", default=None)
+
+class UserWork:
+    # Stands in for an update when work of a user, like a quiz deadline, is processed like one
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+
+class UserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int, flood: FloodConfig = None, bot_name: str = "") -> None:
+        super().__init__(max_concurrent_updates)
+        self.flood = flood if flood is not None else FloodConfig()
+        self.bot_name = bot_name or None
+        self.locks = {}
+        self.waiters = {}
+        self.pending_texts = {}
+        # user: {update kind: queued or running updates}
+        self.pending_kinds = {}
+        # Texts and callback data of the updates that render the menu, set by the bot as its content changes
+        self.menu_patterns = []
+        self.buckets = {}
+        self.dropped = {"rate_limited": 0, "duplicate": 0, "coalesced": 0}
+
+    def updateKey(self, update: object) -> int:
+        if isinstance(update, UserWork):
+            return update.user_id
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    def updateText(self, update: object) -> str:
+        if not isinstance(update, Update):
+            return None
+        # An inline button tap is told apart by its data, its message is the menu for every button
+        if update.callback_query is not None:
+            return update.callback_query.data
+        if update.effective_message is not None:
+            return update.effective_message.text
+        return None
+
+    def updateKind(self, update: object, text: str) -> str:
+        if isinstance(update, Update) and update.inline_query is not None:
+            return "inline_query"
+        if text is not None and any(pattern.match(text) for pattern in self.menu_patterns):
+            return "menu"
+        return None
+
+    def setMenuPatterns(self, patterns: list) -> None:
+        # Compiled patterns, the item name ones are compiled once per content version
+        self.menu_patterns = patterns
+
+    def takeToken(self, key: int) -> bool:
+        if self.flood.rate <= 0:
+            return True
+
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.flood.burst, now))
+        tokens = min(self.flood.burst, tokens + (now - updated) * self.flood.rate)
+
+        allowed = tokens >= 1
+        self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+
+        if len(self.buckets) > BUCKETS_PRUNE_SIZE:
+            idle = self.flood.burst / self.flood.rate
+            self.buckets = {user: bucket for user, bucket in self.buckets.items() if now - bucket[1] < idle}
+
+        return allowed
+
+    def hasPending(self, key: int, kind: str) -> bool:
+        # Updates of other kinds, a photo or a quiz deadline, render nothing in place of this one
+        pending = self.pending_kinds.get(key, {}).get(kind, 0)
+        if update_kind.get() == kind:
+            pending -= 1
+        return pending > 0
+
+    def coalesce(self, key: int, kind: str = "menu") -> bool:
+        # A newer update of the same user and kind is queued, it will render the result instead
+        if self.flood.coalesce and self.hasPending(key, kind):
+            self.dropped["coalesced"] += 1
+            return True
+        return False
+
+    def drop(self, reason: str, coroutine: Awaitable) -> None:
+        self.dropped[reason] += 1
+        coroutine.close()
+
+    async def processForUser(self, key: int, coroutine: Awaitable) -> None:
+        # Work of a user that no update brought, like a quiz deadline, waits for the user's updates in flight
+        await self.process_update(UserWork(key), coroutine)
+
+    async def runLocked(self, key: int, text: str, coroutine: Awaitable, kind: str = None) -> None:
+        if key not in self.locks:
+            self.locks[key] = asyncio.Lock()
+            self.waiters[key] = 0
+            self.pending_texts[key] = {}
+            self.pending_kinds[key] = {}
+
+        lock = self.locks[key]
+        texts = self.pending_texts[key]
+        kinds = self.pending_kinds[key]
+        self.waiters[key] += 1
+        if text is not None:
+            texts[text] = texts.get(text, 0) + 1
+        if kind is not None:
+            kinds[kind] = kinds.get(kind, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            if text is not None:
+                texts[text] -= 1
+                if texts[text] == 0:
+                    del texts[text]
+            if kind is not None:
+                kinds[kind] -= 1
+
+            self.waiters[key] -= 1
+            if self.waiters[key] == 0:
+                del self.waiters[key]
+                del self.locks[key]
+                del self.pending_texts[key]
+                del self.pending_kinds[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        # Runs in a concurrency slot of the base class, drops are cheap so they happen in it too
+        key = self.updateKey(update)
+        # Every update runs in its own task, so this only tags records logged while handling it
+        update_user.set(key)
+        update_bot.set(self.bot_name)
+
+        if key is None:
+            await self.timed(coroutine)
+            return
+
+        text = self.updateText(update)
+        kind = self.updateKind(update, text)
+        update_kind.set(kind)
+
+        if isinstance(update, UserWork):
+            await self.runLocked(key, None, coroutine)
+            return
+
+        # Every keystroke sends an inline query, they aren't taps, the newest one is answered by coalescing
+        if kind != "inline_query":
+            # Floods are dropped here, before the update reaches any handler
+            if not self.takeToken(key):
+                self.drop("rate_limited", coroutine)
+                return
+
+            texts = self.pending_texts.get(key)
+            if self.flood.drop_duplicates and text is not None and texts and text in texts:
+                # The same button again before the first tap was answered
+                self.drop("duplicate", coroutine)
+                return
+
+        await self.runLocked(key, text, self.timed(coroutine), kind)
+
+    async def timed(self, coroutine: Awaitable) -> None:
+        # Handlers run in this task, the first one to take the update names itself here
+        update_handler.set(None)
+        started = time.perf_counter()
+        try:
+            await coroutine
+        finally:
+            logger.info("Update processed", extra={"event": "update",
+                                                   "handler": update_handler.get() or "unhandled",
+                                                   "latency_ms": round((time.perf_counter() - started) * 1000, 3)})
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
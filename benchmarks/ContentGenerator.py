@@ -0,0 +1,105 @@
+import json
+import os
+import random
+
+class ContentGenerator:
+    def __init__(
+            self,
+            depth: int = 3,
+            fanout: int = 4,
+            articles: int = 2,
+            quizzes: int = 1,
+            text_blocks: int = 2,
+            text_size: int = 500,
+            media_blocks: int = 1,
+            questions: int = 5,
+            answers: int = 4,
+            seed: int = 0
+            ) -> None:
+        self.depth = depth
+        self.fanout = fanout
+        self.articles = articles
+        self.quizzes = quizzes
+        self.text_blocks = text_blocks
+        self.text_size = text_size
+        self.media_blocks = media_blocks
+        self.questions = questions
+        self.answers = answers
+        self.random = random.Random(seed)
+        self.image_path = "media/bench/image.jpg"
+        self.video_path = "media/bench/video.mp4"
+
+    def generate(self) -> dict:
+        return {"content": self.generateLevel([], self.depth)}
+
+    def write(self, content_file: str) -> dict:
+        content = self.generate()
+
+        base_dir = os.path.dirname(content_file)
+        if base_dir:
+            os.makedirs(base_dir, exist_ok=True)
+
+        with open(content_file, "w", encoding="utf8") as data:
+            json.dump(content, data, ensure_ascii=False)
+
+        for path, size in ((self.image_path, 16 * 1024), (self.video_path, 256 * 1024)):
+            path = os.path.join(base_dir, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as media:
+                media.write(self.random.randbytes(size))
+
+        return content
+
+    def generateLevel(self, location: list, depth: int) -> list:
+        suffix = "_".join(str(idx) for idx in location)
+        items = []
+
+        if depth > 0:
+            for idx in range(self.fanout):
+                items.append({
+                    "type": "navigation",
+                    "name": f"Nav_{suffix}_{idx}" if suffix else f"Nav_{idx}",
+                    "content": self.generateLevel(location + [idx], depth - 1)
+                })
+
+        for idx in range(self.articles):
+            items.append({"type": "article", "name": f"Article_{suffix}_{idx}", "content": self.generateArticle()})
+
+        for idx in range(self.quizzes):
+            items.append({"type": "quiz", "name": f"Quiz_{suffix}_{idx}", "content": self.generateQuiz()})
+
+        return items
+
+    def generateText(self) -> str:
+        words = []
+        length = 0
+        while length < self.text_size:
+            word = "".join(self.random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(self.random.randint(2, 9)))
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)[:self.text_size]
+
+    def generateArticle(self) -> list:
+        blocks = [{"type": "text", "content": self.generateText()} for _ in range(self.text_blocks)]
+
+        for idx in range(self.media_blocks):
+            if idx % 2 == 0:
+                blocks.append({"type": "image", "content": self.image_path, "caption": f"Image {idx}"})
+            else:
+                blocks.append({"type": "video", "content": self.video_path, "caption": f"Video {idx}"})
+
+        return blocks
+
+    def generateQuiz(self) -> dict:
+        questions = []
+        for idx in range(self.questions):
+            correct = self.random.randrange(self.answers)
+            questions.append({
+                "name": f"Question {idx}",
+                "hint": "Hint",
+                "points": 1,
+                "answers": [{"text": f"Answer {answer}", "is_correct": "true" if answer == correct else "false"}
+                            for answer in range(self.answers)]
+            })
+
+        return {"total_score": self.questions, "questions": questions}
@@ -0,0 +1,240 @@
+import asyncio
+import itertools
+import json
+import math
+import time
+
+import tornado.httpserver
+import tornado.web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "load_test_bot"}
+SEND_METHODS = ("sendMessage", "sendPhoto", "sendVideo", "sendDocument")
+MEDIA_METHODS = ("sendPhoto", "sendVideo", "sendDocument")
+# Edits count against the same limits as new messages
+EDIT_METHODS = ("editMessageText",)
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class FakeBotApi:
+    def __init__(
+            self,
+            latency: float = 0.0,
+            global_rate: float = 30.0,
+            chat_rate: float = 1.0,
+            chat_burst: float = 5.0,
+            upload_latency: float = 0.0
+            ) -> None:
+        self.latency = latency
+        self.upload_latency = upload_latency
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate) if global_rate > 0 else None
+        self.chat_buckets = {}
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.updates = []
+        self.new_updates = asyncio.Event()
+        self.polling = asyncio.Event()
+        self.keyboards = {}
+        self.callbacks = {}
+        self.callback_ids = itertools.count(1)
+        self.files = {}
+        self.calls = {}
+        self.rate_limited = 0
+        self.server = None
+
+    def start(self, port: int, address: str = "127.0.0.1") -> None:
+        application = tornado.web.Application([
+            (r"/bot([^/]+)/(\w+)", ApiHandler, {"api": self}),
+            (r"/file/bot([^/]+)/(.+)", FileHandler, {"api": self})
+        ])
+        self.server = tornado.httpserver.HTTPServer(application)
+        self.server.listen(port, address)
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.stop()
+            # Wake up pending long polls so they answer before their connections are closed
+            self.new_updates.set()
+            await asyncio.sleep(0)
+            await self.server.close_all_connections()
+
+    def pushUpdate(self, chat_id: int, first_name: str, text: str) -> None:
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": first_name},
+            "text": text
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+
+        self.updates.append({"update_id": next(self.update_ids), "message": message})
+        self.new_updates.set()
+
+    def pushCallback(self, chat_id: int, first_name: str, data: str) -> None:
+        message_id, _ = self.callbacks.get(chat_id, (0, {}))
+        callback_query = {
+            "id": str(next(self.callback_ids)),
+            "from": {"id": chat_id, "is_bot": False, "first_name": first_name},
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "Select value"
+            }
+        }
+
+        self.updates.append({"update_id": next(self.update_ids), "callback_query": callback_query})
+        self.new_updates.set()
+
+    def callbackData(self, chat_id: int, label: str) -> str:
+        # Data of the inline button with this label on the newest inline keyboard, if any
+        return self.callbacks.get(chat_id, (0, {}))[1].get(label)
+
+    def keyboardQueue(self, chat_id: int) -> asyncio.Queue:
+        if chat_id not in self.keyboards:
+            self.keyboards[chat_id] = asyncio.Queue()
+        return self.keyboards[chat_id]
+
+    def rateLimit(self, chat_id: int) -> float:
+        retry_after = 0.0
+
+        if self.global_bucket is not None:
+            retry_after = self.global_bucket.take()
+
+        if self.chat_rate > 0 and retry_after == 0.0:
+            if chat_id not in self.chat_buckets:
+                self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            retry_after = self.chat_buckets[chat_id].take()
+
+        return retry_after
+
+    async def call(self, method: str, parameters: dict) -> tuple:
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.upload_latency and method in MEDIA_METHODS:
+            await asyncio.sleep(self.upload_latency)
+
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": await self.getUpdates(parameters)}
+
+        if method in SEND_METHODS or method in EDIT_METHODS:
+            chat_id = int(parameters.get("chat_id", 0))
+            retry_after = self.rateLimit(chat_id)
+            if retry_after > 0:
+                self.rate_limited += 1
+                seconds = math.ceil(retry_after)
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {seconds}",
+                             "parameters": {"retry_after": seconds}}
+            return 200, {"ok": True, "result": self.sendMessage(chat_id, parameters)}
+
+        if method == "getMe":
+            return 200, {"ok": True, "result": BOT_USER}
+
+        if method == "getFile":
+            file_id = parameters.get("file_id", "")
+            return 200, {"ok": True, "result": {"file_id": file_id, "file_unique_id": file_id,
+                                                "file_size": len(self.files.get(file_id, b"")),
+                                                "file_path": f"files/{file_id}"}}
+
+        return 200, {"ok": True, "result": True}
+
+    async def getUpdates(self, parameters: dict) -> list:
+        self.polling.set()
+
+        offset = int(parameters.get("offset", 0) or 0)
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+
+        if not self.updates:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), float(parameters.get("timeout", 0) or 0))
+            except asyncio.TimeoutError:
+                pass
+
+        limit = int(parameters.get("limit", 100) or 100)
+        return self.updates[:limit]
+
+    def sendMessage(self, chat_id: int, parameters: dict) -> dict:
+        message_id = int(parameters["message_id"]) if "message_id" in parameters else next(self.message_ids)
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER
+        }
+        if "text" in parameters:
+            message["text"] = parameters["text"]
+
+        reply_markup = parameters.get("reply_markup")
+        if isinstance(reply_markup, dict) and "keyboard" in reply_markup:
+            labels = [button["text"] if isinstance(button, dict) else button
+                      for row in reply_markup["keyboard"] for button in row]
+            self.callbacks.pop(chat_id, None)
+            self.keyboardQueue(chat_id).put_nowait(labels)
+        elif isinstance(reply_markup, dict) and "inline_keyboard" in reply_markup:
+            buttons = {button["text"]: button.get("callback_data") for row in reply_markup["inline_keyboard"] for button in row}
+            self.callbacks[chat_id] = (message_id, buttons)
+            self.keyboardQueue(chat_id).put_nowait(list(buttons))
+
+        return message
+
+class ApiHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotApi) -> None:
+        self.api = api
+
+    def parameters(self) -> dict:
+        if self.request.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(self.request.body or b"{}")
+
+        parameters = {}
+        for name, values in self.request.body_arguments.items():
+            value = values[-1].decode("utf-8")
+            try:
+                parameters[name] = json.loads(value)
+            except ValueError:
+                parameters[name] = value
+        for name, values in self.request.query_arguments.items():
+            parameters.setdefault(name, values[-1].decode("utf-8"))
+        return parameters
+
+    async def post(self, token: str, method: str) -> None:
+        status, payload = await self.api.call(method, self.parameters())
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(payload))
+
+    async def get(self, token: str, method: str) -> None:
+        await self.post(token, method)
+
+class FileHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotApi) -> None:
+        self.api = api
+
+    async def get(self, token: str, file_path: str) -> None:
+        self.api.calls["downloadFile"] = self.api.calls.get("downloadFile", 0) + 1
+        self.finish(self.api.files.get(file_path.rsplit("/", 1)[-1], b"\0" * 1024))
@@ -0,0 +1,63 @@
+import asyncio
+import itertools
+import json
+import time
+
+from typing import Tuple
+
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Benchmark", "username": "benchmark_bot"}
+
+class FakeRequest(BaseRequest):
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.message_ids = itertools.count(1000000)
+        self.calls = {}
+
+    @property
+    def read_timeout(self) -> float:
+        return 5.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(
+            self,
+            url: str,
+            method: str,
+            request_data: RequestData = None,
+            read_timeout: float = None,
+            write_timeout: float = None,
+            connect_timeout: float = None,
+            pool_timeout: float = None
+            ) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        parameters = request_data.parameters if request_data is not None else {}
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        return 200, json.dumps({"ok": True, "result": self.result(api_method, parameters)}).encode("utf-8")
+
+    def result(self, api_method: str, parameters: dict) -> object:
+        if api_method == "getMe":
+            return BOT_USER
+
+        if api_method.startswith("send"):
+            return {
+                "message_id": next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": parameters.get("chat_id"), "type": "private"},
+                "from": BOT_USER
+            }
+
+        if api_method == "getFile":
+            return {"file_id": parameters.get("file_id"), "file_unique_id": parameters.get("file_id"),
+                    "file_size": 0, "file_path": "benchmark/file"}
+
+        return True
@@ -0,0 +1,29 @@
+import argparse
+
+from benchmarks.ContentGenerator import ContentGenerator
+from benchmarks.navigator_benchmark import countNodes
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic bot_content.json")
+    parser.add_argument("output", help="content file to write, media is written next to it")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--articles", type=int, default=2, help="articles per navigation node")
+    parser.add_argument("--quizzes", type=int, default=1, help="quizzes per navigation node")
+    parser.add_argument("--text-blocks", type=int, default=2, help="text blocks per article")
+    parser.add_argument("--text-size", type=int, default=500, help="characters per text block")
+    parser.add_argument("--media-blocks", type=int, default=1, help="image and video blocks per article")
+    parser.add_argument("--questions", type=int, default=5, help="questions per quiz")
+    parser.add_argument("--answers", type=int, default=4, help="answers per question")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = ContentGenerator(depth=args.depth, fanout=args.fanout, articles=args.articles,
+                                 quizzes=args.quizzes, text_blocks=args.text_blocks, text_size=args.text_size,
+                                 media_blocks=args.media_blocks, questions=args.questions, answers=args.answers,
+                                 seed=args.seed)
+    content = generator.write(args.output)
+    print(f"Wrote {countNodes(content['content'])} nodes to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+from telegram import Update
+
+from BotConfig import BotConfig
+from TelegramBot import TelegramBot
+from post_update import makeUpdate
+from benchmarks.ContentGenerator import ContentGenerator
+from benchmarks.FakeRequest import FakeRequest
+
+SCENARIOS = ("navigation", "article", "quiz", "admin")
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+class HandlerBenchmark:
+    def __init__(
+            self,
+            generator: ContentGenerator,
+            users: int = 10,
+            rounds: int = 5,
+            latency: float = 0.0,
+            seed: int = 0
+            ) -> None:
+        self.generator = generator
+        self.users = users
+        self.rounds = rounds
+        self.request = FakeRequest(latency)
+        self.random = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.bot = None
+        self.content = []
+
+    async def setUp(self) -> None:
+        self.content = self.generator.write("bot_content.json")["content"]
+        config = BotConfig(content_file="bot_content.json", db_file="bot_info.db")
+        self.bot = TelegramBot("123456:BENCHMARK", config, self.request)
+
+        await self.bot.application.initialize()
+        await self.bot.postInit(self.bot.application)
+
+    async def tearDown(self) -> None:
+        await self.bot.postStop(self.bot.application)
+        await self.bot.application.shutdown()
+        await self.bot.postShutdown(self.bot.application)
+
+    def randomPath(self, kind: str) -> tuple:
+        # Walk down random navigation nodes until one has an item of the requested type
+        path = []
+        level = self.content
+        while True:
+            targets = [elem for elem in level if elem["type"] == kind]
+            children = [elem for elem in level if elem["type"] == "navigation"]
+            if targets and (not children or self.random.random() < 0.5):
+                return path, self.random.choice(targets)
+            if not children:
+                return path, None
+            child = self.random.choice(children)
+            path.append(child["name"])
+            level = child["content"]
+
+    def scenarioTexts(self, scenario: str, user_id: int) -> list:
+        if scenario == "navigation":
+            path, _ = self.randomPath("navigation")
+            return ["/start"] + path + ["Back"] * len(path)
+
+        # Every round walks back to the root, /start alone keeps the current location
+        if scenario == "article":
+            path, article = self.randomPath("article")
+            opened = [article["name"], "Done"] if article else []
+            return ["/start"] + path + opened + ["Back"] * len(path)
+
+        if scenario == "quiz":
+            path, quiz = self.randomPath("quiz")
+            answered = []
+            if quiz is not None:
+                answered = [quiz["name"]] + ["Answer 0"] * len(quiz["content"]["questions"]) + ["Done"]
+            return ["/start"] + path + answered + ["Back"] * len(path)
+
+        name = f"Bench_{user_id}_{next(self.update_ids)}"
+        return ["/start", "Add", "Navigation", name, "Done", "Delete", name, "Done"]
+
+    async def runUser(self, scenario: str, user_id: int, latencies: list) -> None:
+        application = self.bot.application
+
+        for _ in range(self.rounds):
+            for text in self.scenarioTexts(scenario, user_id):
+                update = Update.de_json(makeUpdate(next(self.update_ids), user_id, text), application.bot)
+
+                started = time.perf_counter()
+                await application.process_update(update)
+                latencies.append(time.perf_counter() - started)
+
+                if scenario == "admin" and text == "/start":
+                    self.bot.users[user_id].is_admin = True
+
+    async def runScenario(self, scenario: str, first_user: int) -> dict:
+        latencies = []
+
+        started = time.perf_counter()
+        await asyncio.gather(*(self.runUser(scenario, first_user + idx, latencies) for idx in range(self.users)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "scenario": scenario,
+            "updates": len(latencies),
+            "seconds": elapsed,
+            "updates_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000
+        }
+
+    async def run(self, scenarios: list) -> list:
+        await self.setUp()
+        try:
+            results = []
+            for idx, scenario in enumerate(scenarios):
+                results.append(await self.runScenario(scenario, (idx + 1) * 1000000))
+            return results
+        finally:
+            await self.tearDown()
+
+def printResults(results: list, api_calls: dict) -> None:
+    print(f"{'scenario':<12}{'updates':>10}{'upd/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(f"{result['scenario']:<12}{result['updates']:>10}{result['updates_per_second']:>12.1f}"
+              f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+    print("API calls: " + ", ".join(f"{name}={count}" for name, count in sorted(api_calls.items())))
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the bot handlers with a fake Bot API and measure them")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--articles", type=int, default=2)
+    parser.add_argument("--quizzes", type=int, default=1)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated Bot API latency in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default="", help="write results to this file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    generator = ContentGenerator(depth=args.depth, fanout=args.fanout, articles=args.articles,
+                                 quizzes=args.quizzes, questions=args.questions, seed=args.seed)
+    benchmark = HandlerBenchmark(generator, args.users, args.rounds, args.latency, args.seed)
+
+    json_file = os.path.abspath(args.json) if args.json else ""
+    with tempfile.TemporaryDirectory() as work_dir:
+        current_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            results = asyncio.run(benchmark.run(args.scenarios))
+        finally:
+            os.chdir(current_dir)
+
+    printResults(results, benchmark.request.calls)
+
+    if json_file:
+        with open(json_file, "w", encoding="utf8") as data:
+            json.dump({"results": results, "api_calls": benchmark.request.calls}, data, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.ContentGenerator import ContentGenerator
+from benchmarks.FakeBotApi import FakeBotApi
+from benchmarks.handler_benchmark import percentile
+
+BOT_TOKEN = "123456:LOADTEST"
+MAIN_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+# Buttons a regular user can see but which only lead out of the flow being measured
+SKIPPED_BUTTONS = ("Add", "Delete", "Quiz Results")
+
+class LoadTest:
+    def __init__(
+            self,
+            api: FakeBotApi,
+            users: int = 1000,
+            actions: int = 20,
+            think_time: float = 1.0,
+            ramp_up: float = 10.0,
+            reply_timeout: float = 10.0,
+            seed: int = 0,
+            inline: bool = False
+            ) -> None:
+        self.api = api
+        self.users = users
+        self.actions = actions
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.reply_timeout = reply_timeout
+        self.random = random.Random(seed)
+        self.inline = inline
+        self.latencies = []
+        self.timeouts = 0
+
+    async def send(self, chat_id: int, text: str) -> list:
+        keyboards = self.api.keyboardQueue(chat_id)
+        while not keyboards.empty():
+            keyboards.get_nowait()
+
+        callback_data = self.api.callbackData(chat_id, text) if self.inline else None
+
+        started = time.perf_counter()
+        if callback_data is not None:
+            self.api.pushCallback(chat_id, f"User{chat_id}", callback_data)
+        else:
+            self.api.pushUpdate(chat_id, f"User{chat_id}", text)
+        try:
+            labels = await asyncio.wait_for(keyboards.get(), self.reply_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return []
+
+        self.latencies.append(time.perf_counter() - started)
+        return labels
+
+    async def runUser(self, chat_id: int) -> None:
+        await asyncio.sleep(self.random.uniform(0, self.ramp_up))
+
+        labels = await self.send(chat_id, "/start")
+        for _ in range(self.actions):
+            await asyncio.sleep(self.random.expovariate(1 / self.think_time) if self.think_time > 0 else 0)
+
+            choices = [label for label in labels if label not in SKIPPED_BUTTONS]
+            labels = await self.send(chat_id, self.random.choice(choices) if choices else "/start")
+
+    async def run(self) -> dict:
+        started = time.perf_counter()
+        await asyncio.gather(*(self.runUser(1000000 + idx) for idx in range(self.users)))
+        elapsed = time.perf_counter() - started
+
+        self.latencies.sort()
+        return {
+            "users": self.users,
+            "actions": len(self.latencies) + self.timeouts,
+            "timeouts": self.timeouts,
+            "seconds": elapsed,
+            "actions_per_second": len(self.latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(self.latencies, 0.50) * 1000,
+            "p95_ms": percentile(self.latencies, 0.95) * 1000,
+            "p99_ms": percentile(self.latencies, 0.99) * 1000,
+            "rate_limited": self.api.rate_limited,
+            "api_calls": dict(sorted(self.api.calls.items()))
+        }
+
+def startBot(
+        work_dir: str,
+        port: int,
+        workers: int,
+        inline: bool = False,
+        pool_size: int = 0,
+        verbose: bool = False
+        ) -> subprocess.Popen:
+    environment = dict(os.environ,
+                       BOT_TOKEN=BOT_TOKEN,
+                       BOT_API_URL=f"http://127.0.0.1:{port}/bot",
+                       BOT_API_FILE_URL=f"http://127.0.0.1:{port}/file/bot")
+
+    # main.py is imported rather than run so the worker count can be overridden without editing it
+    code = (f"import sys; sys.path.insert(0, {os.path.dirname(MAIN_FILE)!r}); import main; "
+            f"main.CONFIG.workers = {workers}; "
+            f"main.CONFIG.keyboard = main.KeyboardMode.{'INLINE' if inline else 'REPLY'}; "
+            f"main.CONFIG.http.connection_pool_size = {pool_size or 'main.CONFIG.http.connection_pool_size'}; "
+            f"main.main()")
+    output = None if verbose else subprocess.DEVNULL
+    return subprocess.Popen([sys.executable, "-c", code], cwd=work_dir, env=environment, stdout=output, stderr=output)
+
+def stopBot(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+async def runLoadTest(args, work_dir: str) -> dict:
+    api = FakeBotApi(args.latency, args.global_rate, args.chat_rate, args.chat_burst, args.upload_latency)
+    api.start(args.port)
+
+    process = startBot(work_dir, args.port, args.workers, args.inline, args.pool_size, args.verbose)
+    try:
+        await asyncio.wait_for(api.polling.wait(), args.startup_timeout)
+        load_test = LoadTest(api, args.users, args.actions, args.think_time, args.ramp_up,
+                             args.reply_timeout, args.seed, args.inline)
+        return await load_test.run()
+    finally:
+        await asyncio.get_running_loop().run_in_executor(None, stopBot, process)
+        await api.stop()
+
+def printResults(results: dict) -> None:
+    print(f"users={results['users']} actions={results['actions']} timeouts={results['timeouts']} "
+          f"seconds={results['seconds']:.1f} actions/s={results['actions_per_second']:.1f}")
+    print(f"reply latency p50={results['p50_ms']:.1f}ms p95={results['p95_ms']:.1f}ms p99={results['p99_ms']:.1f}ms")
+    print(f"429 responses: {results['rate_limited']}")
+    if results["rate_limited"] and results["timeouts"]:
+        # Flood waits longer than http.max_flood_wait are not retried, those replies never arrive
+        print(f"warning: {results['timeouts']} replies timed out while the API answered with 429s, "
+              "the timeouts measure the rate limits rather than the bot", file=sys.stderr)
+    print("API calls: " + ", ".join(f"{name}={count}" for name, count in results["api_calls"].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run main.py against a local fake Bot API and simulate users")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--actions", type=int, default=20, help="button presses per user")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean pause between presses in seconds")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="seconds over which users join")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--workers", type=int, default=1, help="bot worker processes")
+    parser.add_argument("--inline", action="store_true", help="run the bot with inline keyboard menus")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake Bot API latency in seconds")
+    parser.add_argument("--upload-latency", type=float, default=0.0, help="extra latency of media sends in seconds")
+    parser.add_argument("--pool-size", type=int, default=0, help="bot connection pool size, 0 keeps the config")
+    parser.add_argument("--global-rate", type=float, default=30.0, help="messages per second, 0 disables")
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="messages per second per chat, 0 disables")
+    parser.add_argument("--chat-burst", type=float, default=5.0)
+    parser.add_argument("--content", default="", help="content file to serve instead of a generated tree")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default="", help="write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the bot output")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # Every 429 is already counted, logging each one only slows the server down
+    logging.getLogger("tornado.access").setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "db"))
+        content_file = os.path.join(work_dir, "bot_content.json")
+
+        if args.content:
+            with open(args.content, "r", encoding="utf8") as source, open(content_file, "w", encoding="utf8") as data:
+                data.write(source.read())
+        else:
+            ContentGenerator(depth=args.depth, fanout=args.fanout, questions=args.questions,
+                             seed=args.seed).write(content_file)
+
+        results = asyncio.run(runLoadTest(args, work_dir))
+
+    printResults(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as data:
+            json.dump(results, data, indent=4)
+
+if __name__ == '__main__':
+    main()
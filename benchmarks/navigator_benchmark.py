@@ -0,0 +1,236 @@
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from telegram import Bot, Update
+from telegram.ext import filters
+
+from ArticleContent import ArticleContent, ArticleContentType
+from ContentNavigator import ContentNavigator, nodeId
+from UserInfo import UserInfo
+from post_update import makeUpdate
+from benchmarks.ContentGenerator import ContentGenerator
+
+QUIZ_FILE = json.dumps({
+    "total_score": 1,
+    "questions": [{"name": "Question", "hint": "Hint", "points": 1,
+                   "answers": [{"text": "Yes", "is_correct": "true"}, {"text": "No", "is_correct": "false"}]}]
+})
+
+def countNodes(items: list) -> int:
+    count = 0
+    for elem in items:
+        count += 1
+        if elem["type"] == "navigation":
+            count += countNodes(elem["content"])
+    return count
+
+class NavigatorBenchmark:
+    def __init__(self, generator: ContentGenerator, repeat: int = 20, seed: int = 0) -> None:
+        self.generator = generator
+        self.repeat = repeat
+        self.random = random.Random(seed)
+        self.content = []
+        self.navigator = None
+
+    def measure(self, operation, repeat: int = 0) -> dict:
+        timings = []
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            operation()
+            timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        return {
+            "runs": len(timings),
+            "mean_ms": sum(timings) / len(timings) * 1000,
+            "min_ms": timings[0] * 1000,
+            "p50_ms": timings[len(timings) // 2] * 1000,
+            "max_ms": timings[-1] * 1000
+        }
+
+    def deepestPath(self, kind: str) -> tuple:
+        path = []
+        level = self.content
+        while True:
+            children = [elem for elem in level if elem["type"] == "navigation"]
+            targets = [elem["name"] for elem in level if elem["type"] == kind]
+            if not children:
+                return path, targets[0] if targets else ""
+            child = self.random.choice(children)
+            path.append(child["name"])
+            level = child["content"]
+
+    def userAt(self, path: list) -> UserInfo:
+        user_info = UserInfo("Benchmark", 1, 1)
+        user_info.history = list(path)
+        return user_info
+
+    def run(self) -> dict:
+        self.content = self.generator.write("bot_content.json")["content"]
+
+        results = {"nodes": countNodes(self.content), "file_bytes": os.path.getsize("bot_content.json")}
+        operations = results["operations"] = {}
+
+        started = time.perf_counter()
+        self.navigator = ContentNavigator("bot_content.json")
+        operations["init"] = {"runs": 1, "mean_ms": (time.perf_counter() - started) * 1000}
+
+        operations["updateContent"] = self.measure(self.navigator.updateContent, max(1, self.repeat // 4))
+
+        article_path, article = self.deepestPath("article")
+        quiz_path, quiz = self.deepestPath("quiz")
+        nav_path, _ = self.deepestPath("navigation")
+
+        operations["moveTo"] = self.measure(lambda: self.navigator.moveTo(self.userAt(nav_path[:-1]), nav_path[-1]))
+        operations["moveTo_back"] = self.measure(lambda: self.navigator.moveTo(self.userAt(nav_path), "Back"))
+        operations["getArticle"] = self.measure(lambda: self.navigator.getArticle(self.userAt(article_path), article))
+        operations["getArticlePages"] = self.measure(lambda: self.navigator.getArticlePages(nodeId(article_path + [article])))
+        operations["getQuiz"] = self.measure(lambda: self.navigator.getQuiz(self.userAt(quiz_path), quiz))
+
+        version = self.navigator.version
+        patterns = (version.navigation_filter, version.article_filter, version.quiz_filter)
+
+        def buildFilters() -> None:
+            re.purge()
+            for pattern in patterns:
+                filters.Regex(pattern)
+
+        operations["filters_build"] = self.measure(buildFilters)
+
+        bot = Bot("123456:BENCHMARK")
+        regex_filters = [filters.Regex(pattern) for pattern in patterns]
+        updates = [Update.de_json(makeUpdate(idx, 1, text), bot) for idx, text in enumerate([nav_path[-1], article, quiz, "No match"])]
+
+        def matchFilters() -> None:
+            for update in updates:
+                for regex_filter in regex_filters:
+                    regex_filter.check_update(update)
+
+        operations["filters_match"] = self.measure(matchFilters)
+
+        self.measureEdits(operations, article_path)
+
+        self.navigator.media_storage.shutdown()
+        return results
+
+    def measureEdits(self, operations: dict, path: list) -> None:
+        user_info = self.userAt(path)
+        repeat = max(1, self.repeat // 4)
+        names = iter(range(10 ** 9))
+        created = []
+
+        def addItem(method, *args) -> None:
+            name = f"Bench_{next(names)}"
+            created.append(name)
+            method(user_info, name, *args)
+
+        def removeItem() -> None:
+            self.navigator.removeItem(user_info, created.pop())
+
+        operations["addNavigation"] = self.measure(lambda: addItem(self.navigator.addNavigation), repeat)
+        operations["removeItem"] = self.measure(removeItem, repeat)
+
+        operations["addArticle"] = self.measure(lambda: addItem(self.navigator.addArticle), repeat)
+        text = ArticleContent(ArticleContentType.TEXT, "Benchmark text")
+        operations["appendArticleContent"] = self.measure(
+            lambda: self.navigator.appendArticleContent(user_info, created[-1], text), repeat)
+
+        operations["addQuiz"] = self.measure(lambda: addItem(self.navigator.addQuiz, QUIZ_FILE), repeat)
+
+        while created:
+            removeItem()
+
+def parseTree(value: str) -> tuple:
+    depth, fanout = value.lower().split("x")
+    return int(depth), int(fanout)
+
+def compareResults(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+
+    for tree, tree_results in results["trees"].items():
+        if tree not in baseline.get("trees", {}):
+            continue
+
+        baseline_operations = baseline["trees"][tree]["operations"]
+        print(f"\n{tree} ({tree_results['nodes']} nodes) vs baseline")
+        print(f"{'operation':<24}{'baseline ms':>14}{'current ms':>14}{'ratio':>8}")
+
+        for name, current in tree_results["operations"].items():
+            if name not in baseline_operations:
+                continue
+            before = baseline_operations[name]["mean_ms"]
+            ratio = current["mean_ms"] / before if before else 0.0
+            marker = ""
+            if ratio > threshold:
+                marker = "  REGRESSION"
+                regressions.append(f"{tree}:{name}")
+            print(f"{name:<24}{before:>14.3f}{current['mean_ms']:>14.3f}{ratio:>8.2f}{marker}")
+
+    return regressions
+
+def printResults(results: dict) -> None:
+    for tree, tree_results in results["trees"].items():
+        print(f"\n{tree}: {tree_results['nodes']} nodes, {tree_results['file_bytes']} bytes")
+        print(f"{'operation':<24}{'mean ms':>12}{'p50 ms':>12}{'max ms':>12}")
+        for name, result in tree_results["operations"].items():
+            print(f"{name:<24}{result['mean_ms']:>12.3f}{result.get('p50_ms', result['mean_ms']):>12.3f}"
+                  f"{result.get('max_ms', result['mean_ms']):>12.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for ContentNavigator on synthetic trees")
+    parser.add_argument("--trees", nargs="+", default=["2x4", "3x10", "4x10"],
+                        help="tree shapes as DEPTHxFANOUT")
+    parser.add_argument("--articles", type=int, default=2)
+    parser.add_argument("--quizzes", type=int, default=1)
+    parser.add_argument("--text-blocks", type=int, default=2)
+    parser.add_argument("--text-size", type=int, default=500)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default="", help="write results to this file")
+    parser.add_argument("--baseline", default="", help="compare against results saved with --json")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio reported as a regression")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    json_file = os.path.abspath(args.json) if args.json else ""
+    baseline_file = os.path.abspath(args.baseline) if args.baseline else ""
+    results = {"trees": {}}
+
+    current_dir = os.getcwd()
+    for tree in args.trees:
+        depth, fanout = parseTree(tree)
+        generator = ContentGenerator(depth=depth, fanout=fanout, articles=args.articles, quizzes=args.quizzes,
+                                     text_blocks=args.text_blocks, text_size=args.text_size,
+                                     questions=args.questions, seed=args.seed)
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+            try:
+                results["trees"][tree] = NavigatorBenchmark(generator, args.repeat, args.seed).run()
+            finally:
+                os.chdir(current_dir)
+
+    printResults(results)
+
+    if json_file:
+        with open(json_file, "w", encoding="utf8") as data:
+            json.dump(results, data, indent=4)
+
+    if baseline_file:
+        with open(baseline_file, "r", encoding="utf8") as data:
+            regressions = compareResults(results, json.load(data), args.threshold)
+        if regressions:
+            print("\nRegressions: " + ", ".join(regressions))
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,52 @@
+import os
+
+from BotConfig import BotConfig, KeyboardMode, LoggingConfig, MetricsConfig, RunMode, WebhookConfig, loadFleetConfig
+from BotFleet import BotFleet
+from ShardedRunner import ShardedRunner
 from TelegramBot import TelegramBot
 
-TOKEN=""
+TOKEN = os.environ.get("BOT_TOKEN", "")
+# A JSON file listing several bots to host in this process, see loadFleetConfig
+FLEET_FILE = os.environ.get("BOT_FLEET_FILE", "")
+
+CONFIG = BotConfig(
+    mode=RunMode.POLLING,
+    webhook=WebhookConfig(
+        listen="0.0.0.0",
+        port=8443,
+        url_path="telegram",
+        webhook_url="",
+        secret_token="",
+        max_connections=40
+    ),
+    keyboard=KeyboardMode.REPLY,
+    concurrent_updates=64,
+    workers=1,
+    base_url=os.environ.get("BOT_API_URL", ""),
+    base_file_url=os.environ.get("BOT_API_FILE_URL", ""),
+    metrics=MetricsConfig(
+        enabled=False,
+        listen="127.0.0.1",
+        port=9100
+    ),
+    logging=LoggingConfig(
+        level="INFO",
+        json=False,
+        sampling={"update": 0.01},
+        default_rate=1.0
+    )
+)
 
 def main():
-    bot = TelegramBot(TOKEN)
+    if FLEET_FILE:
+        BotFleet(loadFleetConfig(FLEET_FILE)).run()
+        return
+
+    if CONFIG.workers > 1:
+        ShardedRunner(TOKEN, CONFIG).run()
+        return
+
+    bot = TelegramBot(TOKEN, CONFIG)
     bot.run()
 
 if __name__ == '__main__':
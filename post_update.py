@@ -0,0 +1,45 @@
+import json
+import sys
+import time
+import urllib.request
+
+URL = "http://127.0.0.1:8443/telegram"
+SECRET_TOKEN = ""
+
+def makeUpdate(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+        "text": text
+    }
+
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+
+    return {"update_id": update_id, "message": message}
+
+def postUpdate(url: str, secret_token: str, update: dict) -> int:
+    request = urllib.request.Request(url, data=json.dumps(update).encode("utf-8"), method="POST")
+    request.add_header("Content-Type", "application/json")
+    if secret_token:
+        request.add_header("X-Telegram-Bot-Api-Secret-Token", secret_token)
+
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: post_update.py <user_id> <text> [<text> ...]")
+        return
+
+    user_id = int(sys.argv[1])
+    update_id = int(time.time())
+
+    for idx, text in enumerate(sys.argv[2:]):
+        status = postUpdate(URL, SECRET_TOKEN, makeUpdate(update_id + idx, user_id, text))
+        print(f"{text}: {status}")
+
+if __name__ == '__main__':
+    main()
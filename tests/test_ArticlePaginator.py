@@ -0,0 +1,35 @@
+from ArticleContent import ArticleContent, ArticleContentType
+from ArticlePaginator import ArticlePaginator, utf16Length
+
+def test_utf16_length_counts_astral_characters_twice():
+    assert utf16Length("abc") == 3
+    assert utf16Length("a\U0001F600") == 3
+
+def test_split_never_exceeds_the_utf16_limit():
+    paginator = ArticlePaginator(text_limit=10)
+    text = "\U0001F600" * 12
+
+    chunks = paginator.splitText(text, 10)
+
+    assert "".join(chunks) == text
+    assert [utf16Length(chunk) for chunk in chunks] == [10, 10, 4]
+
+def test_split_prefers_paragraphs_then_lines_then_words():
+    paginator = ArticlePaginator()
+
+    assert paginator.splitText("aaaa bbbb\n\ncccc", 12) == ["aaaa bbbb", "cccc"]
+    assert paginator.splitText("aaaa\nbbbb cccc", 12) == ["aaaa", "bbbb cccc"]
+    assert paginator.splitText("aaaa bbbb cccc", 12) == ["aaaa bbbb", "cccc"]
+
+def test_long_caption_goes_on_as_text():
+    paginator = ArticlePaginator(text_limit=20, caption_limit=8)
+    blocks = [ArticleContent(ArticleContentType.TEXT, "intro"),
+              ArticleContent(ArticleContentType.IMAGE, "images/a.png", "\U0001F600\U0001F600 caption text")]
+
+    pages = paginator.paginate(blocks)
+
+    assert [(page.type, page.content, page.caption) for page in pages] == [
+        (ArticleContentType.TEXT, "intro", ""),
+        (ArticleContentType.IMAGE, "images/a.png", "\U0001F600\U0001F600"),
+        (ArticleContentType.TEXT, "caption text", "")
+    ]
@@ -0,0 +1,51 @@
+import asyncio
+import os
+
+from BotConfig import BroadcastConfig
+from Broadcaster import Broadcast, Broadcaster
+from DBManager import DBManager
+
+class FakeJob:
+    def progress(self, text: str) -> None:
+        pass
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.sent = []
+        self.on_send = None
+
+    async def send_message(self, chat_id: int, text: str, api_kwargs: dict = None) -> None:
+        self.sent.append(chat_id)
+        if self.on_send is not None:
+            self.on_send(chat_id)
+
+def makeBroadcaster(db_manager: DBManager, bot: FakeBot) -> Broadcaster:
+    broadcaster = Broadcaster(db_manager, None, BroadcastConfig(rate=10000, concurrency=1, page_size=2))
+    broadcaster.bot = bot
+    return broadcaster
+
+def test_stopped_broadcast_resumes_after_its_checkpoint(tmp_path):
+    db_manager = DBManager(os.path.join(tmp_path, "bot.db"))
+    db_manager.initDB()
+    for chat_id in (-100, 1, 2, 3, 4):
+        db_manager.addChat(chat_id, abs(chat_id), "User")
+    broadcast_id = db_manager.addBroadcast(7, "hello", "", "")
+
+    first_bot = FakeBot()
+    first = makeBroadcaster(db_manager, first_bot)
+    # A restart while the second chat is sent, the rest of the page is left
+    first_bot.on_send = lambda chat_id: first.stop() if chat_id == 1 else None
+    broadcast = asyncio.run(first.run(FakeJob(), Broadcast(broadcast_id, 7, "hello")))
+
+    assert first_bot.sent == [-100, 1]
+    assert not broadcast.finished
+    assert db_manager.getUnfinishedBroadcasts() == [(broadcast_id, 7, "hello", "", "", 1, 2, 0, 0)]
+
+    second_bot = FakeBot()
+    second = makeBroadcaster(db_manager, second_bot)
+    broadcast = asyncio.run(second.run(FakeJob(), Broadcast(*db_manager.getUnfinishedBroadcasts()[0])))
+
+    assert second_bot.sent == [2, 3, 4]
+    assert broadcast.finished
+    assert broadcast.sent == 5
+    assert db_manager.getUnfinishedBroadcasts() == []
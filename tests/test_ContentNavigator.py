@@ -0,0 +1,75 @@
+import json
+import os
+
+from ContentNavigator import ContentNavigator
+from ContentVersion import ContentVersion
+from MediaStorage import MediaStorage
+from UserInfo import UserInfo
+
+CONTENT = {
+    "content": [
+        {"type": "navigation", "name": "Topics", "content": [
+            {"type": "article", "name": "Intro", "content": [
+                {"type": "text", "content": "Hello"},
+                {"type": "image", "content": "images/a.png", "caption": ""}
+            ]}
+        ]}
+    ]
+}
+
+def makeNavigator(tmp_path) -> ContentNavigator:
+    content_file = os.path.join(tmp_path, "bot_content.json")
+    with open(content_file, "w", encoding="utf8") as data:
+        json.dump(CONTENT, data)
+    return ContentNavigator(content_file, MediaStorage(os.path.join(tmp_path, "media")))
+
+def test_edit_publishes_a_new_version_and_keeps_the_old_one(tmp_path):
+    navigator = makeNavigator(tmp_path)
+    old_version = navigator.version
+    topics = old_version.content["Topics"]
+
+    assert navigator.addNavigation(UserInfo("Admin"), "News")
+
+    version = navigator.version
+    assert version.number == old_version.number + 1
+    # Untouched items are shared, the published version is never changed
+    assert version.content["Topics"] is topics
+    assert "News" not in old_version.content
+    assert version.names["navigation"] == {"Topics": 1, "News": 1}
+    assert old_version.names["navigation"] == {"Topics": 1}
+    assert version.navigation_pattern.match("News")
+    assert not old_version.navigation_pattern.match("News")
+
+def test_derive_copies_the_indexes():
+    version = ContentVersion(3, {"A": object()}, {"n": (["A"], None)}, {"n": []}, None, {"images/a.png": 1})
+
+    derived = version.derive()
+    derived.countName("article", "B", 1)
+    derived.countReference("images/a.png", -1)
+    derived.nodes["m"] = (["B"], None)
+
+    assert derived.number == 4
+    assert derived.content is version.content
+    assert version.names["article"] == {}
+    assert version.references == {"images/a.png": 1}
+    assert derived.references == {}
+    assert "m" not in version.nodes
+
+def test_undo_restores_the_previous_version_and_file(tmp_path):
+    navigator = makeNavigator(tmp_path)
+    with open(navigator.content_file, "r", encoding="utf8") as data:
+        original = json.load(data)
+    user_info = UserInfo("Admin")
+    user_info.history = ["Topics"]
+
+    assert navigator.removeItem(user_info, "Intro")
+    assert navigator.version.references == {}
+
+    assert navigator.undoEdit() == navigator.version.number
+    assert "Intro" in navigator.version.content["Topics"].content
+    assert navigator.version.references == {"images/a.png": 1}
+    with open(navigator.content_file, "r", encoding="utf8") as data:
+        assert json.load(data) == original
+
+    # Nothing left to undo
+    assert navigator.undoEdit() == 0
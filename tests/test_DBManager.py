@@ -0,0 +1,55 @@
+import datetime
+import os
+
+from DBManager import DBManager, attemptPartition, partitionEnd
+
+DAY = 86400
+
+def timestamp(year: int, month: int, day: int) -> float:
+    return datetime.datetime(year, month, day, 12, tzinfo=datetime.timezone.utc).timestamp()
+
+def attempt(finished_at: float, user_id: int, score: float, timed_out: int = 0) -> tuple:
+    return (finished_at, user_id, "Quiz", finished_at - 60, score, 10.0, timed_out, "[]")
+
+def makeDB(tmp_path) -> DBManager:
+    db_manager = DBManager(os.path.join(tmp_path, "bot.db"))
+    db_manager.initDB()
+    return db_manager
+
+def test_partitions_start_on_a_multiple_of_their_length():
+    assert attemptPartition(timestamp(1970, 1, 1), 30) == "quiz_attempts_19700101"
+    assert attemptPartition(timestamp(1970, 1, 30), 30) == "quiz_attempts_19700101"
+    assert attemptPartition(timestamp(1970, 1, 31), 30) == "quiz_attempts_19700131"
+    assert attemptPartition(timestamp(2024, 3, 5), 1) == "quiz_attempts_20240305"
+
+def test_partition_end_is_the_next_partition_start():
+    table = attemptPartition(timestamp(2024, 3, 5), 30)
+    end = partitionEnd(table, 30)
+
+    assert attemptPartition(end - 1, 30) == table
+    assert attemptPartition(end, 30) != table
+    assert partitionEnd(attemptPartition(end, 30), 30) == end + 30 * DAY
+
+def test_compaction_folds_old_partitions_into_summaries(tmp_path):
+    db_manager = makeDB(tmp_path)
+    old, recent = timestamp(2024, 1, 2), timestamp(2024, 3, 5)
+    db_manager.addAttempts([attempt(old, 1, 4.0), attempt(old + 60, 1, 8.0, 1), attempt(recent, 1, 6.0)], 1)
+    assert len(db_manager.getAttemptPartitions()) == 2
+
+    assert db_manager.compactAttempts(recent - DAY, 1) == 1
+
+    assert db_manager.getAttemptPartitions() == [attemptPartition(recent, 1)]
+    assert db_manager.getAttemptSummary(1, "Quiz") == (2, 1, 8.0, 12.0, old, old + 60)
+    assert [row[2] for row in db_manager.getAttempts(1, "Quiz")] == [6.0]
+
+def test_compaction_adds_to_existing_summaries(tmp_path):
+    db_manager = makeDB(tmp_path)
+    first, second = timestamp(2024, 1, 2), timestamp(2024, 1, 3)
+    db_manager.addAttempts([attempt(first, 1, 9.0)], 1)
+    db_manager.compactAttempts(second, 1)
+    db_manager.addAttempts([attempt(second, 1, 3.0, 1)], 1)
+
+    assert db_manager.compactAttempts(second + DAY, 1) == 1
+
+    assert db_manager.getAttemptPartitions() == []
+    assert db_manager.getAttemptSummary(1, "Quiz") == (2, 1, 9.0, 12.0, first, second)
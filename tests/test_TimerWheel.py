@@ -0,0 +1,48 @@
+import asyncio
+
+from TimerWheel import TimerWheel
+
+def test_timers_expire_on_their_tick_and_not_before():
+    wheel = TimerWheel(tick=1.0, slots=4)
+    fired = []
+    wheel.schedule(1.0, fired.append, "first")
+    wheel.schedule(2.5, fired.append, "second")
+    # Lands in the same slot as the first one, a lap later
+    wheel.schedule(5.0, fired.append, "next lap")
+
+    for tick, expected in ((1, ["first"]), (2, ["first"]), (3, ["first", "second"]),
+                           (4, ["first", "second"]), (5, ["first", "second", "next lap"])):
+        wheel.ticks = tick
+        wheel.expire(tick)
+        assert fired == expected
+
+    assert wheel.scheduled == 0
+
+def test_cancelled_timers_never_fire():
+    wheel = TimerWheel(tick=1.0, slots=4)
+    fired = []
+    timer = wheel.schedule(1.0, fired.append, "cancelled")
+    wheel.cancel(timer)
+    wheel.cancel(timer)
+
+    wheel.expire(1)
+
+    assert fired == []
+    assert wheel.scheduled == 0
+
+def test_running_wheel_runs_coroutine_callbacks():
+    async def run() -> list:
+        wheel = TimerWheel(tick=0.01, slots=8)
+        fired = []
+
+        async def callback(name: str) -> None:
+            fired.append(name)
+
+        wheel.start()
+        wheel.schedule(0.05, callback, "late")
+        wheel.schedule(0.01, callback, "early")
+        await asyncio.sleep(0.2)
+        await wheel.stop()
+        return fired
+
+    assert asyncio.run(run()) == ["early", "late"]
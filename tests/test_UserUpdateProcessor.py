@@ -0,0 +1,74 @@
+import asyncio
+import re
+
+from telegram import Update
+
+from BotConfig import FloodConfig
+from UserUpdateProcessor import UserUpdateProcessor
+from post_update import makeUpdate
+
+def message(update_id: int, user_id: int, text: str) -> Update:
+    return Update.de_json(makeUpdate(update_id, user_id, text), None)
+
+async def handle(handled: list, name: str, release: asyncio.Event = None) -> None:
+    if release is not None:
+        await release.wait()
+    handled.append(name)
+
+def test_tap_repeated_while_the_first_one_runs_is_dropped():
+    async def run() -> tuple:
+        processor = UserUpdateProcessor(8, FloodConfig(rate=0))
+        handled = []
+        release = asyncio.Event()
+
+        first = asyncio.create_task(processor.process_update(message(1, 5, "Topics"), handle(handled, "first", release)))
+        await asyncio.sleep(0)
+        await processor.process_update(message(2, 5, "Topics"), handle(handled, "again"))
+        # Another user's tap of the same button is no duplicate
+        await processor.process_update(message(3, 6, "Topics"), handle(handled, "other user"))
+        release.set()
+        await first
+        # Answered, so the same button works again
+        await processor.process_update(message(4, 5, "Topics"), handle(handled, "later"))
+        return handled, processor.dropped
+
+    handled, dropped = asyncio.run(run())
+
+    assert handled == ["other user", "first", "later"]
+    assert dropped == {"rate_limited": 0, "duplicate": 1, "coalesced": 0}
+
+def test_updates_over_the_flood_limit_are_dropped():
+    async def run() -> tuple:
+        processor = UserUpdateProcessor(8, FloodConfig(rate=0.001, burst=3))
+        handled = []
+        for idx in range(5):
+            await processor.process_update(message(idx, 5, f"Item{idx}"), handle(handled, f"Item{idx}"))
+        await processor.process_update(message(9, 6, "Item0"), handle(handled, "other user"))
+        return handled, processor.dropped
+
+    handled, dropped = asyncio.run(run())
+
+    assert handled == ["Item0", "Item1", "Item2", "other user"]
+    assert dropped["rate_limited"] == 2
+
+def test_menu_update_coalesces_with_a_newer_one():
+    async def run() -> list:
+        processor = UserUpdateProcessor(8, FloodConfig(rate=0))
+        processor.setMenuPatterns([re.compile("^(Topics|News)$")])
+        results = []
+        release = asyncio.Event()
+
+        async def render(name: str, wait: bool) -> None:
+            if wait:
+                await release.wait()
+            results.append((name, processor.coalesce(5)))
+
+        first = asyncio.create_task(processor.process_update(message(1, 5, "Topics"), render("Topics", True)))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(processor.process_update(message(2, 5, "News"), render("News", False)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, second)
+        return results
+
+    assert asyncio.run(run()) == [("Topics", True), ("News", False)]